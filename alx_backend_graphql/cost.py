@@ -0,0 +1,202 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from graphene.utils.str_converters import to_snake_case
+from graphene_django.settings import graphene_settings
+from graphql import GraphQLError, get_named_type, is_abstract_type, is_list_type, is_non_null_type
+from graphql.execution.collect_fields import collect_fields
+from graphql.execution.values import get_argument_values, get_variable_values
+from graphql.language import OperationDefinitionNode
+
+DEFAULT_MAX_DEPTH = 10
+DEFAULT_MAX_COST = 50000
+DEFAULT_LIST_SIZE = 10
+COST_BUDGET_CACHE_PREFIX = 'graphql:cost:'
+
+
+class QueryCostError(Exception):
+    def __init__(self, message, code):
+        super().__init__(message)
+        self.code = code
+
+    def as_graphql_error(self):
+        return GraphQLError(str(self), extensions={'code': self.code})
+
+
+def is_connection_type(named_type):
+    fields = getattr(named_type, 'fields', {})
+    return 'edges' in fields and 'pageInfo' in fields
+
+
+def field_weight(parent_type, field_name, field_type):
+    """Weight declared in ``field_costs`` on the graphene type, else 1 for objects and 0 for scalars."""
+    graphene_type = getattr(parent_type, 'graphene_type', None)
+    weights = getattr(graphene_type, 'field_costs', None) or {}
+    weight = weights.get(to_snake_case(field_name))
+    if weight is not None:
+        return weight
+    return 0 if not hasattr(get_named_type(field_type), 'fields') else 1
+
+
+class CostAnalysis:
+    """Static cost and depth of one operation, computed before it executes.
+
+    Every object-returning field costs its weight times the number of parents
+    it is resolved for. Connections multiply their children by ``first`` or
+    ``last`` (the connection max limit when neither is given) and other lists
+    by the length of their list argument, if any, else
+    ``GRAPHQL_DEFAULT_LIST_SIZE``. The ``edges``/``node``/``pageInfo``
+    plumbing of a connection is free and does not count towards depth, and
+    neither do introspection fields.
+    """
+
+    def __init__(self, schema, fragments, operation, variables):
+        self.schema = schema
+        self.fragments = fragments
+        self.operation = operation
+        self.variables = variables
+        self.page_size = graphene_settings.RELAY_CONNECTION_MAX_LIMIT or DEFAULT_LIST_SIZE
+        self.list_size = getattr(settings, 'GRAPHQL_DEFAULT_LIST_SIZE', DEFAULT_LIST_SIZE)
+        self.cost = 0
+        self.depth = 0
+
+    def run(self):
+        root_type = self.schema.get_root_type(self.operation.operation)
+        self.visit(root_type, self.operation.selection_set, multiplier=1, depth=0)
+        return self
+
+    def visit(self, parent_type, selection_set, multiplier, depth):
+        if is_abstract_type(parent_type):
+            # Charge the most expensive of the possible concrete types
+            costs = []
+            for object_type in self.schema.get_possible_types(parent_type):
+                branch = CostAnalysis(self.schema, self.fragments, self.operation, self.variables)
+                branch.visit(object_type, selection_set, multiplier, depth)
+                costs.append(branch)
+            if costs:
+                worst = max(costs, key=lambda branch: branch.cost)
+                self.cost += worst.cost
+                self.depth = max(self.depth, max(branch.depth for branch in costs))
+            return
+
+        fields = collect_fields(self.schema, self.fragments, self.variables, parent_type, selection_set)
+        for name, nodes in fields.items():
+            if name.startswith('__'):
+                continue
+            field_def = parent_type.fields.get(name)
+            if field_def is None:
+                continue
+            named_type = get_named_type(field_def.type)
+            if not hasattr(named_type, 'fields') and not is_abstract_type(named_type):
+                self.cost += multiplier * field_weight(parent_type, name, field_def.type)
+                continue
+
+            wrapper = (
+                is_connection_type(parent_type) and name in ('edges', 'pageInfo')
+                or parent_type.name.endswith('Edge') and name == 'node'
+            )
+            child_depth = depth if wrapper else depth + 1
+            self.depth = max(self.depth, child_depth)
+            self.cost += 0 if wrapper else multiplier * field_weight(parent_type, name, field_def.type)
+
+            child_multiplier = multiplier
+            if is_connection_type(named_type):
+                args = get_argument_values(field_def, nodes[0], self.variables)
+                child_multiplier *= args.get('first') or args.get('last') or self.page_size
+            elif self.is_list(field_def.type) and not wrapper:
+                child_multiplier *= self.list_length(field_def, nodes[0])
+
+            for node in nodes:
+                self.visit(named_type, node.selection_set, child_multiplier, child_depth)
+
+    def list_length(self, field_def, node):
+        # A list argument such as nodes(ids:) gives the length outright
+        args = get_argument_values(field_def, node, self.variables)
+        for value in args.values():
+            if isinstance(value, list):
+                return len(value)
+        return self.list_size
+
+    @staticmethod
+    def is_list(field_type):
+        if is_non_null_type(field_type):
+            field_type = field_type.of_type
+        return is_list_type(field_type)
+
+
+def analyze(schema, document, operation, raw_variables):
+    """Return the ``CostAnalysis`` for ``operation``; raise if it breaks a limit."""
+    variables = get_variable_values(schema, operation.variable_definitions or (), raw_variables or {})
+    if isinstance(variables, list):
+        # Invalid variables; let execution report them
+        return None
+    fragments = {
+        definition.name.value: definition
+        for definition in document.definitions
+        if not isinstance(definition, OperationDefinitionNode)
+    }
+    analysis = CostAnalysis(schema, fragments, operation, variables).run()
+
+    max_depth = getattr(settings, 'GRAPHQL_MAX_DEPTH', DEFAULT_MAX_DEPTH)
+    if max_depth and analysis.depth > max_depth:
+        raise QueryCostError(
+            f'Query depth {analysis.depth} exceeds the maximum of {max_depth}', 'MAX_DEPTH_EXCEEDED'
+        )
+    max_cost = getattr(settings, 'GRAPHQL_MAX_COST', DEFAULT_MAX_COST)
+    if max_cost and analysis.cost > max_cost:
+        raise QueryCostError(
+            f'Query cost {analysis.cost} exceeds the maximum of {max_cost}', 'MAX_COST_EXCEEDED'
+        )
+    return analysis
+
+
+class CostBudget:
+    """Fixed-window cost allowance per client, kept in the Django cache.
+
+    ``GRAPHQL_COST_BUDGET`` points may be spent every
+    ``GRAPHQL_COST_BUDGET_WINDOW`` seconds; a budget of ``None`` disables it.
+    Counters use ``cache.incr`` so a shared cache backend enforces the budget
+    across processes.
+    """
+
+    @property
+    def limit(self):
+        return getattr(settings, 'GRAPHQL_COST_BUDGET', None)
+
+    @property
+    def window(self):
+        return getattr(settings, 'GRAPHQL_COST_BUDGET_WINDOW', 60)
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'GRAPHQL_COST_BUDGET_CACHE', 'default')]
+
+    @staticmethod
+    def client_key(request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return f'user:{user.pk}'
+        return 'ip:' + request.META.get('REMOTE_ADDR', 'unknown')
+
+    def spend(self, request, cost):
+        """Charge ``cost`` to the caller; return the remaining budget or raise."""
+        if not self.limit:
+            return None
+        window_start = int(time.time()) // self.window * self.window
+        key = f'{COST_BUDGET_CACHE_PREFIX}{self.client_key(request)}:{window_start}'
+        self.cache.add(key, 0, self.window)
+        try:
+            spent = self.cache.incr(key, cost)
+        except ValueError:
+            # Expired between add() and incr()
+            self.cache.set(key, cost, self.window)
+            spent = cost
+        if spent > self.limit:
+            raise QueryCostError(
+                f'Cost budget of {self.limit} per {self.window}s exhausted', 'COST_BUDGET_EXCEEDED'
+            )
+        return self.limit - spent
+
+
+cost_budget = CostBudget()
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from graphql import GraphQLError, parse, validate
+from graphene_django.settings import graphene_settings
+
+DEFAULT_DOCUMENT_CACHE_SIZE = 1000
+APQ_CACHE_PREFIX = 'graphql:apq:'
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode('utf-8')).hexdigest()
+
+
+class DocumentCache:
+    """Bounded LRU of parsed and validated documents keyed by query hash.
+
+    Entries hold ``(document, validation_errors)`` so invalid queries are not
+    re-validated either. Validation is schema-dependent, so the key includes
+    the schema identity and the validation rules in use.
+    """
+
+    def __init__(self, maxsize=DEFAULT_DOCUMENT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_document(self, schema, query, validation_rules=None):
+        key = (id(schema), tuple(validation_rules or ()), query_hash(query))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        try:
+            document = parse(query)
+        except GraphQLError as error:
+            # Syntax errors are cheap to recompute and carry no document
+            return None, [error]
+        errors = validate(schema, document, validation_rules, graphene_settings.MAX_VALIDATION_ERRORS)
+        entry = (document, errors)
+
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+class PersistedQueryError(Exception):
+    def __init__(self, message, code):
+        super().__init__(message)
+        self.code = code
+
+    def as_graphql_error(self):
+        return GraphQLError(str(self), extensions={'code': self.code})
+
+
+class PersistedQueryStore:
+    """Automatic persisted queries (APQ) plus an optional operation allow-list.
+
+    Clients send ``extensions.persistedQuery.sha256Hash`` instead of the query
+    text and register the text on a ``PersistedQueryNotFound`` miss. With
+    ``GRAPHQL_PERSISTED_QUERIES_ONLY`` only the operations listed in the
+    ``GRAPHQL_PERSISTED_QUERY_MANIFEST`` file (``{"<sha256>": "<query>"}``)
+    are accepted and nothing can be registered at runtime.
+    """
+
+    def __init__(self):
+        self._manifest = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def allow_list_only(self):
+        return getattr(settings, 'GRAPHQL_PERSISTED_QUERIES_ONLY', False)
+
+    @property
+    def manifest(self):
+        if self._manifest is None:
+            path = getattr(settings, 'GRAPHQL_PERSISTED_QUERY_MANIFEST', None)
+            manifest = {}
+            if path:
+                with open(path) as fp:
+                    manifest = json.load(fp)
+            self._manifest = manifest
+        return self._manifest
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'GRAPHQL_PERSISTED_QUERY_CACHE', 'default')]
+
+    def lookup(self, sha256):
+        query = self.manifest.get(sha256)
+        if query is None and not self.allow_list_only:
+            query = self.cache.get(APQ_CACHE_PREFIX + sha256)
+        return query
+
+    def register(self, sha256, query):
+        if self.allow_list_only:
+            raise PersistedQueryError('PersistedQueryNotSupported', 'PERSISTED_QUERY_NOT_SUPPORTED')
+        if query_hash(query) != sha256:
+            raise PersistedQueryError('provided sha does not match query', 'INVALID_PERSISTED_QUERY')
+        self.cache.set(APQ_CACHE_PREFIX + sha256, query, None)
+
+    def resolve(self, query, extensions):
+        """Return the query text to run for this request, registering it if asked."""
+        persisted = (extensions or {}).get('persistedQuery')
+        if not persisted:
+            if query and self.allow_list_only and query_hash(query) not in self.manifest:
+                raise PersistedQueryError('Operation is not on the allow-list', 'PERSISTED_QUERY_NOT_ALLOWED')
+            return query
+
+        sha256 = persisted.get('sha256Hash')
+        if not sha256:
+            raise PersistedQueryError('persistedQuery.sha256Hash is required', 'INVALID_PERSISTED_QUERY')
+        if query:
+            if self.lookup(sha256) is None:
+                self.register(sha256, query)
+            elif query_hash(query) != sha256:
+                raise PersistedQueryError('provided sha does not match query', 'INVALID_PERSISTED_QUERY')
+            return query
+
+        query = self.lookup(sha256)
+        if query is None:
+            self.misses += 1
+            raise PersistedQueryError('PersistedQueryNotFound', 'PERSISTED_QUERY_NOT_FOUND')
+        self.hits += 1
+        return query
+
+    def reset(self):
+        """Forget the loaded manifest (e.g. after the settings change)."""
+        self._manifest = None
+        self.hits = self.misses = 0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'manifest_size': len(self.manifest)}
+
+
+document_cache = DocumentCache(
+    getattr(settings, 'GRAPHQL_DOCUMENT_CACHE_SIZE', DEFAULT_DOCUMENT_CACHE_SIZE)
+)
+persisted_queries = PersistedQueryStore()
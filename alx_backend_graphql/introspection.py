@@ -0,0 +1,135 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from graphql import FieldNode, OperationType, execute, get_introspection_query, get_operation_ast, print_schema
+
+from .documents import document_cache, query_hash
+
+DEFAULT_INTROSPECTION_CACHE_SIZE = 20
+INTROSPECTION_FIELDS = frozenset(['__schema', '__type', '__typename'])
+
+
+def schema_hash(schema):
+    return hashlib.sha256(print_schema(schema).encode('utf-8')).hexdigest()
+
+
+def is_introspection(operation_ast):
+    """True for query operations that only select ``__schema``, ``__type`` or ``__typename``."""
+    return (
+        operation_ast is not None
+        and operation_ast.operation == OperationType.QUERY
+        and all(
+            isinstance(selection, FieldNode) and selection.name.value in INTROSPECTION_FIELDS
+            for selection in operation_ast.selection_set.selections
+        )
+    )
+
+
+def introspection_queries():
+    """The introspection query texts precomputed by ``warm``.
+
+    graphql-core's default query, as used by codegen tools and
+    ``manage.py graphql_schema``, and the variant that also asks for
+    deprecated input values.
+    """
+    return [
+        get_introspection_query(descriptions=True),
+        get_introspection_query(descriptions=True, input_value_deprecation=True),
+    ]
+
+
+class IntrospectionCache:
+    """Introspection results kept in memory, keyed by schema hash and query hash.
+
+    Introspection answers depend on the schema alone, but each one walks the
+    whole type map (~30ms for this schema). The schema hash is the SHA-256 of
+    its SDL, so processes running the same code share keys and a changed
+    schema never serves an old answer. Results with errors are not kept.
+    """
+
+    def __init__(self, maxsize=DEFAULT_INTROSPECTION_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._hashes = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return getattr(settings, 'GRAPHQL_INTROSPECTION_CACHE', True)
+
+    def schema_hash(self, schema):
+        digest = self._hashes.get(id(schema))
+        if digest is None:
+            digest = self._hashes[id(schema)] = schema_hash(schema)
+        return digest
+
+    def key(self, schema, query, operation_ast, variables):
+        # The selected operation rather than the requested name, so that
+        # naming the only operation of a document hits the same entry
+        return (
+            self.schema_hash(schema),
+            query_hash(query),
+            operation_ast.name.value if operation_ast.name else '',
+            json.dumps(variables or {}, sort_keys=True, default=str),
+        )
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def set(self, key, data):
+        with self._lock:
+            self._entries[key] = data
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def execute(self, key, run):
+        """Run ``run()`` and keep its data under ``key`` unless it failed."""
+        result = run()
+        if not result.errors and result.data is not None:
+            self.set(key, result.data)
+        return result
+
+    def warm(self, schema):
+        """Precompute ``introspection_queries()``, also priming their parsed documents."""
+        warmed = 0
+        for query in introspection_queries():
+            document, errors = document_cache.get_document(schema, query)
+            if errors:
+                continue
+            key = self.key(schema, query, get_operation_ast(document), None)
+            if key not in self._entries:
+                self.execute(key, lambda: execute(schema, document))
+            warmed += 1
+        return warmed
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._hashes.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+introspection_cache = IntrospectionCache(
+    getattr(settings, 'GRAPHQL_INTROSPECTION_CACHE_SIZE', DEFAULT_INTROSPECTION_CACHE_SIZE)
+)
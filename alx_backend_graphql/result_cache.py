@@ -0,0 +1,200 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from contextlib import ExitStack
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.utils.module_loading import import_string
+from graphql import print_ast
+
+from crm.search import SEARCH_FIELDS, get_index
+from crm.versions import model_versions, recording_reads
+
+RESULT_CACHE_PREFIX = 'graphql:result:'
+DEFAULTS = {
+    'BACKEND': 'alx_backend_graphql.result_cache.LocalResultBackend',
+    'CACHE_ALIAS': 'default',
+    'TTL': 30,
+    'MAX_ENTRIES': 1000,
+    # Results that read these models are never cached: other processes
+    # write them (crm.jobs workers) and their versions are per process
+    # unless CRM_VERSION_CACHE is shared
+    'UNCACHED_MODELS': ('crm.Job',),
+}
+
+
+class LocalResultBackend:
+    """In-process LRU with per-entry expiry."""
+
+    def __init__(self, options):
+        self.max_entries = options['MAX_ENTRIES']
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class DjangoCacheResultBackend:
+    """Stores entries in a Django cache alias (LocMem locally, a shared cache in production).
+
+    ``clear`` flushes the whole alias, so give the result cache its own.
+    """
+
+    def __init__(self, options):
+        self.alias = options['CACHE_ALIAS']
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get(self, key):
+        return self.cache.get(RESULT_CACHE_PREFIX + key)
+
+    def set(self, key, value, ttl):
+        self.cache.set(RESULT_CACHE_PREFIX + key, value, ttl)
+
+    def clear(self):
+        self.cache.clear()
+
+
+def table_labels():
+    """``{db_table: model label}`` for every installed model, M2M and search index tables included."""
+    labels = {
+        model._meta.db_table: model._meta.label
+        for model in apps.get_models(include_auto_created=True)
+    }
+    for label in SEARCH_FIELDS:
+        index = get_index(apps.get_model(label))
+        labels[index.table] = label
+    return labels
+
+
+class TableRecorder:
+    """Execute-wrapper that notes which model tables the SQL of a request reads."""
+
+    def __init__(self, tables):
+        self.tables = tables
+        self.labels = set()
+
+    def __call__(self, execute, sql, params, many, context):
+        for table, label in self.tables.items():
+            if label not in self.labels and f'"{table}"' in sql:
+                self.labels.add(label)
+        return execute(sql, params, many, context)
+
+
+class ResultCache:
+    """Response cache for read operations, invalidated by model versions.
+
+    Entries are keyed by the normalized document, operation name and
+    variables, and tagged with the version of every model whose table the
+    execution read, or noted with ``crm.versions.record_read`` when it was
+    served from memory. A write to any of those models (see ``crm.versions``)
+    makes the entry stale; nothing else is flushed. Writes from other
+    processes only do so when ``CRM_VERSION_CACHE`` is shared with them.
+    Results that read one of ``UNCACHED_MODELS`` are not stored. Entries
+    also expire after ``TTL`` seconds and the backend evicts least recently
+    used ones; with a
+    lagging read replica (``crm.routers``) the TTL also bounds how long a
+    result read before the replica caught up can be served.
+    """
+
+    def __init__(self):
+        self._configured = None
+        self._options = None
+        self._backend = None
+        self._tables = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def options(self):
+        """``GRAPHQL_RESULT_CACHE`` merged over the defaults; None when disabled."""
+        configured = getattr(settings, 'GRAPHQL_RESULT_CACHE', DEFAULTS)
+        if configured is not self._configured:
+            self._configured = configured
+            self._options = None if configured is None else {**DEFAULTS, **configured}
+            self._backend = None if configured is None else import_string(self._options['BACKEND'])(self._options)
+        return self._options
+
+    @property
+    def enabled(self):
+        return self.options is not None
+
+    @property
+    def backend(self):
+        return self._backend if self.enabled else None
+
+    def key(self, document, operation_name, variables):
+        payload = json.dumps(
+            [print_ast(document), operation_name, variables or {}], sort_keys=True, default=str
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        entry = self.backend.get(key)
+        if entry is not None:
+            tags, data = entry
+            if model_versions.get_many(list(tags)) == tags:
+                self.hits += 1
+                return data
+        self.misses += 1
+        return None
+
+    def execute(self, key, run):
+        """Run ``run()`` and cache its data under ``key`` unless it failed.
+
+        Versions are read before executing so a write that lands during
+        execution leaves the entry already stale.
+        """
+        if self._tables is None:
+            self._tables = table_labels()
+        before = model_versions.get_many(list(set(self._tables.values())))
+        recorder = TableRecorder(self._tables)
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            reads = stack.enter_context(recording_reads())
+            result = run()
+        labels = recorder.labels | reads
+        if not result.errors and not labels & set(self.options['UNCACHED_MODELS']):
+            tags = {label: before[label] for label in labels}
+            self.backend.set(key, (tags, result.data), self.options['TTL'])
+        return result
+
+    def clear(self):
+        if self.enabled:
+            self.backend.clear()
+        self.hits = self.misses = 0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+result_cache = ResultCache()
@@ -43,9 +43,97 @@ INSTALLED_APPS = [
 ]
 
 GRAPHENE = {
-    'SCHEMA': 'alx_backend_graphql.schema.schema'
+    'SCHEMA': 'alx_backend_graphql.schema.schema',
+    # The schema has no _debug field; under DEBUG graphene-django would
+    # otherwise add DjangoDebugMiddleware, which wraps the cursor of every
+    # database alias to record SQL nobody reads
+    'MIDDLEWARE': [],
 }
 
+# Rows per IN lookup / bulk_create batch in the bulk mutations
+CRM_BULK_CHUNK_SIZE = 500
+# Retries of a createOrder stock update that hit a lock timeout, backing off
+# exponentially from CRM_LOCK_RETRY_BACKOFF seconds
+CRM_LOCK_RETRIES = 3
+CRM_LOCK_RETRY_BACKOFF = 0.05
+# Rows fetched (and written to the response) at a time by /export/<resource>
+CRM_EXPORT_CHUNK_SIZE = 2000
+
+# Parsed/validated GraphQL documents kept in memory (LRU)
+GRAPHQL_DOCUMENT_CACHE_SIZE = 1000
+# Automatic persisted queries are stored in this cache alias
+GRAPHQL_PERSISTED_QUERY_CACHE = 'default'
+# JSON file of {"<sha256>": "<query>"} operations registered ahead of time
+GRAPHQL_PERSISTED_QUERY_MANIFEST = None
+# Only accept operations listed in the manifest
+GRAPHQL_PERSISTED_QUERIES_ONLY = False
+
+# Introspection results kept in memory per schema hash (see
+# alx_backend_graphql.introspection); False always executes them
+GRAPHQL_INTROSPECTION_CACHE = True
+GRAPHQL_INTROSPECTION_CACHE_SIZE = 20
+# Build the schema, filter forms, manifest documents and introspection
+# results in the WSGI/ASGI entry points instead of on the first requests
+GRAPHQL_WARM_UP = True
+
+# Most operations accepted in one JSON array POSTed to /graphql
+GRAPHQL_MAX_BATCH_SIZE = 20
+
+# Static query cost limits, checked before execution
+GRAPHQL_MAX_DEPTH = 10
+GRAPHQL_MAX_COST = 50000
+# Assumed length of plain (non-connection) list fields
+GRAPHQL_DEFAULT_LIST_SIZE = 10
+# Cost points each client may spend per window; None disables the budget
+GRAPHQL_COST_BUDGET = None
+GRAPHQL_COST_BUDGET_WINDOW = 60
+
+# Response cache for read operations; set to None to disable. Use
+# 'alx_backend_graphql.result_cache.DjangoCacheResultBackend' with a
+# dedicated CACHE_ALIAS (and CRM_VERSION_CACHE) to share it between processes.
+GRAPHQL_RESULT_CACHE = {
+    'BACKEND': 'alx_backend_graphql.result_cache.LocalResultBackend',
+    'TTL': 30,
+    'MAX_ENTRIES': 1000,
+}
+# Cache alias holding the per-model write versions; None keeps them in-process.
+# Writes only invalidate the result cache and catalog of processes sharing
+# the alias: with None, writes by crm.jobs workers, management commands or
+# other server processes are served stale until GRAPHQL_RESULT_CACHE['TTL']
+# and CRM_CATALOG_TTL run out. Deployments with more than one writing
+# process should point it at a cache they all reach (Redis, Memcached)
+CRM_VERSION_CACHE = None
+
+# Fraction of GraphQL operations traced per resolver into the /metrics
+# histograms; 0 disables tracing
+GRAPHQL_TRACING_SAMPLE_RATE = 0.01
+# Let clients get the trace of an operation in `extensions.tracing` by
+# sending {"extensions": {"tracing": true}}
+GRAPHQL_TRACING_EXTENSIONS = DEBUG
+
+# Product records kept in each process's catalog (crm.catalog), and whether
+# the WSGI/ASGI entry points fill it at startup
+CRM_CATALOG_SIZE = 10000
+CRM_CATALOG_WARM = True
+# Seconds a catalog record is served before it is read again; bounds the
+# staleness of writes from other processes while CRM_VERSION_CACHE is None.
+# None keeps records until the catalog version changes
+CRM_CATALOG_TTL = 60
+
+# Orders older than this many days are moved to the archive tables by
+# `manage.py archive_orders`; allOrders only reads them for date ranges
+# that reach that far back
+CRM_ORDER_HOT_DAYS = 90
+
+# Background jobs (crm.jobs): a running job whose worker has not
+# checkpointed for CRM_JOB_LEASE seconds is taken over by another worker;
+# idle workers poll the jobs table every CRM_JOB_POLL_INTERVAL seconds
+CRM_JOB_LEASE = 300
+CRM_JOB_POLL_INTERVAL = 1.0
+
+# Threads running sync ORM work for /graphql/async (serve it with an ASGI server)
+GRAPHQL_ASYNC_MAX_THREADS = 8
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -79,13 +167,57 @@ WSGI_APPLICATION = 'alx_backend_graphql.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Seconds a connection is reused across requests (0 closes it after each
+# request); CONN_HEALTH_CHECKS re-validates a reused connection first.
+DATABASE_CONN_MAX_AGE = 60
+
+# Applied to every new SQLite connection. WAL lets readers run alongside a
+# writer; busy_timeout makes a blocked writer wait instead of failing with
+# "database is locked".
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'cache_size': -64000,  # KiB
+    'mmap_size': 256 * 1024 * 1024,
+    'busy_timeout': 5000,  # ms
+}
+
+
+def sqlite_options(transaction_mode='IMMEDIATE', **pragmas):
+    # IMMEDIATE takes the write lock when a transaction starts, so two
+    # transactions never deadlock upgrading from a read lock
+    return {
+        'init_command': ''.join(
+            f'PRAGMA {name}={value};' for name, value in {**SQLITE_PRAGMAS, **pragmas}.items()
+        ),
+        'transaction_mode': transaction_mode,
+    }
+
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': sqlite_options(),
+    },
+    # Read-only copy of default, refreshed by `manage.py sync_replica`
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.replica.sqlite3',
+        'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': sqlite_options('DEFERRED', query_only=1),
+        'TEST': {'MIRROR': 'default'},
+    },
 }
 
+DATABASE_ROUTERS = ['crm.routers.PrimaryReplicaRouter']
+# Alias GraphQL query operations read from; None reads from default. Run
+# `manage.py sync_replica` before pointing it at 'replica'.
+CRM_READ_DATABASE = 'replica'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
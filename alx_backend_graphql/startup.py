@@ -0,0 +1,76 @@
+import logging
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.urls import get_resolver
+from graphene_django.settings import graphene_settings
+from graphql import validate_schema
+
+from crm.catalog import warm_up as warm_catalog
+from crm.fields import CRMConnectionField
+
+from .documents import document_cache, persisted_queries
+from .introspection import introspection_cache
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def timed(phases, name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases[name] = time.perf_counter() - start
+
+
+def warm_filtersets(schema):
+    """Run every connection field's FilterSet once against an empty queryset.
+
+    Builds the filter forms and their fields without a query, so the first
+    filtered request does not pay for it. Returns how many were run.
+    """
+    warmed = 0
+    for field in schema.query._meta.fields.values():
+        if isinstance(field, CRMConnectionField):
+            filterset_class = field.filterset_class
+            filterset_class({}, queryset=filterset_class._meta.model.objects.none()).qs
+            warmed += 1
+    return warmed
+
+
+def warm_documents(schema):
+    """Parse and validate the operations of the persisted query manifest."""
+    for query in persisted_queries.manifest.values():
+        document_cache.get_document(schema, query)
+    return len(persisted_queries.manifest)
+
+
+def warm_up():
+    """Do the work the first requests would, before the worker takes traffic.
+
+    Imports the URLconf and views, builds the schema and the filter forms,
+    primes the document cache with the persisted query manifest, precomputes
+    the introspection results and fills the product catalog. Skipped, all
+    but the catalog, when ``GRAPHQL_WARM_UP`` is off. Called by the WSGI
+    and ASGI entry points; returns the seconds spent on each phase.
+    """
+    phases = {}
+    if getattr(settings, 'GRAPHQL_WARM_UP', True):
+        with timed(phases, 'urls'):
+            get_resolver().url_patterns
+        with timed(phases, 'schema'):
+            schema = graphene_settings.SCHEMA
+            validate_schema(schema.graphql_schema)
+        with timed(phases, 'filtersets'):
+            warm_filtersets(schema)
+        with timed(phases, 'documents'):
+            warm_documents(schema.graphql_schema)
+        with timed(phases, 'introspection'):
+            if introspection_cache.enabled:
+                introspection_cache.warm(schema.graphql_schema)
+    with timed(phases, 'catalog'):
+        warm_catalog()
+    logger.info('Warmed up in %.3fs', sum(phases.values()))
+    return phases
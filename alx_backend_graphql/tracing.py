@@ -0,0 +1,294 @@
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+from inspect import isawaitable
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from graphql import get_named_type, is_leaf_type
+
+DEFAULT_SAMPLE_RATE = 0.0
+DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+# (trace, resolver) that SQL issued right now is charged to
+_active = ContextVar('graphql_trace', default=None)
+
+
+class ResolverTrace:
+    __slots__ = ('path', 'parent_type', 'field_name', 'return_type', 'start', 'duration', 'queries', 'sql_duration', 'rows')
+
+    def __init__(self, info, start):
+        self.path = info.path.as_list()
+        self.parent_type = info.parent_type.name
+        self.field_name = info.field_name
+        self.return_type = str(info.return_type)
+        self.start = start
+        self.duration = 0.0
+        self.queries = 0
+        self.sql_duration = 0.0
+        self.rows = None
+
+    @property
+    def field(self):
+        return f'{self.parent_type}.{self.field_name}'
+
+    def finish(self, result):
+        self.duration = time.perf_counter() - self.start
+        if isinstance(result, (list, tuple)):
+            self.rows = len(result)
+        elif getattr(result, 'edges', None) is not None:
+            self.rows = len(result.edges)
+
+
+class Trace:
+    """Resolver timings and SQL of one GraphQL operation.
+
+    ``send`` is true when the client asked for the trace in the response.
+    Resolvers of the async view run on pool threads, hence the lock.
+    """
+
+    def __init__(self, send=False):
+        self.send = send
+        self.started_at = datetime.now(timezone.utc)
+        self.start = time.perf_counter()
+        self.duration = 0.0
+        self.resolvers = []
+        self.queries = 0
+        self.sql_duration = 0.0
+        self.token = None
+        self._lock = threading.Lock()
+
+    def resolver(self, info):
+        entry = ResolverTrace(info, time.perf_counter())
+        with self._lock:
+            self.resolvers.append(entry)
+        return entry
+
+    def record_query(self, entry, duration):
+        with self._lock:
+            self.queries += 1
+            self.sql_duration += duration
+            if entry is not None:
+                entry.queries += 1
+                entry.sql_duration += duration
+
+    def as_extension(self):
+        """Apollo tracing (version 1) plus per-resolver SQL figures."""
+        ns = lambda seconds: int(seconds * 1e9)
+        return {
+            'version': 1,
+            'startTime': self.started_at.isoformat(),
+            'endTime': (self.started_at + timedelta(seconds=self.duration)).isoformat(),
+            'duration': ns(self.duration),
+            'sql': {'queries': self.queries, 'duration': ns(self.sql_duration)},
+            'execution': {
+                'resolvers': [
+                    {
+                        'path': entry.path,
+                        'parentType': entry.parent_type,
+                        'fieldName': entry.field_name,
+                        'returnType': entry.return_type,
+                        'startOffset': ns(entry.start - self.start),
+                        'duration': ns(entry.duration),
+                        'sqlQueries': entry.queries,
+                        'sqlDuration': ns(entry.sql_duration),
+                        'rows': entry.rows,
+                    }
+                    for entry in self.resolvers
+                ],
+            },
+        }
+
+
+def record_query(execute, sql, params, many, context):
+    active = _active.get()
+    if active is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        active[0].record_query(active[1], time.perf_counter() - start)
+
+
+def install(connection):
+    # At the front, so ``connection.execute_wrapper`` blocks popping their
+    # own wrapper off the end never remove this one
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+def on_connection_created(sender, connection, **kwargs):
+    install(connection)
+
+
+connection_created.connect(on_connection_created, dispatch_uid='graphql_tracing')
+
+
+class TracingMiddleware:
+    """Graphene middleware timing each resolver of a traced operation.
+
+    Scalar and enum fields are left out: they are most of the resolvers,
+    read attributes already loaded and would dominate the tracing overhead.
+    Their SQL, if any, still counts towards the operation. SQL run while a
+    resolver (or the awaitable it returned) is active is charged to it
+    through ``_active``, which ``sync_to_async`` carries over to the
+    threads of ``crm.aio``.
+    """
+
+    def resolve(self, next, root, info, **args):
+        trace = getattr(info.context, 'crm_trace', None)
+        if trace is None or is_leaf_type(get_named_type(info.return_type)):
+            return next(root, info, **args)
+        entry = trace.resolver(info)
+        token = _active.set((trace, entry))
+        try:
+            result = next(root, info, **args)
+        finally:
+            _active.reset(token)
+        if isawaitable(result):
+            return self.resolve_async(trace, entry, result)
+        entry.finish(result)
+        return result
+
+    @staticmethod
+    async def resolve_async(trace, entry, result):
+        token = _active.set((trace, entry))
+        try:
+            result = await result
+        finally:
+            _active.reset(token)
+        entry.finish(result)
+        return result
+
+
+def start_trace(request, extensions):
+    """Begin tracing this operation if it is sampled or the client asked to see it.
+
+    A client gets the trace back in ``extensions.tracing`` by sending
+    ``{"extensions": {"tracing": true}}`` when ``GRAPHQL_TRACING_EXTENSIONS``
+    allows it; such operations are always traced. Returns None otherwise
+    unless the operation falls within ``GRAPHQL_TRACING_SAMPLE_RATE``.
+    """
+    send = (
+        isinstance(extensions, dict)
+        and extensions.get('tracing') is True
+        and getattr(settings, 'GRAPHQL_TRACING_EXTENSIONS', False)
+    )
+    rate = getattr(settings, 'GRAPHQL_TRACING_SAMPLE_RATE', DEFAULT_SAMPLE_RATE)
+    if not send and (rate <= 0 or random.random() >= rate):
+        return None
+    for connection in connections.all():
+        install(connection)
+    trace = Trace(send)
+    trace.token = _active.set((trace, None))
+    request.crm_trace = trace
+    return trace
+
+
+def finish_trace(trace, request, result):
+    if trace is None:
+        return result
+    trace.duration = time.perf_counter() - trace.start
+    _active.reset(trace.token)
+    request.crm_trace = None
+    metrics.observe(trace)
+    if trace.send and result is not None:
+        result.extensions = {**(result.extensions or {}), 'tracing': trace.as_extension()}
+    return result
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets, label=None):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self.label = label
+        # label value -> [count per bucket..., +Inf count, sum]
+        self.series = {}
+
+    def observe(self, value, label_value=None):
+        series = self.series.get(label_value)
+        if series is None:
+            series = self.series[label_value] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for label_value, series in sorted(self.series.items(), key=lambda item: item[0] or ''):
+            labels = f'{self.label}="{label_value}",' if self.label else ''
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels}le="{bound}"}} {cumulative}')
+            labels = f'{{{labels[:-1]}}}' if labels else ''
+            lines.append(f'{self.name}_sum{labels} {series[-1]}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Metrics:
+    """Histograms of traced operations in Prometheus text format, for ``/metrics``.
+
+    Resolvers are labelled by ``Type.field``, so the number of series is
+    bounded by the schema rather than by the queries clients send. Figures
+    are per process; scrape every worker.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.histograms = {
+                'request_duration': Histogram(
+                    'graphql_request_duration_seconds', 'Execution time of traced GraphQL operations.', DURATION_BUCKETS
+                ),
+                'request_queries': Histogram(
+                    'graphql_request_sql_queries', 'SQL queries per traced GraphQL operation.', COUNT_BUCKETS
+                ),
+                'request_sql': Histogram(
+                    'graphql_request_sql_duration_seconds', 'SQL time per traced GraphQL operation.', DURATION_BUCKETS
+                ),
+                'resolver_duration': Histogram(
+                    'graphql_resolver_duration_seconds', 'Resolver wall time.', DURATION_BUCKETS, 'field'
+                ),
+                'resolver_queries': Histogram(
+                    'graphql_resolver_sql_queries', 'SQL queries issued by a resolver.', COUNT_BUCKETS, 'field'
+                ),
+                'resolver_sql': Histogram(
+                    'graphql_resolver_sql_duration_seconds', 'SQL time of a resolver.', DURATION_BUCKETS, 'field'
+                ),
+                'resolver_rows': Histogram(
+                    'graphql_resolver_rows', 'Items returned by list and connection resolvers.', COUNT_BUCKETS, 'field'
+                ),
+            }
+
+    def observe(self, trace):
+        histograms = self.histograms
+        with self._lock:
+            histograms['request_duration'].observe(trace.duration)
+            histograms['request_queries'].observe(trace.queries)
+            histograms['request_sql'].observe(trace.sql_duration)
+            for entry in trace.resolvers:
+                field = entry.field
+                histograms['resolver_duration'].observe(entry.duration, field)
+                histograms['resolver_queries'].observe(entry.queries, field)
+                histograms['resolver_sql'].observe(entry.sql_duration, field)
+                if entry.rows is not None:
+                    histograms['resolver_rows'].observe(entry.rows, field)
+
+    def render(self):
+        with self._lock:
+            lines = [line for histogram in self.histograms.values() for line in histogram.render()]
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
@@ -0,0 +1,418 @@
+import json
+from inspect import isawaitable
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.http import HttpResponse, HttpResponseNotAllowed
+from django.http.response import HttpResponseBadRequest
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.utils.utils import set_rollback
+from graphene_django.views import GraphQLView, HttpError
+from graphql import ExecutionResult, OperationType, execute, get_operation_ast, validate_schema
+
+from crm.aio import run_sync
+from crm.catalog import catalog
+from crm.routers import pin_primary, replica_reads
+
+from .cost import QueryCostError, analyze, cost_budget
+from .documents import PersistedQueryError, document_cache, persisted_queries
+from .introspection import introspection_cache, is_introspection
+from .result_cache import result_cache
+from .tracing import TracingMiddleware, finish_trace, metrics, start_trace
+
+DEFAULT_MAX_BATCH_SIZE = 20
+
+
+class CRMGraphQLView(GraphQLView):
+    """GraphQLView that resolves persisted queries and caches parsed documents.
+
+    Parsing and validation go through ``documents.document_cache`` so hot
+    repeated queries skip both; ``documents.persisted_queries`` handles the
+    APQ handshake and the optional allow-list. Validated operations are then
+    priced by ``cost.analyze`` and charged to the caller's ``cost_budget``
+    before they run, and the result carries the figures in ``extensions``.
+    Read operations are answered from ``result_cache`` when possible, and
+    introspection-only queries from ``introspection.introspection_cache``.
+    Sampled operations are traced per resolver into ``tracing.metrics``.
+
+    Query operations read from ``CRM_READ_DATABASE`` (see ``crm.routers``);
+    once a request runs a mutation, its remaining operations use the primary.
+
+    A JSON array body is a batch of up to ``GRAPHQL_MAX_BATCH_SIZE``
+    operations, run in order against the same request, so the loaders in
+    ``crm.loaders`` and anything else cached on it carry over from one
+    operation to the next. Results come back as an array in the same order.
+    ``?atomic=1`` runs the batch in one transaction: the first failing
+    operation rolls back everything and the rest are not executed.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        with replica_reads():
+            if not self.is_atomic_batch(request):
+                return super().dispatch(request, *args, **kwargs)
+            pin_primary()
+            with transaction.atomic():
+                response = super().dispatch(request, *args, **kwargs)
+                if getattr(request, 'crm_batch_failed', False):
+                    transaction.set_rollback(True)
+            return response
+
+    @staticmethod
+    def is_atomic_batch(request):
+        return request.method.lower() == 'post' and request.GET.get('atomic') in ('1', 'true')
+
+    def parse_body(self, request):
+        if self.get_content_type(request) != 'application/json':
+            return super().parse_body(request)
+        try:
+            data = json.loads(request.body.decode('utf-8'))
+        except (UnicodeDecodeError, ValueError):
+            raise HttpError(HttpResponseBadRequest('POST body sent invalid JSON.'))
+        if isinstance(data, list):
+            self.check_batch(data)
+            # Views are instantiated per request, so this only switches the
+            # current request to the batch code paths
+            self.batch = True
+        elif not isinstance(data, dict):
+            raise HttpError(HttpResponseBadRequest('The received data is not a valid JSON query.'))
+        return data
+
+    @staticmethod
+    def check_batch(data):
+        max_size = getattr(settings, 'GRAPHQL_MAX_BATCH_SIZE', DEFAULT_MAX_BATCH_SIZE)
+        if not data:
+            raise HttpError(HttpResponseBadRequest('Received an empty list in the batch request.'))
+        if len(data) > max_size:
+            raise HttpError(HttpResponseBadRequest(
+                f'Batch of {len(data)} operations exceeds the limit of {max_size}.'
+            ))
+        if not all(isinstance(entry, dict) for entry in data):
+            raise HttpError(HttpResponseBadRequest('Every operation in a batch must be a JSON object.'))
+
+    def get_response(self, request, data, show_graphiql=False):
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+        if getattr(request, 'crm_batch_failed', False):
+            return self.skipped_response(request, id)
+
+        execution_result = self.execute_graphql_request(
+            request, data, query, variables, operation_name, show_graphiql
+        )
+        return self.format_response(request, execution_result, id, show_graphiql)
+
+    def skipped_response(self, request, id):
+        error = {'message': 'Not executed: an earlier operation of this atomic batch failed.'}
+        return self.json_encode(request, {'errors': [error], 'id': id, 'status': 400}), 400
+
+    def format_response(self, request, execution_result, id, show_graphiql=False):
+        if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+            set_rollback()
+        if self.is_atomic_batch(request) and (
+            getattr(request, MUTATION_ERRORS_FLAG, False) is True
+            or (execution_result is not None and execution_result.errors)
+        ):
+            request.crm_batch_failed = True
+
+        status_code = 200
+        if execution_result:
+            response = {}
+
+            if execution_result.errors:
+                set_rollback()
+                response['errors'] = [
+                    self.format_error(e) for e in execution_result.errors
+                ]
+
+            if execution_result.errors and any(
+                not getattr(e, 'path', None) for e in execution_result.errors
+            ):
+                status_code = 400
+            else:
+                response['data'] = execution_result.data
+
+            if execution_result.extensions:
+                response['extensions'] = execution_result.extensions
+
+            if self.batch:
+                response['id'] = id
+                response['status'] = status_code
+
+            result = self.json_encode(request, response, pretty=show_graphiql)
+        else:
+            result = None
+
+        return result, status_code
+
+    def get_extensions(self, request, data):
+        extensions = request.GET.get('extensions') or data.get('extensions')
+        if isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpError(HttpResponseBadRequest('Extensions are invalid JSON.'))
+        return extensions or {}
+
+    def prepare_operation(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        """Everything that happens before execution, shared by the sync and async views.
+
+        Returns ``(result, None)`` when the request is answered without
+        executing, else ``(None, (query, document, operation_ast, analysis,
+        remaining))``, where ``query`` is the text a persisted query resolved to.
+        """
+        try:
+            query = persisted_queries.resolve(query, self.get_extensions(request, data))
+        except PersistedQueryError as error:
+            return ExecutionResult(errors=[error.as_graphql_error()]), None
+
+        if not query:
+            if show_graphiql:
+                return None, None
+            raise HttpError(HttpResponseBadRequest('Must provide query string.'))
+
+        schema = self.schema.graphql_schema
+
+        schema_validation_errors = validate_schema(schema)
+        if schema_validation_errors:
+            return ExecutionResult(data=None, errors=schema_validation_errors), None
+
+        document, validation_errors = document_cache.get_document(schema, query, self.validation_rules)
+        if validation_errors:
+            return ExecutionResult(data=None, errors=validation_errors), None
+
+        operation_ast = get_operation_ast(document, operation_name)
+        if operation_ast is None or operation_ast.operation != OperationType.QUERY:
+            pin_primary()
+
+        if (
+            request.method.lower() == 'get'
+            and operation_ast is not None
+            and operation_ast.operation != OperationType.QUERY
+        ):
+            if show_graphiql:
+                return None, None
+
+            raise HttpError(
+                HttpResponseNotAllowed(
+                    ['POST'],
+                    'Can only perform a {} operation from a POST request.'.format(
+                        operation_ast.operation.value
+                    ),
+                )
+            )
+
+        analysis = remaining = None
+        if operation_ast is not None:
+            try:
+                analysis = analyze(schema, document, operation_ast, variables)
+                if analysis is not None:
+                    remaining = cost_budget.spend(request, analysis.cost)
+            except QueryCostError as error:
+                return ExecutionResult(errors=[error.as_graphql_error()]), None
+        return None, (query, document, operation_ast, analysis, remaining)
+
+    def execute_graphql_request(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        trace = start_trace(request, self.get_extensions(request, data))
+        result = None
+        try:
+            result = self.execute_operation(
+                request, data, query, variables, operation_name, show_graphiql
+            )
+        finally:
+            finish_trace(trace, request, result)
+        return result
+
+    def execute_operation(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        result, operation = self.prepare_operation(
+            request, data, query, variables, operation_name, show_graphiql
+        )
+        if operation is None:
+            return result
+        query, document, operation_ast, analysis, remaining = operation
+
+        def run():
+            return self.execute_document(request, document, operation_ast, variables, operation_name)
+
+        if introspection_cache.enabled and is_introspection(operation_ast):
+            result = self.execute_introspection(query, operation_ast, variables, run)
+        elif (
+            result_cache.enabled
+            and operation_ast is not None
+            and operation_ast.operation == OperationType.QUERY
+            # Reads inside an atomic batch may see rows that are rolled back
+            and not self.is_atomic_batch(request)
+        ):
+            key = result_cache.key(document, operation_name, variables)
+            data = result_cache.get(key)
+            result = ExecutionResult(data=data) if data is not None else result_cache.execute(key, run)
+        else:
+            result = run()
+        return self.add_cost(result, analysis, remaining)
+
+    def execute_introspection(self, query, operation_ast, variables, run):
+        key = introspection_cache.key(self.schema.graphql_schema, query, operation_ast, variables)
+        data = introspection_cache.get(key)
+        return ExecutionResult(data=data) if data is not None else introspection_cache.execute(key, run)
+
+    @staticmethod
+    def add_cost(result, analysis, remaining):
+        if analysis is not None:
+            cost = {'requested': analysis.cost, 'depth': analysis.depth}
+            if remaining is not None:
+                cost['budgetRemaining'] = remaining
+            result.extensions = {**(result.extensions or {}), 'cost': cost}
+        return result
+
+    def get_middleware(self, request):
+        middleware = super().get_middleware(request) or []
+        if getattr(request, 'crm_trace', None) is not None:
+            middleware = [*middleware, TracingMiddleware()]
+        return middleware
+
+    def get_execute_options(self, request, variables, operation_name):
+        execute_options = {
+            'root_value': self.get_root_value(request),
+            'context_value': self.get_context(request),
+            'variable_values': variables,
+            'operation_name': operation_name,
+            'middleware': self.get_middleware(request),
+        }
+        if self.execution_context_class:
+            execute_options['execution_context_class'] = self.execution_context_class
+        return execute_options
+
+    @staticmethod
+    def is_atomic(operation_ast):
+        return (
+            operation_ast is not None
+            and operation_ast.operation == OperationType.MUTATION
+            and (
+                graphene_settings.ATOMIC_MUTATIONS is True
+                or connection.settings_dict.get('ATOMIC_MUTATIONS', False) is True
+            )
+        )
+
+    def execute_document(self, request, document, operation_ast, variables, operation_name):
+        schema = self.schema.graphql_schema
+        try:
+            execute_options = self.get_execute_options(request, variables, operation_name)
+
+            if self.is_atomic(operation_ast):
+                with transaction.atomic():
+                    result = execute(schema, document, **execute_options)
+                    if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                        transaction.set_rollback(True)
+                return result
+
+            return execute(schema, document, **execute_options)
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+
+class AsyncCRMGraphQLView(CRMGraphQLView):
+    """Async variant of ``CRMGraphQLView`` for ASGI deployments.
+
+    Resolvers see ``info.context.crm_async`` and return awaitables: list
+    fields and mutations use Django's async ORM or hand their sync querysets
+    to the bounded pool in ``crm.aio``, so one worker interleaves many
+    requests instead of blocking a thread on each. Persisted queries, the
+    document cache and cost limits behave as in the sync view. The result
+    cache is skipped because its table recorder cannot see queries made on
+    pool threads, and atomic mutations run whole on a pool thread since
+    ``transaction.atomic`` is sync-only.
+    """
+
+    view_is_async = True
+
+    async def dispatch(self, request, *args, **kwargs):
+        if self.is_atomic_batch(request):
+            # transaction.atomic is sync-only: the whole batch runs on one
+            # pool thread through the sync view
+            return await run_sync(super().dispatch)(request, *args, **kwargs)
+        with replica_reads():
+            return await self.dispatch_async(request)
+
+    async def dispatch_async(self, request):
+        try:
+            if request.method.lower() not in ('get', 'post'):
+                raise HttpError(
+                    HttpResponseNotAllowed(
+                        ['GET', 'POST'], 'GraphQL only supports GET and POST requests.'
+                    )
+                )
+
+            data = self.parse_body(request)
+            if self.batch:
+                responses = [await self.get_response_async(request, entry) for entry in data]
+                result = '[{}]'.format(','.join([response[0] for response in responses]))
+                status_code = (
+                    responses
+                    and max(responses, key=lambda response: response[1])[1]
+                    or 200
+                )
+            else:
+                result, status_code = await self.get_response_async(request, data)
+
+            return HttpResponse(status=status_code, content=result, content_type='application/json')
+
+        except HttpError as e:
+            response = e.response
+            response['Content-Type'] = 'application/json'
+            response.content = self.json_encode(request, {'errors': [self.format_error(e)]})
+            return response
+
+    async def get_response_async(self, request, data):
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+        trace = start_trace(request, self.get_extensions(request, data))
+        result = None
+        try:
+            result = await self.execute_operation_async(request, data, query, variables, operation_name)
+        finally:
+            finish_trace(trace, request, result)
+        return self.format_response(request, result, id)
+
+    async def execute_operation_async(self, request, data, query, variables, operation_name):
+        result, operation = self.prepare_operation(request, data, query, variables, operation_name)
+        if operation is None:
+            return result
+        query, document, operation_ast, analysis, remaining = operation
+
+        if introspection_cache.enabled and is_introspection(operation_ast):
+            # Introspection resolvers never touch the database
+            result = self.execute_introspection(
+                query, operation_ast, variables,
+                lambda: self.execute_document(request, document, operation_ast, variables, operation_name),
+            )
+        elif self.is_atomic(operation_ast):
+            result = await run_sync(self.execute_document)(
+                request, document, operation_ast, variables, operation_name
+            )
+        else:
+            request.crm_async = True
+            result = await self.execute_document_async(
+                request, document, variables, operation_name
+            )
+        return self.add_cost(result, analysis, remaining)
+
+    async def execute_document_async(self, request, document, variables, operation_name):
+        try:
+            result = execute(
+                self.schema.graphql_schema,
+                document,
+                **self.get_execute_options(request, variables, operation_name),
+            )
+            if isawaitable(result):
+                result = await result
+            return result
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+
+def metrics_view(request):
+    """Histograms of traced GraphQL operations and catalog statistics in the Prometheus text format."""
+    return HttpResponse(metrics.render() + catalog.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
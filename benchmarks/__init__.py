@@ -0,0 +1,24 @@
+import os
+import tempfile
+
+
+def setup_django(db_path=None):
+    """Configure Django against a scratch SQLite file and migrate it.
+
+    Benchmarks never touch the project's db.sqlite3 or its replica. Returns
+    the path used.
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alx_backend_graphql.settings')
+    from django.conf import settings
+
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(prefix='crm-bench-'), 'bench.sqlite3')
+    settings.DATABASES['default']['NAME'] = db_path
+    settings.CRM_READ_DATABASE = None
+
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    call_command('migrate', verbosity=0)
+    return db_path
@@ -0,0 +1,140 @@
+"""Throughput and latency of /graphql vs /graphql/async under concurrent clients.
+
+    python -m benchmarks.async_load --clients 50 --requests 20 --latency-ms 2
+
+The sync view is driven by a thread per client (as a threaded WSGI server
+would), the async view by coroutines on one event loop (as an ASGI worker
+would). ``--latency-ms`` adds a sleep to every SQL statement to stand in for
+a networked database; SQLite itself answers in microseconds.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import setup_django
+
+QUERY = '''
+{
+  allOrders(first: 20) {
+    totalCount
+    edges { node { totalAmount customer { name } products { edges { node { name price } } } } }
+  }
+}
+'''
+
+
+def seed(customers, products, orders_per_customer):
+    from crm.models import Customer, Order, Product
+
+    catalog = Product.objects.bulk_create(
+        Product(name=f'Product {i}', price='9.99', stock=100) for i in range(products)
+    )
+    buyers = Customer.objects.bulk_create(
+        Customer(name=f'Customer {i}', email=f'load{i}@example.com') for i in range(customers)
+    )
+    orders = Order.objects.bulk_create(
+        Order(customer=customer, total_amount='19.98') for customer in buyers for _ in range(orders_per_customer)
+    )
+    Through = Order.products.through
+    Through.objects.bulk_create(
+        Through(order_id=order.pk, product_id=catalog[(i + j) % products].pk, price='9.99')
+        for i, order in enumerate(orders)
+        for j in range(2)
+    )
+
+
+def add_latency(latency):
+    from django.db.backends.signals import connection_created
+
+    def delay(execute, sql, params, many, context):
+        time.sleep(latency)
+        return execute(sql, params, many, context)
+
+    def install(sender, connection, **kwargs):
+        connection.execute_wrappers.append(delay)
+
+    connection_created.connect(install, weak=False)
+
+
+def report(label, latencies, elapsed):
+    latencies = sorted(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(
+        f'{label:<6} {len(latencies):>6} requests {elapsed:>8.3f}s {len(latencies) / elapsed:>9.1f} req/s '
+        f'p50 {statistics.median(latencies) * 1000:>8.1f}ms p99 {p99 * 1000:>8.1f}ms'
+    )
+
+
+def run_sync(clients, requests):
+    from django.test import Client
+
+    body = json.dumps({'query': QUERY})
+
+    def client_loop(_):
+        client = Client()
+        timings = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            response = client.post('/graphql', data=body, content_type='application/json')
+            timings.append(time.perf_counter() - start)
+            assert 'errors' not in response.json(), response.content
+        return timings
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        latencies = [t for timings in pool.map(client_loop, range(clients)) for t in timings]
+    report('sync', latencies, time.perf_counter() - start)
+
+
+def run_async(clients, requests):
+    from django.test import AsyncClient
+
+    body = json.dumps({'query': QUERY})
+
+    async def client_loop():
+        client = AsyncClient()
+        timings = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            response = await client.post('/graphql/async', data=body, content_type='application/json')
+            timings.append(time.perf_counter() - start)
+            assert 'errors' not in response.json(), response.content
+        return timings
+
+    async def main():
+        return await asyncio.gather(*(client_loop() for _ in range(clients)))
+
+    start = time.perf_counter()
+    latencies = [t for timings in asyncio.run(main()) for t in timings]
+    report('async', latencies, time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=20, help='requests per client')
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--customers', type=int, default=200)
+    parser.add_argument('--products', type=int, default=50)
+    options = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+
+    settings.DEBUG = False
+    settings.ALLOWED_HOSTS = ['testserver']
+    # Measure execution, not cache hits
+    settings.GRAPHQL_RESULT_CACHE = None
+
+    seed(options.customers, options.products, orders_per_customer=3)
+    if options.latency_ms:
+        add_latency(options.latency_ms / 1000)
+    run_sync(options.clients, options.requests)
+    run_async(options.clients, options.requests)
+
+
+if __name__ == '__main__':
+    main()
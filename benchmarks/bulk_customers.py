@@ -0,0 +1,68 @@
+"""Rows/sec of bulkCreateCustomers: the old per-row loop vs the set-based path.
+
+    python -m benchmarks.bulk_customers --rows 10000 --chunk-size 500
+"""
+import argparse
+import time
+from types import SimpleNamespace
+
+from benchmarks import setup_django
+
+
+def per_row_create(rows):
+    # The original BulkCreateCustomers.mutate: one exists() and one save() per row
+    from crm.models import Customer
+
+    customers, errors = [], []
+    for row in rows:
+        if Customer.objects.filter(email=row.email).exists():
+            errors.append(f"Email {row.email} already exists")
+            continue
+        customer = Customer(name=row.name, email=row.email, phone=row.phone)
+        customer.save()
+        customers.append(customer)
+    return customers, errors
+
+
+def make_rows(count, prefix):
+    return [
+        SimpleNamespace(name=f'Customer {i}', email=f'{prefix}{i}@example.com', phone='+100000000')
+        for i in range(count)
+    ]
+
+
+def measure(label, create, rows):
+    from django.db import connection
+
+    queries = 0
+
+    def count(execute, sql, params, many, context):
+        nonlocal queries
+        queries += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count):
+        start = time.perf_counter()
+        customers, errors = create(rows)
+        elapsed = time.perf_counter() - start
+    print(
+        f'{label:<12} {len(rows):>8} rows {elapsed:>8.3f}s {len(rows) / elapsed:>10.0f} rows/s '
+        f'{queries:>7} queries ({len(customers)} created, {len(errors)} errors)'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--chunk-size', type=int, default=None)
+    options = parser.parse_args()
+
+    setup_django()
+    from crm.bulk import bulk_create_customers
+
+    measure('per-row', per_row_create, make_rows(options.rows, 'old'))
+    measure('set-based', lambda rows: bulk_create_customers(rows, options.chunk_size), make_rows(options.rows, 'new'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+"""Deterministic synthetic CRM data at a chosen scale.
+
+    python -m benchmarks.data --scale 1m [--seed 42] [--db /tmp/crm.sqlite3]
+
+The same scale and seed always produce the same rows, so benchmark runs on
+different machines or commits measure identical data. Rows are written with
+executemany in large batches, with the search triggers dropped and the FTS
+index rebuilt once at the end; the sales rollups are rebuilt last.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+# Orders per scale; customers and products are derived from it
+SCALES = {
+    '10k': 10_000,
+    '100k': 100_000,
+    '1m': 1_000_000,
+    '10m': 10_000_000,
+}
+BATCH_SIZE = 10_000
+EPOCH = datetime(2024, 1, 1)
+
+FIRST_NAMES = ['Ada', 'Alan', 'Grace', 'Linus', 'Margaret', 'Dennis', 'Barbara', 'Ken', 'Frances', 'Edsger']
+LAST_NAMES = ['Lovelace', 'Turing', 'Hopper', 'Torvalds', 'Hamilton', 'Ritchie', 'Liskov', 'Thompson', 'Allen', 'Dijkstra']
+ADJECTIVES = ['Brass', 'Steel', 'Oak', 'Glass', 'Copper', 'Paper', 'Wool', 'Stone']
+NOUNS = ['Lamp', 'Desk', 'Chair', 'Pen', 'Mug', 'Notebook', 'Clock', 'Shelf']
+
+
+class Spec:
+    def __init__(self, scale, seed=42):
+        self.scale = scale
+        self.seed = seed
+        self.orders = SCALES[scale]
+        self.customers = max(100, self.orders // 5)
+        self.products = max(100, self.orders // 100)
+        self.max_products_per_order = 5
+
+    def as_dict(self):
+        return {
+            'scale': self.scale,
+            'seed': self.seed,
+            'customers': self.customers,
+            'products': self.products,
+            'orders': self.orders,
+        }
+
+    def default_db_path(self):
+        return os.path.join(tempfile.gettempdir(), f'crm-bench-{self.scale}-seed{self.seed}.sqlite3')
+
+
+def timestamp(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S.%f')
+
+
+def insert(cursor, table, columns, rows):
+    sql = f'INSERT INTO "{table}" ({", ".join(columns)}) VALUES ({", ".join(["%s"] * len(columns))})'
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            cursor.executemany(sql, batch)
+            batch = []
+    if batch:
+        cursor.executemany(sql, batch)
+
+
+def customers(spec, rng):
+    for pk in range(1, spec.customers + 1):
+        name = f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {pk}'
+        phone = f'+1{rng.randrange(10 ** 9):09d}' if rng.random() < 0.8 else None
+        created = EPOCH + timedelta(minutes=pk * 3 + rng.randrange(3))
+        yield pk, name, f'customer{pk}@example.com', phone, timestamp(created)
+
+
+def products(spec, rng, prices):
+    for pk in range(1, spec.products + 1):
+        price = Decimal(rng.randrange(100, 50_000)) / 100
+        prices.append(price)
+        yield pk, f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {pk}', str(price), rng.randrange(1000)
+
+
+def orders(spec, rng, prices, lines):
+    for pk in range(1, spec.orders + 1):
+        chosen = rng.sample(range(1, spec.products + 1), rng.randint(1, spec.max_products_per_order))
+        lines.extend((pk, product_id, str(prices[product_id - 1])) for product_id in sorted(chosen))
+        total = sum(prices[product_id - 1] for product_id in chosen)
+        ordered = EPOCH + timedelta(seconds=pk * 30 + rng.randrange(30))
+        yield pk, rng.randint(1, spec.customers), str(total), timestamp(ordered)
+
+
+def is_generated(spec):
+    from crm.models import Customer, Order, Product
+
+    return (
+        Customer.objects.count() == spec.customers
+        and Product.objects.count() == spec.products
+        and Order.objects.count() == spec.orders
+    )
+
+
+def generate(spec, report=print):
+    """Fill the (empty, migrated) default database with ``spec``'s rows."""
+    from django.db import connection, transaction
+
+    from crm.importer import drop_indexes, restore_indexes
+    from crm.models import Customer, Order, Product
+    from crm.rollups import rebuild
+
+    rng = random.Random(spec.seed)
+    started = time.perf_counter()
+    models = [Customer, Product, Order]
+    drop_indexes(models)
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            insert(cursor, 'crm_customer', ['id', 'name', 'email', 'phone', 'created_at'], customers(spec, rng))
+            report(f'customers: {spec.customers}')
+            prices = []
+            insert(cursor, 'crm_product', ['id', 'name', 'price', 'stock'], products(spec, rng, prices))
+            report(f'products: {spec.products}')
+            through = Order.products.through._meta.db_table
+            remaining = spec.orders
+            generator = orders(spec, rng, prices, lines := [])
+            while remaining:
+                count = min(BATCH_SIZE * 10, remaining)
+                insert(cursor, 'crm_order', ['id', 'customer_id', 'total_amount', 'order_date'], (
+                    next(generator) for _ in range(count)
+                ))
+                insert(cursor, through, ['order_id', 'product_id', 'price'], lines)
+                lines.clear()
+                remaining -= count
+                report(f'orders: {spec.orders - remaining}/{spec.orders}')
+    finally:
+        restore_indexes(models)
+    written = rebuild()
+    report(f'rollups: {written}')
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    report(f'generated in {time.perf_counter() - started:.1f}s')
+
+
+def prepare(scale, seed=42, db_path=None, report=print):
+    """Configure Django on the scale's database, generating it on first use."""
+    from benchmarks import setup_django
+
+    spec = Spec(scale, seed)
+    path = db_path or spec.default_db_path()
+    setup_django(path)
+    if is_generated(spec):
+        return spec
+    from crm.models import Customer
+
+    if Customer.objects.exists():
+        # Left over from another scale or an interrupted run: start again
+        from django.db import connection
+
+        connection.close()
+        os.remove(path)
+        setup_django(path)
+    generate(spec, report)
+    return spec
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', choices=SCALES, default='10k')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--db', help='SQLite file to fill (default: one per scale and seed in the temp dir)')
+    options = parser.parse_args()
+    spec = prepare(options.scale, options.seed, options.db)
+    print(spec.as_dict())
+
+
+if __name__ == '__main__':
+    main()
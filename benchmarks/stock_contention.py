@@ -0,0 +1,134 @@
+"""Orders/sec and oversell of createOrder with many writers on a few hot products.
+
+    python -m benchmarks.stock_contention --writers 16 --orders 100 --skus 3 --stock 200
+    python -m benchmarks.stock_contention --naive
+
+Every writer thread posts createOrder for one or two of ``--skus`` products
+until it has tried ``--orders`` times. Demand is meant to exceed stock, so
+some orders fail with "Insufficient stock". Afterwards each product's sold
+units (order lines) are checked against its stock: oversold units and lost
+updates must both be zero. ``--naive`` replaces the conditional UPDATE with
+the read-check-save a first stock check would use, for comparison.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+
+from benchmarks import setup_django
+
+MUTATION = 'mutation($c: ID!, $p: [ID]!) { createOrder(input: {customerId: $c, productIds: $p}) { order { id } } }'
+
+
+def naive_place_order(customer, products):
+    # Read, check, then write back: two checkouts that read the same stock
+    # both pass the check and one decrement is lost
+    from crm.models import Order, Product
+    from crm.stock import OutOfStock
+
+    for product in products:
+        current = Product.objects.get(pk=product.pk)
+        if current.stock < 1:
+            raise OutOfStock([current])
+        current.stock -= 1
+        current.save(update_fields=['stock'])
+    order = Order.objects.create(customer=customer, total_amount=sum(product.price for product in products))
+    order.products.set(products)
+    return order
+
+
+def writer(customer_id, product_ids, orders, seed, counts, lock):
+    from django.db import connection
+    from django.test import Client
+
+    client = Client()
+    rng = random.Random(seed)
+    local = {'created': 0, 'out_of_stock': 0, 'errors': 0}
+    try:
+        for _ in range(orders):
+            chosen = rng.sample(product_ids, rng.randint(1, min(2, len(product_ids))))
+            response = client.post(
+                '/graphql',
+                json.dumps({'query': MUTATION, 'variables': {'c': customer_id, 'p': chosen}}),
+                content_type='application/json',
+            )
+            errors = response.json().get('errors')
+            if not errors:
+                local['created'] += 1
+            elif errors[0]['message'].startswith('Insufficient stock'):
+                local['out_of_stock'] += 1
+            else:
+                local['errors'] += 1
+                local.setdefault('first_error', errors[0]['message'])
+    finally:
+        connection.close()
+    with lock:
+        for key, value in local.items():
+            if key == 'first_error':
+                counts.setdefault(key, value)
+            else:
+                counts[key] += value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--writers', type=int, default=16)
+    parser.add_argument('--orders', type=int, default=100, help='createOrder attempts per writer')
+    parser.add_argument('--skus', type=int, default=3)
+    parser.add_argument('--stock', type=int, default=200, help='Initial stock of each hot product')
+    parser.add_argument('--naive', action='store_true', help='Use read-then-write stock updates')
+    options = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.db import connection
+
+    from crm import schema
+    from crm.models import Customer, Order, Product
+
+    settings.DEBUG = False
+    settings.ALLOWED_HOSTS = ['testserver']
+    settings.GRAPHQL_RESULT_CACHE = None
+    if options.naive:
+        schema.place_order = naive_place_order
+
+    customer = Customer.objects.create(name='Load', email='load@example.com')
+    products = [
+        Product.objects.create(name=f'Hot {i}', price='1.00', stock=options.stock) for i in range(options.skus)
+    ]
+    product_ids = [product.pk for product in products]
+    connection.close()
+
+    counts = {'created': 0, 'out_of_stock': 0, 'errors': 0}
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=writer, args=(customer.pk, product_ids, options.orders, seed, counts, lock))
+        for seed in range(options.writers)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    through = Order.products.through
+    oversold = lost = 0
+    for product in Product.objects.filter(pk__in=product_ids).order_by('pk'):
+        sold = through.objects.filter(product_id=product.pk).count()
+        oversold += max(0, sold - options.stock)
+        lost += sold - (options.stock - product.stock)
+    attempts = options.writers * options.orders
+    print(
+        f'{"naive" if options.naive else "conditional":<11} {options.writers} writers {attempts} attempts '
+        f'{elapsed:.2f}s {counts["created"] / elapsed:.0f} orders/s '
+        f'({counts["created"]} created, {counts["out_of_stock"]} out of stock, {counts["errors"]} errors)'
+    )
+    print(f'oversold units: {oversold}  lost stock updates: {lost}')
+    if 'first_error' in counts:
+        print(f'first error: {counts["first_error"]}')
+
+
+if __name__ == '__main__':
+    main()
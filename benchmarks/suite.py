@@ -0,0 +1,307 @@
+"""Latency, SQL queries and peak memory of every root field, filter and mutation.
+
+    python -m benchmarks.suite --scale 10k --output results.json
+    python -m benchmarks.suite --scale 10k --baseline benchmarks/baselines/10k.json
+
+Each case is one GraphQL request through the full /graphql view against the
+synthetic data of ``benchmarks.data``. It is run ``--iterations`` times
+after a warm-up for wall time percentiles, then once more under tracemalloc
+for peak memory. The response cache is disabled and mutations are rolled
+back, so every iteration does the same work. With ``--baseline`` the run
+exits with status 1 when a case's p50 grew by more than ``--threshold`` or
+it issued more queries than in the baseline.
+"""
+import argparse
+import itertools
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+from graphql_relay import to_global_id
+
+from benchmarks.data import SCALES, prepare
+
+PAGE = 50
+
+ROOT_FIELDS = {
+    'allCustomers': 'id name email phone createdAt',
+    'allProducts': 'id name price stock',
+    'allOrders': 'id totalAmount orderDate customer { id name } products(first: 5) { edges { node { id name } } }',
+}
+
+# One representative value per filter; check_coverage keeps this in step with crm.filters
+FILTER_VALUES = {
+    'allCustomers': {
+        'name': '"Ada"',
+        'email': '"customer1"',
+        'createdAt': '"2024-01-01"',
+        'search': '"ada lovelace"',
+        'phonePattern': '"+11"',
+        'orderCountGte': '8',
+        'orderCountLte': '2',
+        'totalSpentGte': '5000',
+        'totalSpentLte': '500',
+        'lastOrderDateGte': '"2024-12-01"',
+        'lastOrderDateLte': '"2024-01-31"',
+    },
+    'allProducts': {
+        'name': '"Lamp"',
+        'price': '"10,100"',
+        'stock': '10',
+        'search': '"brass"',
+        'priceGte': '100',
+        'priceLte': '200',
+        'stockGte': '100',
+        'stockLte': '500',
+        'unitsSoldGte': '150',
+        'unitsSoldLte': '50',
+    },
+    'allOrders': {
+        'totalAmount': '500',
+        'orderDate': '"2024-01-01"',
+        'orderDateGte': '"2024-01-03T00:00:00"',
+        'orderDateLte': '"2024-01-02T00:00:00"',
+        'search': '"ada"',
+        'totalAmountGte': '500',
+        'totalAmountLte': '800',
+        'customerName': '"Ada"',
+        'productName': '"Lamp"',
+    },
+}
+
+ORDER_BY = {
+    'allCustomers': '-createdAt',
+    'allProducts': 'price',
+    'allOrders': '-totalAmount',
+}
+
+# Computed fields (crm.computed), selected and ordered by
+COMPUTED = {
+    'allCustomers': ('-totalSpent', 'id name orderCount totalSpent lastOrderDate'),
+    'allProducts': ('-unitsSold', 'id name unitsSold'),
+}
+
+NESTED = {
+    'allCustomers': 'id name orders(first: 5) { edges { node { id totalAmount products(first: 3) { edges { node { name } } } } } }',
+    'allProducts': 'id name orders(first: 5) { edges { node { id customer { name } } } }',
+}
+
+# Root fields that are not connections, as whole documents
+FIELD_QUERIES = {
+    'hello': '{ hello }',
+    'salesByDay': '{ salesByDay(from: "2024-01-01", to: "2024-01-31") { date orders revenue } }',
+    'topProducts': '{ topProducts(n: 10) { product { name } units revenue } }',
+    'topCustomers': '{ topCustomers(n: 10) { customer { name } orders revenue } }',
+    'job': '{ job(id: "1") { status total processed failed errors { index message } } }',
+    'node': f'{{ node(id: "{to_global_id("OrderType", 1)}") {{ id ... on OrderType {{ totalAmount customer {{ name }} }} }} }}',
+    'nodes': '{ nodes(ids: [%s]) { id ... on CustomerType { name orderCount } ... on ProductType { name price } } }' % ', '.join(
+        f'"{to_global_id(type_name, pk)}"' for type_name in ('CustomerType', 'ProductType') for pk in range(1, 51)
+    ),
+}
+
+MUTATION_FIELDS = {
+    'createCustomer': 'customer { id } message',
+    'bulkCreateCustomers': 'customers { id } errors',
+    'createProduct': 'product { id }',
+    'createOrder': 'order { id totalAmount }',
+    'bulkCreateOrders': 'orders { id } errors',
+}
+
+
+class Case:
+    def __init__(self, name, query, mutation=False):
+        self.name = name
+        self.query = query
+        self.mutation = mutation
+
+    def document(self, n):
+        return self.query(n) if callable(self.query) else self.query
+
+
+def connection_query(field, arguments='', selection=None):
+    arguments = ', '.join([f'first: {PAGE}'] + ([arguments] if arguments else []))
+    return f'{{ {field}({arguments}) {{ edges {{ node {{ {selection or ROOT_FIELDS[field]} }} }} pageInfo {{ hasNextPage endCursor }} }} }}'
+
+
+def mutation_inputs(spec):
+    from crm.models import Product
+
+    # createOrder takes stock, so it only picks products that have some
+    in_stock = list(Product.objects.filter(stock__gt=0).order_by('pk').values_list('pk', flat=True))
+    # ``n`` keeps the unique columns of each iteration distinct
+    customer = lambda n: f'{{ name: "Bench {n}", email: "bench{n}@example.com", phone: "+1555{n:07d}" }}'
+    product_ids = lambda n: ', '.join(f'"{in_stock[(n + i) % len(in_stock)]}"' for i in range(3))
+    order = lambda n: f'{{ customerId: "{1 + n % spec.customers}", productIds: [{product_ids(n)}] }}'
+    return {
+        'createCustomer': lambda n: f'input: {customer(n)}',
+        'bulkCreateCustomers': lambda n: f'input: [{", ".join(customer(n * 100 + i) for i in range(100))}]',
+        'createProduct': lambda n: f'input: {{ name: "Bench product {n}", price: "9.99", stock: 10 }}',
+        'createOrder': lambda n: f'input: {order(n)}',
+        'bulkCreateOrders': lambda n: f'input: [{", ".join(order(n * 100 + i) for i in range(100))}]',
+    }
+
+
+def build_cases(spec):
+    cases = []
+    for field in ROOT_FIELDS:
+        cases.append(Case(field, connection_query(field)))
+        for name, value in FILTER_VALUES[field].items():
+            cases.append(Case(f'{field}({name})', connection_query(field, f'{name}: {value}')))
+        cases.append(Case(f'{field}(orderBy)', connection_query(field, f'orderBy: "{ORDER_BY[field]}"')))
+        if field in COMPUTED:
+            ordering, selection = COMPUTED[field]
+            cases.append(Case(f'{field} computed', connection_query(field, f'orderBy: "{ordering}"', selection)))
+        if field in NESTED:
+            cases.append(Case(f'{field} nested', connection_query(field, selection=NESTED[field])))
+    for field, query in FIELD_QUERIES.items():
+        cases.append(Case(field, query))
+    for field, arguments in mutation_inputs(spec).items():
+        cases.append(Case(field, lambda n, field=field, arguments=arguments: (
+            f'mutation {{ {field}({arguments(n)}) {{ {MUTATION_FIELDS[field]} }} }}'
+        ), mutation=True))
+    return cases
+
+
+def check_coverage():
+    """Fail loudly when a root field, filter or mutation is added without a benchmark."""
+    from graphene.utils.str_converters import to_camel_case
+
+    from alx_backend_graphql.schema import schema
+    from crm.filters import CustomerFilter, OrderFilter, ProductFilter
+    from crm.schema import Mutation
+
+    missing = [
+        name for name in schema.graphql_schema.query_type.fields
+        if name not in ROOT_FIELDS and name not in FIELD_QUERIES
+    ]
+    for field, filterset in (('allCustomers', CustomerFilter), ('allProducts', ProductFilter), ('allOrders', OrderFilter)):
+        missing += [f'{field}({to_camel_case(name)})' for name in filterset.base_filters if to_camel_case(name) not in FILTER_VALUES[field]]
+    missing += [to_camel_case(name) for name in Mutation._meta.fields if to_camel_case(name) not in MUTATION_FIELDS]
+    if missing:
+        raise SystemExit(f'No benchmark for: {", ".join(missing)}')
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def run_case(client, case, iterations, warmup, counter):
+    from django.db import connection, transaction
+
+    queries = 0
+
+    def count(execute, sql, params, many, context):
+        nonlocal queries
+        queries += 1
+        return execute(sql, params, many, context)
+
+    def request():
+        with transaction.atomic():
+            response = client.post(
+                '/graphql', {'query': case.document(next(counter))}, content_type='application/json'
+            )
+            transaction.set_rollback(case.mutation)
+        body = response.json()
+        if response.status_code != 200 or body.get('errors'):
+            raise SystemExit(f'{case.name} failed: {body}')
+
+    for _ in range(warmup):
+        request()
+    samples = []
+    for _ in range(iterations):
+        queries = 0
+        with connection.execute_wrapper(count):
+            start = time.perf_counter()
+            request()
+            samples.append(time.perf_counter() - start)
+    # The last iteration's count; the ORM work is the same every time
+    query_count = queries
+    # Traced separately: tracemalloc slows allocation several-fold
+    tracemalloc.start()
+    request()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'wall_ms': round(sum(samples) * 1000, 3),
+        'p50_ms': round(percentile(samples, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 0.99) * 1000, 3),
+        'queries': query_count,
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Return the cases that regressed against ``baseline``, as printable lines."""
+    regressions = []
+    for name, current in results['cases'].items():
+        previous = baseline['cases'].get(name)
+        if previous is None:
+            continue
+        if current['p50_ms'] > previous['p50_ms'] * (1 + threshold):
+            regressions.append(f'{name}: p50 {previous["p50_ms"]}ms -> {current["p50_ms"]}ms')
+        if current['queries'] > previous['queries']:
+            regressions.append(f'{name}: queries {previous["queries"]} -> {current["queries"]}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', choices=SCALES, default='10k')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--db', help='SQLite file for the synthetic data (see benchmarks.data)')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--filter', default='', help='Only run cases whose name contains this')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    parser.add_argument('--baseline', help='Compare against the JSON of an earlier run')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Allowed p50 slowdown (0.25 = 25%%)')
+    options = parser.parse_args()
+
+    spec = prepare(options.scale, options.seed, options.db)
+    from django.conf import settings
+    from django.test import Client
+
+    settings.DEBUG = False
+    settings.ALLOWED_HOSTS = ['testserver']
+    settings.GRAPHQL_RESULT_CACHE = None
+    settings.GRAPHQL_TRACING_SAMPLE_RATE = 0
+    check_coverage()
+
+    client = Client()
+    counter = itertools.count()
+    results = {
+        'data': spec.as_dict(),
+        'iterations': options.iterations,
+        'python': platform.python_version(),
+        'cases': {},
+    }
+    print(f'{"case":<34} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"queries":>8} {"peak KB":>9}')
+    for case in build_cases(spec):
+        if options.filter not in case.name:
+            continue
+        result = run_case(client, case, options.iterations, options.warmup, counter)
+        results['cases'][case.name] = result
+        print(
+            f'{case.name:<34} {result["p50_ms"]:>9.2f} {result["p95_ms"]:>9.2f} {result["p99_ms"]:>9.2f} '
+            f'{result["queries"]:>8} {result["peak_memory_kb"]:>9.1f}'
+        )
+
+    if options.output:
+        with open(options.output, 'w') as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+            output.write('\n')
+    if options.baseline:
+        with open(options.baseline) as baseline:
+            regressions = compare(results, json.load(baseline), options.threshold)
+        for line in regressions:
+            print(f'REGRESSION {line}')
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
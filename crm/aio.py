@@ -0,0 +1,44 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+DEFAULT_MAX_THREADS = 8
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'GRAPHQL_ASYNC_MAX_THREADS', DEFAULT_MAX_THREADS),
+                thread_name_prefix='crm-orm',
+            )
+        return _executor
+
+
+def is_async(info):
+    """True when the field is being resolved by the async GraphQL view."""
+    return getattr(info.context, 'crm_async', False)
+
+
+def run_sync(func):
+    """Wrap sync ORM code so it runs in the bounded ``crm-orm`` thread pool.
+
+    Unlike ``sync_to_async``'s default single thread, calls made through the
+    pool run in parallel, so independent sibling fields overlap. Each worker
+    keeps its own connection, released per ``CONN_MAX_AGE`` after every call.
+    """
+
+    def call(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(call, thread_sensitive=False, executor=get_executor())
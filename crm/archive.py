@@ -0,0 +1,142 @@
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import ArchivedOrder, ArchivedOrderItem, Order
+from .versions import model_versions
+
+DEFAULT_HOT_DAYS = 90
+DEFAULT_BATCH_SIZE = 1000
+
+
+def horizon():
+    """Orders placed before this moment belong in the archive."""
+    return timezone.now() - timedelta(days=getattr(settings, 'CRM_ORDER_HOT_DAYS', DEFAULT_HOT_DAYS))
+
+
+def copy_sql(connection, source, target, column_map, key, count):
+    """``INSERT INTO target SELECT ... FROM source WHERE key IN (...)`` for ``count`` keys."""
+    quote = connection.ops.quote_name
+    return (
+        f'INSERT INTO {quote(target._meta.db_table)} '
+        f'({", ".join(quote(target._meta.get_field(name).column) for name in column_map.values())}) '
+        f'SELECT {", ".join(quote(source._meta.get_field(name).column) for name in column_map)} '
+        f'FROM {quote(source._meta.db_table)} '
+        f'WHERE {quote(source._meta.get_field(key).column)} IN ({", ".join(["%s"] * count)})'
+    )
+
+
+def delete_sql(connection, model, key, count):
+    quote = connection.ops.quote_name
+    return (
+        f'DELETE FROM {quote(model._meta.db_table)} '
+        f'WHERE {quote(model._meta.get_field(key).column)} IN ({", ".join(["%s"] * count)})'
+    )
+
+
+def archive_batch(before, batch_size=DEFAULT_BATCH_SIZE):
+    """Move up to ``batch_size`` of the oldest orders placed before ``before``.
+
+    Orders and their line items are copied and deleted in one transaction
+    with plain SQL, so an interrupted run leaves every order in exactly one
+    partition and the next run carries on with the orders that are left.
+    Returns how many orders were moved.
+    """
+    using = router.db_for_write(Order)
+    connection = connections[using]
+    Line = Order.products.through
+    with transaction.atomic(using=using):
+        pks = list(
+            Order.objects.using(using).select_for_update()
+            .filter(order_date__lt=before).order_by('order_date', 'pk')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not pks:
+            return 0
+        with connection.cursor() as cursor:
+            fields = {name: name for name in ('id', 'customer', 'total_amount', 'order_date')}
+            cursor.execute(copy_sql(connection, Order, ArchivedOrder, fields, 'id', len(pks)), pks)
+            fields = {'order': 'order', 'product': 'product', 'price': 'price'}
+            cursor.execute(copy_sql(connection, Line, ArchivedOrderItem, fields, 'order', len(pks)), pks)
+            cursor.execute(delete_sql(connection, Line, 'order', len(pks)), pks)
+            cursor.execute(delete_sql(connection, Order, 'id', len(pks)), pks)
+        # Raw SQL sends no signals
+        model_versions.bump(Order, Line, ArchivedOrder, ArchivedOrderItem)
+    return len(pks)
+
+
+def archive_orders(before=None, batch_size=DEFAULT_BATCH_SIZE, max_batches=None):
+    """Archive every order placed before ``before`` (default: ``horizon()``), one batch per transaction.
+
+    Yields the number of orders moved by each batch.
+    """
+    before = horizon() if before is None else before
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        moved = archive_batch(before, batch_size)
+        if not moved:
+            return
+        batches += 1
+        yield moved
+
+
+class ArchiveBoundary:
+    """Newest ``order_date`` in the archive, cached per ``ArchivedOrder`` version.
+
+    Reads compare their date range against it rather than against
+    ``horizon()``, so they stay correct when ``CRM_ORDER_HOT_DAYS`` changes
+    between archive runs.
+    """
+
+    def __init__(self):
+        self._cached = (None, None)
+        self._lock = threading.Lock()
+
+    def get(self):
+        version = model_versions.get(ArchivedOrder)
+        with self._lock:
+            cached_version, value = self._cached
+        if cached_version == version:
+            return value
+        value = ArchivedOrder.objects.aggregate(newest=Max('order_date'))['newest']
+        with self._lock:
+            self._cached = (version, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._cached = (None, None)
+
+
+archive_boundary = ArchiveBoundary()
+
+
+def has_archive():
+    """True once any order has been archived; reads that also cover archived orders check it first."""
+    return archive_boundary.get() is not None
+
+
+def aware(value):
+    if value is not None and timezone.is_naive(value):
+        return timezone.make_aware(value)
+    return value
+
+
+def archived_orders(args):
+    """The archived orders an ``allOrders`` request reads along with the live ones, or None.
+
+    Only a request whose ``orderDateGte``/``orderDateLte`` range starts at
+    or before the newest archived order reaches the archive; everything
+    else, including requests without a date range, reads the live orders.
+    """
+    gte, lte = aware(args.get('order_date_gte')), aware(args.get('order_date_lte'))
+    if gte is None and lte is None:
+        return None
+    newest = archive_boundary.get()
+    if newest is None or (gte is not None and gte > newest):
+        return None
+    return ArchivedOrder.objects.all()
@@ -0,0 +1,210 @@
+from collections import Counter
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from .models import Customer, Product, Order
+from .nodes import decode_id
+from .rollups import record_orders
+from .stock import OutOfStock, reserve_stock
+from .versions import model_versions
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+def get_chunk_size(chunk_size=None):
+    return chunk_size or getattr(settings, 'CRM_BULK_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def parse_pk(value, type_name):
+    # A raw pk or a global ID of ``type_name`` (see crm.nodes.decode_id)
+    try:
+        return int(decode_id(value, type_name))
+    except (TypeError, ValueError):
+        return None
+
+
+def in_bulk(queryset, pks, chunk_size):
+    """``{pk: instance}`` for ``pks``, one IN query per chunk."""
+    found = {}
+    for chunk in chunked(sorted(pks), chunk_size):
+        found.update(queryset.in_bulk(chunk))
+    return found
+
+
+class RowError:
+    def __init__(self, index, message):
+        self.index = index
+        self.message = message
+
+    def __str__(self):
+        return self.message
+
+
+def bulk_create_customers(rows, chunk_size=None):
+    """Create customers from ``rows`` (objects with name/email/phone) in bulk.
+
+    Emails repeated within the payload or already stored are reported per row
+    with the index of the offending input. The remaining rows are checked and
+    inserted chunk by chunk, one ``IN`` query and one ``bulk_create`` per chunk,
+    inside a single transaction. Returns ``(customers, errors)``.
+    """
+    chunk_size = get_chunk_size(chunk_size)
+    errors = []
+    pending = []
+    seen = {}
+    for index, row in enumerate(rows):
+        if row.email in seen:
+            errors.append(RowError(index, f"Email {row.email} is duplicated in input (row {seen[row.email]})"))
+            continue
+        seen[row.email] = index
+        pending.append((index, Customer(name=row.name, email=row.email, phone=row.phone)))
+
+    created = []
+    with transaction.atomic():
+        for chunk in chunked(pending, chunk_size):
+            existing = set(
+                Customer.objects
+                .filter(email__in=[customer.email for _, customer in chunk])
+                .values_list('email', flat=True)
+            )
+            new = []
+            for index, customer in chunk:
+                if customer.email in existing:
+                    errors.append(RowError(index, f"Email {customer.email} already exists"))
+                else:
+                    new.append((index, customer))
+            created += insert_chunk(new, errors)
+
+    # bulk_create sends no post_save signals
+    model_versions.bump(Customer)
+    errors.sort(key=lambda error: error.index)
+    return created, errors
+
+
+def insert_chunk(rows, errors):
+    try:
+        with transaction.atomic():
+            return Customer.objects.bulk_create([customer for _, customer in rows])
+    except IntegrityError:
+        pass
+    # Another writer inserted one of these emails after the IN check; fall
+    # back to row-by-row inserts so only the conflicting rows are rejected.
+    created = []
+    for index, customer in rows:
+        try:
+            with transaction.atomic():
+                customer.save(force_insert=True)
+        except IntegrityError:
+            customer.pk = None
+            errors.append(RowError(index, f"Email {customer.email} already exists"))
+        else:
+            created.append(customer)
+    return created
+
+
+def bulk_create_orders(rows, chunk_size=None):
+    """Create orders from ``rows`` (objects with customer_id/product_ids and an optional order_date) in bulk.
+
+    Customers and product prices for the whole payload are fetched up front
+    with chunked IN queries, totals are computed in memory, and the Order rows
+    and their ``Order.products`` through rows are written with chunked
+    ``bulk_create`` in a single transaction, together with the sales
+    rollups. As in ``CreateOrder``, unknown product ids are skipped, a row
+    with none left is rejected, and each order takes one unit of stock per
+    product: ``reserve_stock`` runs once per chunk, and rows it cannot
+    cover are rejected in payload order. Returns ``(orders, errors)``.
+    """
+    chunk_size = get_chunk_size(chunk_size)
+    customer_ids = set()
+    product_ids = set()
+    parsed = []
+    for row in rows:
+        customer_id = parse_pk(row.customer_id, 'CustomerType')
+        row_product_ids = {
+            pk for pk in (parse_pk(value, 'ProductType') for value in row.product_ids or []) if pk is not None
+        }
+        parsed.append((customer_id, row_product_ids, row.order_date))
+        customer_ids.add(customer_id)
+        product_ids |= row_product_ids
+    customer_ids.discard(None)
+
+    customers = set()
+    for chunk in chunked(sorted(customer_ids), chunk_size):
+        customers.update(Customer.objects.filter(pk__in=chunk).values_list('pk', flat=True))
+    products = in_bulk(Product.objects.only('pk', 'price'), product_ids, chunk_size)
+
+    errors = []
+    pending = []
+    for index, (customer_id, row_product_ids, order_date) in enumerate(parsed):
+        if customer_id not in customers:
+            errors.append(RowError(index, "Customer not found"))
+            continue
+        found = sorted(pk for pk in row_product_ids if pk in products)
+        if not found:
+            errors.append(RowError(index, "No valid products found"))
+            continue
+        order = Order(
+            customer_id=customer_id,
+            total_amount=sum(products[pk].price for pk in found),
+            **({'order_date': order_date} if order_date else {}),
+        )
+        pending.append((index, order, found))
+
+    through = Order.products.through
+    created = []
+    with transaction.atomic():
+        for chunk in chunked(pending, chunk_size):
+            chunk = reserve_chunk(chunk, errors)
+            orders = Order.objects.bulk_create([order for _, order, _ in chunk])
+            through.objects.bulk_create(
+                [
+                    through(order_id=order.pk, product_id=product_id, price=products[product_id].price)
+                    for _, order, found in chunk
+                    for product_id in found
+                ],
+                batch_size=chunk_size,
+            )
+            record_orders([
+                (order, [(product_id, products[product_id].price) for product_id in found])
+                for _, order, found in chunk
+            ])
+            created += orders
+    model_versions.bump(Order, through)
+    errors.sort(key=lambda error: error.index)
+    return created, errors
+
+
+def reserve_chunk(chunk, errors):
+    """Reserve stock for the ``(index, order, product_ids)`` rows of ``chunk``.
+
+    Tries the summed quantities first. When products are short, the rows
+    that fit their remaining stock are kept in payload order, the others
+    are rejected, and the smaller chunk is reserved again; a concurrent
+    order can take stock in between, hence the loop. Returns the rows
+    whose stock was taken.
+    """
+    while chunk:
+        try:
+            reserve_stock(Counter(pk for _, _, found in chunk for pk in found))
+            return chunk
+        except OutOfStock as error:
+            short = {product.pk: product for product in error.products}
+        remaining = {pk: product.stock for pk, product in short.items()}
+        kept = []
+        for index, order, found in chunk:
+            missing = [short[pk] for pk in found if pk in short and remaining[pk] < 1]
+            if missing:
+                errors.append(RowError(index, str(OutOfStock(missing))))
+                continue
+            for pk in found:
+                if pk in remaining:
+                    remaining[pk] -= 1
+            kept.append((index, order, found))
+        chunk = kept
+    return chunk
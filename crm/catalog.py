@@ -0,0 +1,187 @@
+import logging
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import DEFAULT_DB_ALIAS, DatabaseError
+from django.db.models.signals import post_delete, post_save
+
+from .models import Product, ProductSales, rows_updated
+from .versions import model_versions, record_read
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CATALOG_SIZE = 10000
+DEFAULT_CATALOG_TTL = 60
+# Version of the product fields the catalog serves; see Catalog
+CATALOG_VERSION = 'crm.Product:catalog'
+
+ProductRecord = namedtuple('ProductRecord', 'id name price stock')
+
+
+class Catalog:
+    """In-process LRU of compact product records, for lookups by id.
+
+    Records are valid for one value of the ``CATALOG_VERSION`` counter in
+    ``crm.versions``, which every ORM save, delete or ``update()`` of a
+    Product bumps; a lookup that sees a new version drops every record
+    first. Updates of ``stock`` alone, like the reservations of
+    ``crm.stock``, do not bump it, so an order does not empty the catalog:
+    a record's ``stock`` is as of when it was loaded, and instances built
+    from records leave ``stock`` deferred so reading it goes to the
+    database. Records also expire ``CRM_CATALOG_TTL`` seconds after they
+    were loaded, which bounds how stale they get when the counter is kept
+    in-process and another process writes a product. Missing records are
+    loaded from the primary in one query, since a lagging replica could
+    return rows older than the version they would be cached under.
+    """
+
+    def __init__(self):
+        self._records = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    @property
+    def max_entries(self):
+        return getattr(settings, 'CRM_CATALOG_SIZE', DEFAULT_CATALOG_SIZE)
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'CRM_CATALOG_TTL', DEFAULT_CATALOG_TTL)
+
+    def get_many(self, pks):
+        """``{pk: ProductRecord}`` of the products in ``pks`` that exist; invalid ids are skipped."""
+        keys = set()
+        for pk in pks:
+            try:
+                keys.add(Product._meta.pk.to_python(pk))
+            except ValidationError:
+                continue
+        # Served without SQL, so the result cache would not see the read
+        record_read(Product)
+        version = model_versions.get(CATALOG_VERSION)
+        ttl = self.ttl
+        oldest = None if ttl is None else time.monotonic() - ttl
+        found = {}
+        with self._lock:
+            if version != self._version:
+                self._records.clear()
+                self._version = version
+            for key in keys:
+                entry = self._records.get(key)
+                if entry is not None and (oldest is None or entry[0] > oldest):
+                    self._records.move_to_end(key)
+                    found[key] = entry[1]
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        missing = keys - found.keys()
+        if missing:
+            loaded = self.load(missing)
+            self.store(version, loaded)
+            found.update(loaded)
+        return found
+
+    def load(self, pks):
+        rows = (
+            Product.objects.using(DEFAULT_DB_ALIAS)
+            .filter(pk__in=pks).values_list(*ProductRecord._fields)
+        )
+        return {row[0]: ProductRecord(*row) for row in rows}
+
+    def store(self, version, records):
+        loaded = time.monotonic()
+        with self._lock:
+            # Loaded under a version that is no longer current
+            if version != self._version:
+                return
+            for key, record in records.items():
+                self._records[key] = (loaded, record)
+                self._records.move_to_end(key)
+            while len(self._records) > self.max_entries:
+                self._records.popitem(last=False)
+                self.evictions += 1
+
+    def products(self, pks):
+        """Product instances for ``pks`` in pk order, with ``stock`` deferred."""
+        records = self.get_many(pks)
+        return [self.instance(records[key]) for key in sorted(records)]
+
+    def product(self, pk):
+        products = self.products([pk])
+        return products[0] if products else None
+
+    @staticmethod
+    def instance(record):
+        return Product.from_db(DEFAULT_DB_ALIAS, ['id', 'name', 'price'], record[:3])
+
+    def warm(self, limit=None):
+        """Load up to ``limit`` (default: the catalog size) products, best sellers first."""
+        limit = self.max_entries if limit is None else min(limit, self.max_entries)
+        pks = list(ProductSales.objects.order_by('-units', 'product_id').values_list('product_id', flat=True)[:limit])
+        if len(pks) < limit:
+            pks += list(
+                Product.objects.exclude(pk__in=pks).order_by('pk')
+                .values_list('pk', flat=True)[:limit - len(pks)]
+            )
+        return len(self.get_many(pks))
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._records),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+    def render(self):
+        """The statistics as Prometheus text, appended to ``/metrics``."""
+        stats = self.stats()
+        lines = []
+        for name, kind, key, documentation in (
+            ('crm_catalog_hits_total', 'counter', 'hits', 'Product lookups served by the catalog.'),
+            ('crm_catalog_misses_total', 'counter', 'misses', 'Product lookups loaded from the database.'),
+            ('crm_catalog_evictions_total', 'counter', 'evictions', 'Records evicted to stay within CRM_CATALOG_SIZE.'),
+            ('crm_catalog_records', 'gauge', 'size', 'Records held by the catalog.'),
+        ):
+            lines += [f'# HELP {name} {documentation}', f'# TYPE {name} {kind}', f'{name} {stats[key]}']
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+            self._version = None
+            self.hits = self.misses = self.evictions = 0
+
+
+catalog = Catalog()
+
+
+def warm_up():
+    """Fill the catalog when ``CRM_CATALOG_WARM`` is set; called by the WSGI and ASGI entry points."""
+    if not getattr(settings, 'CRM_CATALOG_WARM', False):
+        return 0
+    try:
+        return catalog.warm()
+    except DatabaseError as error:
+        # A server started before `migrate` still comes up, just cold
+        logger.warning('Product catalog not warmed: %s', error)
+        return 0
+
+
+def bump_catalog(sender, fields=None, **kwargs):
+    if fields is not None and fields <= {'stock'}:
+        return
+    model_versions.bump(CATALOG_VERSION)
+
+
+def connect_signals():
+    rows_updated.connect(bump_catalog, sender=Product, dispatch_uid='crm.catalog.rows_updated')
+    post_save.connect(bump_catalog, sender=Product, dispatch_uid='crm.catalog.post_save')
+    post_delete.connect(bump_catalog, sender=Product, dispatch_uid='crm.catalog.post_delete')
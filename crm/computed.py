@@ -0,0 +1,119 @@
+from decimal import Decimal
+
+from django.db import models
+from django.db.models import Count, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .archive import has_archive
+from .models import ArchivedOrder, Order
+
+
+class Computed:
+    """An aggregate over a related table, exposed as a field of its model.
+
+    As an annotation it is a correlated subquery rather than a join plus
+    ``GROUP BY``, so it composes with filters that join other tables and
+    is computed only for the rows a query reads. ``default`` stands in for
+    parents without related rows.
+
+    ``archived`` is the archive table holding the rest of ``related``'s
+    rows (``crm.archive``); once anything is archived the aggregate covers
+    both, adding up counts and sums and taking the greater maximum.
+    """
+
+    def __init__(self, name, related, key, aggregate, output_field, default=None, archived=None):
+        self.name = name
+        self.related = related
+        self.archived = archived
+        self.key = key
+        self.aggregate = aggregate
+        self.output_field = output_field
+        self.default = default
+        # Stands in for a model field in crm.pagination.Ordering; expressions
+        # get the unnamed output_field, named fields must belong to a model
+        self.field = output_field.clone()
+        self.field.set_attributes_from_name(name)
+
+    def clean(self, value):
+        # SQLite returns sums of decimals with float precision
+        if value is not None and isinstance(self.field, models.DecimalField):
+            return value.quantize(Decimal(1).scaleb(-self.field.decimal_places))
+        return value
+
+    def subquery(self, related):
+        values = (
+            related.objects.filter(**{self.key: OuterRef('pk')})
+            .order_by().values(self.key).annotate(value=self.aggregate).values('value')
+        )
+        return Subquery(values, output_field=self.output_field)
+
+    def expression(self):
+        value = self.subquery(self.related)
+        if self.archived is not None and has_archive():
+            archived = self.subquery(self.archived)
+            if isinstance(self.aggregate, Max):
+                # Greatest is NULL when either side is
+                value = Greatest(
+                    Coalesce(value, archived), Coalesce(archived, value), output_field=self.output_field,
+                )
+            else:
+                zero = Value(0, output_field=self.output_field)
+                value = Coalesce(value, zero) + Coalesce(archived, zero)
+        if self.default is None:
+            return value
+        return Coalesce(value, Value(self.default), output_field=self.output_field)
+
+
+COMPUTED_FIELDS = {
+    'crm.Customer': {
+        computed.name: computed for computed in (
+            Computed('order_count', Order, 'customer', Count('pk'), models.IntegerField(), 0, ArchivedOrder),
+            Computed(
+                'total_spent', Order, 'customer', Sum('total_amount'),
+                models.DecimalField(max_digits=14, decimal_places=2), Decimal('0.00'), ArchivedOrder,
+            ),
+            Computed('last_order_date', Order, 'customer', Max('order_date'), models.DateTimeField(), archived=ArchivedOrder),
+        )
+    },
+    'crm.Product': {
+        computed.name: computed for computed in (
+            Computed(
+                'units_sold', Order.products.through, 'product', Count('pk'), models.IntegerField(), 0,
+                ArchivedOrder.products.through,
+            ),
+        )
+    },
+}
+
+
+def computed_fields(model):
+    return COMPUTED_FIELDS.get(model._meta.label, {})
+
+
+def annotate_computed(queryset, names):
+    """Annotate ``queryset`` with the computed fields in ``names`` it does not have yet."""
+    fields = computed_fields(queryset.model)
+    missing = {
+        name: fields[name].expression()
+        for name in names
+        if name in fields and name not in queryset.query.annotations
+    }
+    return queryset.annotate(**missing) if missing else queryset
+
+
+def load_computed(model, keys):
+    """``{pk: {name: value}}`` of every computed field of ``model``, in one query.
+
+    Reads the same expressions as the annotations, so batched values never
+    disagree with annotated or ordered ones.
+    """
+    fields = computed_fields(model)
+    values = {key: {name: computed.default for name, computed in fields.items()} for key in keys}
+    rows = (
+        model.objects.filter(pk__in=keys).order_by()
+        .annotate(**{name: computed.expression() for name, computed in fields.items()})
+        .values('pk', *fields)
+    )
+    for row in rows:
+        values[row.pop('pk')].update(row)
+    return values
@@ -0,0 +1,161 @@
+from functools import partial
+
+import graphene
+from graphene.utils.str_converters import to_snake_case
+from graphene_django.filter import DjangoFilterConnectionField
+from graphql import GraphQLError
+
+from .aio import is_async, run_sync
+from .loaders import get_loaders
+from .optimizer import optimize_queryset, page_attr, page_limit
+from .pagination import Ordering, is_keyset_request, keyset_connection, keyset_connection_async
+
+
+class CRMConnectionField(DjangoFilterConnectionField):
+    """DjangoFilterConnectionField that feeds the per-request loaders.
+
+    ``loader`` names an attribute of ``crm.loaders.Loaders`` keyed by the
+    parent's pk. When it is set and no filter argument is given, the related
+    rows come from that loader instead of one query per parent, unless the
+    parent queryset already prefetched them; either way only up to the rows
+    the page needs (``crm.optimizer.page_limit``). The order loaders also read archived
+    orders; nested connections given filter arguments query the live
+    orders only. Querysets this field resolves itself are shaped to the
+    selection set by ``crm.optimizer``. Every page that is returned primes
+    the loaders for the next nesting level.
+
+    ``orderings`` lists the model fields accepted by an ``orderBy`` argument
+    and switches the field to keyset pagination (see ``crm.pagination``).
+    Requests that pass ``offset`` or an offset cursor keep the offset path,
+    as do ``search`` requests without an ``orderBy``.
+
+    ``archive`` is called with the arguments of a root request and returns
+    a queryset of archived rows to read along with the live ones, or None
+    (see ``crm.archive``). Requests that reach the archive always use
+    keyset pagination, ordered by ``orderBy`` or the id.
+
+    Under the async view (``crm.aio.is_async``) the resolver returns a
+    coroutine instead, see ``resolve_async``.
+    """
+
+    def __init__(self, type_, *args, loader=None, orderings=None, archive=None, **kwargs):
+        self.loader = loader
+        self.orderings = orderings
+        self.archive = archive
+        if orderings is not None:
+            # Passed through ``args`` because DjangoFilterConnectionField
+            # reserves an ``order_by`` keyword of its own.
+            kwargs.setdefault('args', {})['order_by'] = graphene.String()
+        super().__init__(type_, *args, **kwargs)
+
+    def wrap_resolve(self, parent_resolver):
+        resolve = super().wrap_resolve(parent_resolver)
+        resolve_parent = self.resolver or parent_resolver
+        batched = partial(
+            self.connection_resolver,
+            self.load_related,
+            self.connection_type,
+            self.get_manager(),
+            lambda connection, iterable, info, args: iterable,
+            self.max_limit,
+            self.enforce_first_or_last,
+        )
+
+        def keyset_queryset(root, info, **args):
+            iterable = resolve_parent(root, info, **args)
+            if iterable is None:
+                iterable = self.get_manager()
+            return self.get_queryset_resolver()(self.connection_type, iterable, info, args)
+
+        def archived_queryset(info, **args):
+            archived = self.archive(args)
+            if archived is None:
+                return None
+            if not is_keyset_request(args):
+                raise GraphQLError('Offset pagination cannot include archived rows; page with cursors instead.')
+            return self.get_queryset_resolver()(self.connection_type, archived, info, args)
+
+        def resolver(root, info, **args):
+            ordering = None
+            # Without an explicit orderBy a search is ordered by relevance,
+            # which only the offset path preserves
+            ranked = args.get('search') and not args.get('order_by')
+            if self.orderings is not None and not ranked:
+                ordering = Ordering(self.model, args.get('order_by'), self.orderings)
+            if is_async(info):
+                return resolve_async(root, info, ordering, **args)
+            archived = archived_queryset(info, **args) if self.archive and root is None else None
+            if archived is not None:
+                ordering = Ordering(self.model, args.get('order_by'), self.orderings)
+                queryset = keyset_queryset(root, info, **args)
+                connection = keyset_connection(
+                    self.connection_type, queryset, args, ordering, self.max_limit, partitions=[archived]
+                )
+            elif self.loader and root is not None and not self.has_filters(args):
+                connection = batched(root, info, **args)
+            elif ordering is not None and is_keyset_request(args):
+                queryset = keyset_queryset(root, info, **args)
+                connection = keyset_connection(self.connection_type, queryset, args, ordering, self.max_limit)
+            else:
+                connection = resolve(root, info, **args)
+            get_loaders(info).prime(edge.node for edge in connection.edges)
+            return connection
+
+        async def resolve_async(root, info, ordering, **args):
+            # Rows already prefetched by the parent need no database access;
+            # keyset pages use the async ORM and everything else runs in the
+            # bounded thread pool so sibling fields overlap.
+            archived = None
+            if self.archive and root is None:
+                archived = await run_sync(archived_queryset)(info, **args)
+            if archived is not None:
+                ordering = Ordering(self.model, args.get('order_by'), self.orderings)
+                queryset = keyset_queryset(root, info, **args)
+                connection = await keyset_connection_async(
+                    self.connection_type, queryset, args, ordering, self.max_limit, partitions=[archived]
+                )
+            elif self.loader and root is not None and not self.has_filters(args):
+                if self.get_prefetched(root, info) is not None:
+                    connection = batched(root, info, **args)
+                else:
+                    connection = await run_sync(batched)(root, info, **args)
+            elif ordering is not None and is_keyset_request(args):
+                queryset = keyset_queryset(root, info, **args)
+                connection = await keyset_connection_async(
+                    self.connection_type, queryset, args, ordering, self.max_limit
+                )
+            else:
+                connection = await run_sync(resolve)(root, info, **args)
+            get_loaders(info).prime(edge.node for edge in connection.edges)
+            return connection
+
+        return resolver
+
+    @classmethod
+    def resolve_queryset(cls, connection, iterable, info, args, **kwargs):
+        queryset = super().resolve_queryset(connection, iterable, info, args, **kwargs)
+        if args.get('order_by'):
+            ordering = Ordering(queryset.model, args['order_by'])
+            queryset = ordering.annotate(queryset).order_by(*ordering.order_by())
+            return optimize_queryset(queryset, info, extra_fields=[ordering.field.name])
+        return optimize_queryset(queryset, info)
+
+    def get_prefetched(self, root, info):
+        prefetched = getattr(root, '_prefetched_objects_cache', {})
+        accessor = to_snake_case(info.field_name)
+        if accessor in prefetched:
+            return list(prefetched[accessor])
+        return getattr(root, page_attr(accessor), None)
+
+    def load_related(self, root, info, **args):
+        prefetched = self.get_prefetched(root, info)
+        if prefetched is not None:
+            return prefetched
+        loaders = get_loaders(info)
+        limit = page_limit(info.field_nodes, info, self.max_limit)
+        if limit is not None:
+            return loaders.limited(self.loader, limit).load(root.pk)
+        return getattr(loaders, self.loader).load(root.pk)
+
+    def has_filters(self, args):
+        return any(args.get(name) is not None for name in self.filtering_args)
@@ -1,19 +1,75 @@
 import django_filters
+from django_filters.constants import EMPTY_VALUES
+from .computed import annotate_computed
 from .models import Customer, Product, Order
+from .search import search
+
+
+class SearchFilter(django_filters.CharFilter):
+    """Full-text ``search`` ranked by relevance; see ``crm.search``."""
+
+    def filter(self, qs, value):
+        if not value:
+            return qs
+        return search(qs, value)
+
+
+class PrefixFilter(django_filters.CharFilter):
+    """``startswith`` as a range on the column, so a B-tree index serves it.
+
+    SQLite cannot use an index for Django's ``LIKE 'x%' ESCAPE`` because its
+    LIKE ignores case. The range is only equivalent for values without
+    letters, like phone numbers; others keep ``startswith`` and its
+    case-insensitive matching.
+    """
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        if value.lower() != value.upper():
+            return qs.filter(**{f'{self.field_name}__startswith': value})
+        # Every string starting with ``value`` sorts below value + U+10FFFF
+        return qs.filter(**{f'{self.field_name}__gte': value, f'{self.field_name}__lt': value + '\U0010ffff'})
+
+
+class ComputedFilterMixin:
+    """Filters on a ``crm.computed`` field, annotating it first when a value is given."""
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        return super().filter(annotate_computed(qs, [self.field_name]), value)
+
+
+class ComputedNumberFilter(ComputedFilterMixin, django_filters.NumberFilter):
+    pass
+
+
+class ComputedDateFilter(ComputedFilterMixin, django_filters.DateFilter):
+    pass
+
 
 class CustomerFilter(django_filters.FilterSet):
+    search = SearchFilter()
     name = django_filters.CharFilter(lookup_expr='icontains')
     email = django_filters.CharFilter(lookup_expr='icontains')
     # Challenge: created_at range filter
     created_at = django_filters.DateFromToRangeFilter()
     # Challenge: phone pattern (e.g. starts with)
-    phone_pattern = django_filters.CharFilter(field_name='phone', lookup_expr='startswith')
+    phone_pattern = PrefixFilter(field_name='phone')
+    order_count_gte = ComputedNumberFilter(field_name='order_count', lookup_expr='gte')
+    order_count_lte = ComputedNumberFilter(field_name='order_count', lookup_expr='lte')
+    total_spent_gte = ComputedNumberFilter(field_name='total_spent', lookup_expr='gte')
+    total_spent_lte = ComputedNumberFilter(field_name='total_spent', lookup_expr='lte')
+    last_order_date_gte = ComputedDateFilter(field_name='last_order_date', lookup_expr='date__gte')
+    last_order_date_lte = ComputedDateFilter(field_name='last_order_date', lookup_expr='date__lte')
 
     class Meta:
         model = Customer
         fields = ['name', 'email', 'created_at']
 
 class ProductFilter(django_filters.FilterSet):
+    search = SearchFilter()
     name = django_filters.CharFilter(lookup_expr='icontains')
     price = django_filters.RangeFilter() # handles gte/lte if range is used or we can field specific
     # Instructions: price__gte, price__lte. RangeFilter usually takes min,max.
@@ -24,18 +80,27 @@ class ProductFilter(django_filters.FilterSet):
     stock_gte = django_filters.NumberFilter(field_name='stock', lookup_expr='gte')
     stock_lte = django_filters.NumberFilter(field_name='stock', lookup_expr='lte')
 
+    units_sold_gte = ComputedNumberFilter(field_name='units_sold', lookup_expr='gte')
+    units_sold_lte = ComputedNumberFilter(field_name='units_sold', lookup_expr='lte')
+
     class Meta:
         model = Product
         fields = ['name', 'price', 'stock']
 
 class OrderFilter(django_filters.FilterSet):
+    search = SearchFilter()
     total_amount_gte = django_filters.NumberFilter(field_name='total_amount', lookup_expr='gte')
     total_amount_lte = django_filters.NumberFilter(field_name='total_amount', lookup_expr='lte')
     order_date = django_filters.DateFromToRangeFilter()
+    # Bounds of the order date; a range reaching before the newest archived
+    # order also reads the archive (crm.archive)
+    order_date_gte = django_filters.DateTimeFilter(field_name='order_date', lookup_expr='gte')
+    order_date_lte = django_filters.DateTimeFilter(field_name='order_date', lookup_expr='lte')
     
     # Filter by customer name and product name
     customer_name = django_filters.CharFilter(field_name='customer__name', lookup_expr='icontains')
-    product_name = django_filters.CharFilter(field_name='products__name', lookup_expr='icontains')
+    # Joins the M2M table, so an order matching several products would repeat
+    product_name = django_filters.CharFilter(field_name='products__name', lookup_expr='icontains', distinct=True)
 
     class Meta:
         model = Order
@@ -0,0 +1,279 @@
+import csv
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .bulk import RowError
+from .models import Customer, ImportCheckpoint, Order, Product
+from .rollups import record_orders
+from .search import create_search_index, drop_search_index
+from .versions import model_versions
+
+DEFAULT_BATCH_SIZE = 2000
+FORMATS = ('csv', 'ndjson')
+
+
+class ImportFileError(Exception):
+    pass
+
+
+def detect_format(path):
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    if extension in ('ndjson', 'jsonl'):
+        return 'ndjson'
+    if extension == 'csv':
+        return 'csv'
+    raise ImportFileError(f'Cannot tell the format of {path}; pass --format')
+
+
+def read_rows(path, format):
+    """Yield each record of ``path`` as a dict; NDJSON blank lines are skipped."""
+    with open(path, newline='', encoding='utf-8') as source:
+        if format == 'csv':
+            yield from csv.DictReader(source)
+        else:
+            for line in source:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def batches(rows, size):
+    iterator = iter(rows)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def text(row, name):
+    value = row.get(name)
+    return value.strip() if isinstance(value, str) else value
+
+
+def names(value):
+    """Product names from an NDJSON list or a CSV ``;``-joined cell."""
+    if isinstance(value, list):
+        return [str(name).strip() for name in value if str(name).strip()]
+    return [name.strip() for name in (value or '').split(';') if name.strip()]
+
+
+class Importer(ABC):
+    """Validate a batch of input rows and ``bulk_create`` the valid ones.
+
+    ``keys`` maps each already stored natural key (customer email, product
+    name) to what later resources need from it, so foreign keys resolve
+    without queries and re-imported rows are skipped rather than duplicated.
+    """
+
+    model = None
+
+    def __init__(self, keys):
+        self.keys = keys
+
+    @abstractmethod
+    def build(self, row):
+        """Return an unsaved instance for ``row``, or raise ValidationError."""
+
+    def write(self, instances):
+        self.model.objects.bulk_create(instances)
+
+    def load(self, rows, first_index):
+        errors = []
+        instances = []
+        for index, row in enumerate(rows, first_index):
+            try:
+                instance = self.build(row)
+            except ValidationError as error:
+                errors.append(RowError(index, '; '.join(error.messages)))
+                continue
+            if instance is not None:
+                instances.append(instance)
+        if instances:
+            self.write(instances)
+        return len(instances), errors
+
+
+class CustomerImporter(Importer):
+    model = Customer
+
+    @staticmethod
+    def initial_keys():
+        return dict(Customer.objects.values_list('email', 'pk').iterator())
+
+    def build(self, row):
+        name, email, phone = text(row, 'name'), text(row, 'email'), text(row, 'phone') or None
+        if not name:
+            raise ValidationError('name is required')
+        validate_email(email)
+        if email in self.keys:
+            return None
+        if len(name) > 100 or (phone and len(phone) > 20):
+            raise ValidationError('name or phone is too long')
+        self.keys[email] = None
+        return Customer(name=name, email=email, phone=phone)
+
+    def write(self, instances):
+        for customer in Customer.objects.bulk_create(instances):
+            self.keys[customer.email] = customer.pk
+
+
+class ProductImporter(Importer):
+    model = Product
+
+    @staticmethod
+    def initial_keys():
+        keys = {}
+        for pk, name, price in Product.objects.order_by('-pk').values_list('pk', 'name', 'price').iterator():
+            # Names are not unique; the oldest product wins
+            keys[name] = (pk, price)
+        return keys
+
+    def build(self, row):
+        name = text(row, 'name')
+        if not name or len(name) > 100:
+            raise ValidationError('name is required and at most 100 characters')
+        if name in self.keys:
+            return None
+        try:
+            price = Decimal(str(text(row, 'price')))
+            stock = int(text(row, 'stock') or 0)
+        except (InvalidOperation, TypeError, ValueError):
+            raise ValidationError('price and stock must be numbers')
+        if price <= 0:
+            raise ValidationError('Price must be positive')
+        if stock < 0:
+            raise ValidationError('Stock cannot be negative')
+        self.keys[name] = None
+        return Product(name=name, price=price, stock=stock)
+
+    def write(self, instances):
+        for product in Product.objects.bulk_create(instances):
+            self.keys[product.name] = (product.pk, product.price)
+
+
+class OrderImporter(Importer):
+    """Orders reference ``customer_email`` and ``product_names``, the columns
+    ``/export/orders`` writes. ``total_amount`` defaults to the sum of the
+    product prices and ``order_date`` to the import time. The sales rollups
+    are updated with each batch."""
+
+    model = Order
+
+    def __init__(self, keys):
+        self.customers, self.products = keys
+
+    def build(self, row):
+        customer_id = self.customers.get(text(row, 'customer_email'))
+        if customer_id is None:
+            raise ValidationError('Customer not found')
+        products = {self.products[name] for name in names(row.get('product_names')) if name in self.products}
+        if not products:
+            raise ValidationError('No valid products found')
+        total = text(row, 'total_amount')
+        try:
+            total = Decimal(str(total)) if total not in (None, '') else sum(price for _, price in products)
+        except InvalidOperation:
+            raise ValidationError('total_amount must be a number')
+        order = Order(customer_id=customer_id, total_amount=total)
+        order_date = text(row, 'order_date')
+        if order_date:
+            try:
+                order.order_date = parse_datetime(str(order_date))
+            except ValueError:
+                order.order_date = None
+            if order.order_date is None:
+                raise ValidationError('order_date must be a date and time')
+            if timezone.is_naive(order.order_date):
+                order.order_date = timezone.make_aware(order.order_date)
+        order.lines = sorted(products)
+        return order
+
+    def write(self, instances):
+        Order.objects.bulk_create(instances)
+        Through = Order.products.through
+        Through.objects.bulk_create(
+            Through(order_id=order.pk, product_id=product_id, price=price)
+            for order in instances
+            for product_id, price in order.lines
+        )
+        record_orders([(order, order.lines) for order in instances])
+
+
+class Source:
+    """One input file and its resume checkpoint."""
+
+    def __init__(self, resource, path, format=None):
+        self.resource = resource
+        self.path = os.path.abspath(path)
+        self.format = format or detect_format(path)
+        self.size = os.path.getsize(self.path)
+        self.key = f'{resource}:{self.path}'
+
+    def checkpoint(self, restart=False):
+        if restart:
+            ImportCheckpoint.objects.filter(source=self.key).delete()
+        checkpoint, _ = ImportCheckpoint.objects.get_or_create(
+            source=self.key, defaults={'size': self.size}
+        )
+        if checkpoint.size != self.size:
+            raise ImportFileError(
+                f'{self.path} changed since it was partly imported; pass --restart to import it again'
+            )
+        return checkpoint
+
+
+def import_source(source, importer, batch_size, restart=False, progress=None):
+    """Load ``source`` in batches of ``batch_size``, resuming from its checkpoint.
+
+    Each batch and the advanced checkpoint commit in one transaction, so an
+    interrupted import continues after the last committed batch. Returns
+    ``(created, errors, skipped_rows)``.
+    """
+    checkpoint = source.checkpoint(restart)
+    start = checkpoint.position
+    rows = islice(read_rows(source.path, source.format), start, None)
+    created = 0
+    errors = []
+    position = start
+    began = time.perf_counter()
+    for batch in batches(rows, batch_size):
+        with transaction.atomic():
+            count, batch_errors = importer.load(batch, position)
+            position += len(batch)
+            checkpoint.position = position
+            checkpoint.save(update_fields=['position', 'updated_at'])
+        created += count
+        errors += batch_errors
+        if progress is not None:
+            progress(source, position, created, len(errors), time.perf_counter() - began)
+    model_versions.bump(importer.model, *([Order.products.through] if importer.model is Order else []))
+    return created, errors, start
+
+
+def drop_indexes(models):
+    """Drop the secondary and full-text indexes of ``models`` before a load."""
+    with connection.schema_editor() as editor:
+        for model in models:
+            present = connection.introspection.get_constraints(connection.cursor(), model._meta.db_table)
+            for index in model._meta.indexes:
+                if index.name in present:
+                    editor.remove_index(model, index)
+            drop_search_index(connection, model)
+
+
+def restore_indexes(models):
+    """Recreate whatever ``drop_indexes`` removed, also after an interrupted load."""
+    with connection.schema_editor() as editor:
+        for model in models:
+            present = connection.introspection.get_constraints(connection.cursor(), model._meta.db_table)
+            for index in model._meta.indexes:
+                if index.name not in present:
+                    editor.add_index(model, index)
+            create_search_index(connection, model)
@@ -0,0 +1,160 @@
+import json
+import logging
+import os
+import socket
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, router, transaction
+from django.db.models import F, Q
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .bulk import bulk_create_customers, bulk_create_orders, get_chunk_size
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# Work a job can run: ``kind -> function(rows, chunk_size) -> (created, errors)``
+JOB_KINDS = {
+    'bulk_create_customers': bulk_create_customers,
+    'bulk_create_orders': bulk_create_orders,
+}
+DEFAULT_LEASE = 300
+DEFAULT_POLL_INTERVAL = 1.0
+# Rejected rows whose messages are stored; ``failed`` still counts every one
+MAX_JOB_ERRORS = 1000
+# Input fields stored as ISO strings in the payload and read back as datetimes
+DATETIME_FIELDS = ('order_date',)
+
+
+class Row(dict):
+    """A payload row, read by the bulk functions as the mutation input it was."""
+
+    __getattr__ = dict.get
+
+    @classmethod
+    def load(cls, row):
+        row = cls(row)
+        for field in DATETIME_FIELDS:
+            if isinstance(row.get(field), str):
+                row[field] = parse_datetime(row[field])
+        return row
+
+
+class LeaseLost(Exception):
+    """Another worker took over the job after this one missed its lease."""
+
+
+def enqueue(kind, rows):
+    """Store ``rows`` (mutation input objects) as a queued job of ``kind``."""
+    if kind not in JOB_KINDS:
+        raise ValueError(f'Unknown job kind {kind!r}')
+    # Round-tripped through JSON here so datetimes (see Row.load) and other
+    # values the JSONField cannot encode are stored as strings
+    payload = json.loads(json.dumps([dict(row) for row in rows], cls=DjangoJSONEncoder))
+    return Job.objects.create(kind=kind, payload=payload, total=len(payload))
+
+
+def lease():
+    return timedelta(seconds=getattr(settings, 'CRM_JOB_LEASE', DEFAULT_LEASE))
+
+
+def worker_name(index=0):
+    return f'{socket.gethostname()}:{os.getpid()}:{index}'
+
+
+def claimable():
+    # Queued jobs, and running jobs whose worker stopped checkpointing
+    return Q(status=Job.QUEUED) | Q(status=Job.RUNNING, heartbeat_at__lt=timezone.now() - lease())
+
+
+def claim(worker):
+    """Take the oldest claimable job for ``worker``, or return None.
+
+    Each candidate is claimed with one conditional UPDATE, so of several
+    workers racing for a job exactly one gets it.
+    """
+    candidates = Job.objects.filter(claimable()).order_by('pk').values_list('pk', flat=True)[:10]
+    for pk in candidates:
+        now = timezone.now()
+        claimed = Job.objects.filter(claimable(), pk=pk).update(
+            status=Job.RUNNING, worker=worker, heartbeat_at=now,
+            started_at=Coalesce('started_at', now), attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def run_job(job, worker, chunk_size=None, stop=None):
+    """Run ``job`` from its checkpoint, one chunk of rows per transaction.
+
+    A chunk's writes and the checkpoint that counts them commit together;
+    the checkpoint only succeeds while ``worker`` still holds the job. When
+    ``stop`` is set between chunks the job goes back to the queue.
+    """
+    work = JOB_KINDS[job.kind]
+    chunk_size = get_chunk_size(chunk_size)
+    try:
+        while job.position < job.total:
+            if stop is not None and stop.is_set():
+                Job.objects.filter(pk=job.pk, worker=worker).update(status=Job.QUEUED, worker='')
+                return job
+            start = job.position
+            rows = [Row.load(row) for row in job.payload[start:start + chunk_size]]
+            with transaction.atomic(using=router.db_for_write(Job)):
+                created, errors = work(rows, chunk_size)
+                job.position = start + len(rows)
+                job.created += len(created)
+                job.failed += len(errors)
+                job.errors += [
+                    {'index': start + error.index, 'message': str(error)}
+                    for error in errors
+                ][:MAX_JOB_ERRORS - len(job.errors)]
+                checkpointed = Job.objects.filter(pk=job.pk, worker=worker, status=Job.RUNNING).update(
+                    position=job.position, created=job.created, failed=job.failed,
+                    errors=job.errors, heartbeat_at=timezone.now(),
+                )
+                if not checkpointed:
+                    raise LeaseLost
+        job.status = Job.SUCCEEDED
+    except LeaseLost:
+        logger.warning('Job %s was taken over by another worker', job.pk)
+        return job
+    except Exception as error:
+        logger.exception('Job %s failed', job.pk)
+        job.status = Job.FAILED
+        job.message = str(error)
+    job.finished_at = timezone.now()
+    Job.objects.filter(pk=job.pk, worker=worker).update(
+        status=job.status, message=job.message, finished_at=job.finished_at,
+    )
+    return job
+
+
+def run_worker(worker, stop, chunk_size=None, poll_interval=None, burst=False):
+    """Claim and run jobs until ``stop`` is set, or until the queue is empty with ``burst``.
+
+    Returns how many jobs this worker ran.
+    """
+    if poll_interval is None:
+        poll_interval = getattr(settings, 'CRM_JOB_POLL_INTERVAL', DEFAULT_POLL_INTERVAL)
+    ran = 0
+    try:
+        while not stop.is_set():
+            job = claim(worker)
+            if job is None:
+                if burst:
+                    break
+                stop.wait(poll_interval)
+                continue
+            run_job(job, worker, chunk_size, stop)
+            ran += 1
+    finally:
+        if threading.current_thread() is not threading.main_thread():
+            connections.close_all()
+    return ran
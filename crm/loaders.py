@@ -0,0 +1,206 @@
+import threading
+from collections import defaultdict
+from functools import partial
+
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from .archive import has_archive
+from .computed import load_computed
+from .models import ArchivedOrder, Customer, Product, Order
+
+
+class Loader:
+    """Batches and caches lookups of one relation for the lifetime of a request.
+
+    Keys are queued with ``prime`` (usually every parent on the current page)
+    and fetched together by the first ``load`` that misses the cache, so each
+    nesting level costs one query no matter how many parents it has.
+
+    ``primed_by`` is another loader whose queued keys this one fetches too,
+    so a variant of a relation (see ``Loaders.limited``) batches the same
+    parents as the loader they were primed on.
+    """
+
+    def __init__(self, batch_load_fn, default=None, on_load=None, primed_by=None):
+        self.batch_load_fn = batch_load_fn
+        self.default = default
+        self.on_load = on_load
+        self.primed_by = primed_by
+        self._cache = {}
+        self._queue = {}
+        # The async view resolves sibling fields on several threads at once
+        self._lock = threading.Lock()
+
+    def prime(self, key):
+        if key is not None and key not in self._cache:
+            self._queue[key] = None
+
+    def load(self, key):
+        with self._lock:
+            if key not in self._cache:
+                self.prime(key)
+                self.dispatch()
+            value = self._cache.get(key)
+        if value is None:
+            return self.default() if callable(self.default) else self.default
+        return value
+
+    def dispatch(self):
+        keys = list(self._queue)
+        self._queue = {}
+        if self.primed_by is not None:
+            queued = set(keys)
+            keys += [key for key in list(self.primed_by._queue) if key not in self._cache and key not in queued]
+        if not keys:
+            return
+        results = self.batch_load_fn(keys)
+        for key in keys:
+            self._cache[key] = results.get(key)
+        if self.on_load:
+            self.on_load(results.values())
+
+    def clear(self):
+        self._cache = {}
+        self._queue = {}
+
+
+def load_customers(keys):
+    return Customer.objects.in_bulk(keys)
+
+
+def first_rows(queryset, key, order, limit=None):
+    """``queryset`` by ``order``, cut to its first ``limit`` rows per ``key`` (all of them without a limit)."""
+    queryset = queryset.order_by(order)
+    if limit is None:
+        return queryset
+    return queryset.annotate(
+        row_number=Window(RowNumber(), partition_by=F(key), order_by=order),
+    ).filter(row_number__lte=limit)
+
+
+def merged(groups, limit=None):
+    # Groups read from the live and archive tables, back in pk order
+    for key, orders in groups.items():
+        orders.sort(key=lambda order: order.pk)
+        groups[key] = orders[:limit]
+    return groups
+
+
+def load_orders_by_customer(keys, limit=None):
+    # Archived orders (crm.archive) too, merged in pk order
+    groups = defaultdict(list)
+    models = (Order, ArchivedOrder) if has_archive() else (Order,)
+    for model in models:
+        for order in first_rows(model.objects.filter(customer_id__in=keys), 'customer_id', 'pk', limit):
+            groups[order.customer_id].append(order)
+    return merged(groups, limit) if len(models) > 1 else groups
+
+
+def load_products_by_order(keys, through=Order.products.through, limit=None):
+    groups = defaultdict(list)
+    rows = first_rows(
+        through.objects.filter(order_id__in=keys).select_related('product'), 'order_id', 'product_id', limit,
+    )
+    for row in rows:
+        groups[row.order_id].append(row.product)
+    return groups
+
+
+def load_orders_by_product(keys, limit=None):
+    groups = defaultdict(list)
+    throughs = (Order.products.through, ArchivedOrder.products.through) if has_archive() else (Order.products.through,)
+    for through in throughs:
+        rows = first_rows(
+            through.objects.filter(product_id__in=keys).select_related('order'), 'product_id', 'order_id', limit,
+        )
+        for row in rows:
+            groups[row.product_id].append(row.order)
+    return merged(groups, limit) if len(throughs) > 1 else groups
+
+
+class Loaders:
+    """Per-request registry of the CRM relation loaders.
+
+    Every instance that reaches the response (a connection page or a batch
+    loaded one level up) is passed to ``prime`` so that its own relations are
+    queued for the next level.
+    """
+
+    def __init__(self):
+        self.customer = Loader(load_customers, on_load=self.prime)
+        self.customer_orders = Loader(load_orders_by_customer, default=list, on_load=self.prime_lists)
+        self.order_products = Loader(self.load_order_products, default=list, on_load=self.prime_lists)
+        # Pks of the archived orders (crm.archive) primed so far; their
+        # products are in the archive's line items
+        self.archived_orders = set()
+        self.product_orders = Loader(load_orders_by_product, default=list, on_load=self.prime_lists)
+        # crm.computed values of rows that were not loaded with the annotations
+        self.computed = {
+            Customer: Loader(partial(load_computed, Customer)),
+            Product: Loader(partial(load_computed, Product)),
+        }
+        self._limited = {}
+
+    def limited(self, name, limit):
+        """The loader of relation ``name`` that reads at most ``limit`` rows per key.
+
+        It fetches the keys primed on the ``name`` loader, so a nested
+        connection asking for its first rows still costs one query per level.
+        """
+        loader = self._limited.get((name, limit))
+        if loader is None:
+            base = getattr(self, name)
+            loader = self._limited[name, limit] = Loader(
+                partial(base.batch_load_fn, limit=limit), default=list, on_load=self.prime_lists, primed_by=base,
+            )
+        return loader
+
+    def load_order_products(self, keys, limit=None):
+        groups = load_products_by_order([key for key in keys if key not in self.archived_orders], limit=limit)
+        archived = [key for key in keys if key in self.archived_orders]
+        if archived:
+            groups.update(load_products_by_order(archived, ArchivedOrder.products.through, limit))
+        return groups
+
+    def prime(self, instances):
+        for instance in instances:
+            if isinstance(instance, ArchivedOrder):
+                self.archived_orders.add(instance.pk)
+            if isinstance(instance, (Order, ArchivedOrder)):
+                self.customer.prime(instance.customer_id)
+                # Also reaches customers that came with the order via select_related
+                self.computed[Customer].prime(instance.customer_id)
+                self.order_products.prime(instance.pk)
+            elif isinstance(instance, Customer):
+                self.customer_orders.prime(instance.pk)
+                self.computed[Customer].prime(instance.pk)
+            elif isinstance(instance, Product):
+                self.product_orders.prime(instance.pk)
+                self.computed[Product].prime(instance.pk)
+
+    def prime_lists(self, groups):
+        for instances in groups:
+            self.prime(instances)
+
+    def clear(self):
+        for loader in (
+            self.customer, self.customer_orders, self.order_products, self.product_orders,
+            *self.computed.values(), *self._limited.values(),
+        ):
+            loader.clear()
+
+
+def get_loaders(info):
+    """Return the loaders bound to the current request, creating them on first use."""
+    context = info.context
+    loaders = getattr(context, 'crm_loaders', None)
+    if loaders is None:
+        loaders = Loaders()
+        try:
+            context.crm_loaders = loaders
+        except AttributeError:
+            # No request object to hang the cache on (e.g. schema.execute
+            # without a context); lookups still work, just unbatched.
+            pass
+    return loaders
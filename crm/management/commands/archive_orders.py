@@ -0,0 +1,35 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from crm.archive import DEFAULT_BATCH_SIZE, archive_orders, horizon
+
+
+class Command(BaseCommand):
+    help = (
+        'Move orders older than CRM_ORDER_HOT_DAYS, with their line items, into '
+        'the archive tables, one batch per transaction. Safe to interrupt: run '
+        'it again to carry on with the orders that are left.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Archive orders older than this many days (default: CRM_ORDER_HOT_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--max-batches', type=int, help='Stop after this many batches')
+
+    def handle(self, *args, days, batch_size, max_batches, **options):
+        if batch_size < 1:
+            raise CommandError('--batch-size must be at least 1')
+        before = horizon() if days is None else timezone.now() - timedelta(days=days)
+        start = time.perf_counter()
+        moved = batches = 0
+        for count in archive_orders(before, batch_size, max_batches):
+            moved += count
+            batches += 1
+            self.stdout.write(f'Archived {moved} orders...')
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {moved} orders placed before {before:%Y-%m-%d %H:%M} in {batches} batches '
+            f'({time.perf_counter() - start:.2f}s)'
+        ))
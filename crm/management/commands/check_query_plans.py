@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from crm import plans
+
+
+class Command(BaseCommand):
+    help = (
+        'Run EXPLAIN QUERY PLAN for every filter of allCustomers, allProducts and '
+        'allOrders, alone and in common combinations, with each orderBy, and fail '
+        'on plans that scan or sort a whole table. SQLite only.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument(
+            '--scale', type=int, default=1,
+            help='Plan as if every table had this many times its rows (the statistics are rolled back)',
+        )
+        parser.add_argument('--show-plans', action='store_true', help='Print the plans of every case')
+
+    def handle(self, *args, database, scale, show_plans, **options):
+        if connections[database].vendor != 'sqlite':
+            raise CommandError(f'Query plans are only checked on SQLite, not {connections[database].vendor}')
+        missing = plans.missing_filters()
+        if missing:
+            raise CommandError(f'No plan data for: {", ".join(missing)}')
+        cases = plans.build_cases()
+        with transaction.atomic(using=database):
+            if scale > 1:
+                plans.scale_statistics(scale, database)
+            if show_plans:
+                for case in cases:
+                    access, page = case.explain(database)
+                    self.stdout.write(f'{case.name}\n{access or ""}\n{page}\n')
+            failures = plans.check(cases, database)
+            transaction.set_rollback(True, using=database)
+        for case, found in failures:
+            self.stdout.write(f'{case.name}: {"; ".join(found)}')
+        if failures:
+            raise CommandError(f'{len(failures)} of {len(cases)} query plans regressed')
+        exempt = sum(case.exempt for case in cases)
+        self.stdout.write(f'{len(cases)} query plans checked, {exempt} exempt (see crm.plans)')
@@ -0,0 +1,86 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.importer import (
+    DEFAULT_BATCH_SIZE, FORMATS, CustomerImporter, ImportFileError, OrderImporter, ProductImporter,
+    Source, drop_indexes, import_source, restore_indexes,
+)
+from crm.models import Customer, Order, Product
+
+MAX_REPORTED_ERRORS = 20
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk-load customers, products and orders from CSV or NDJSON files '
+        '(the formats /export/<resource> writes). Interrupted imports resume '
+        'from the last committed batch when run again with the same files.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', help='File with name, email, phone')
+        parser.add_argument('--products', help='File with name, price, stock')
+        parser.add_argument(
+            '--orders', help='File with customer_email, product_names and optional total_amount'
+        )
+        parser.add_argument('--format', choices=FORMATS, help='Input format (default: from the file extension)')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument(
+            '--drop-indexes', action='store_true',
+            help='Drop secondary and search indexes during the load and rebuild them after',
+        )
+        parser.add_argument('--restart', action='store_true', help='Ignore checkpoints of earlier runs')
+
+    def handle(self, *args, **options):
+        try:
+            sources = [
+                Source(resource, options[resource], options['format'])
+                for resource in ('customers', 'products', 'orders')
+                if options[resource]
+            ]
+        except (ImportFileError, OSError) as error:
+            raise CommandError(error)
+        if not sources:
+            raise CommandError('Nothing to import; pass --customers, --products and/or --orders')
+
+        models = {'customers': Customer, 'products': Product, 'orders': Order}
+        touched = [models[source.resource] for source in sources]
+        if options['drop_indexes']:
+            drop_indexes(touched)
+        try:
+            customers = CustomerImporter.initial_keys()
+            products = ProductImporter.initial_keys()
+            importers = {
+                'customers': CustomerImporter(customers),
+                'products': ProductImporter(products),
+                'orders': OrderImporter((customers, products)),
+            }
+            for source in sources:
+                self.load(source, importers[source.resource], options)
+        finally:
+            if options['drop_indexes']:
+                self.stdout.write('Rebuilding indexes...')
+                restore_indexes(touched)
+
+    def load(self, source, importer, options):
+        try:
+            created, errors, skipped = import_source(
+                source, importer, options['batch_size'], options['restart'], self.progress
+            )
+        except ImportFileError as error:
+            raise CommandError(error)
+        if skipped:
+            self.stdout.write(f'{source.resource}: resumed after row {skipped}')
+        for error in errors[:MAX_REPORTED_ERRORS]:
+            self.stderr.write(f'{source.resource} row {error.index + 1}: {error}')
+        if len(errors) > MAX_REPORTED_ERRORS:
+            self.stderr.write(f'{source.resource}: {len(errors) - MAX_REPORTED_ERRORS} more rejected rows')
+        self.stdout.write(self.style.SUCCESS(
+            f'{source.resource}: {created} created, {len(errors)} rejected'
+        ))
+
+    def progress(self, source, position, created, rejected, elapsed):
+        rate = created / elapsed if elapsed else 0
+        self.stdout.write(
+            f'{source.resource}: {position} rows read, {created} created, '
+            f'{rejected} rejected ({rate:,.0f} rows/s)'
+        )
@@ -0,0 +1,71 @@
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Run in a fresh interpreter, since this process has imported everything already
+SCRIPT = '''
+import json, time
+start = time.perf_counter()
+import django
+django.setup()
+phases = {'django.setup': time.perf_counter() - start}
+start = time.perf_counter()
+from alx_backend_graphql.startup import warm_up
+phases['import startup'] = time.perf_counter() - start
+phases.update(warm_up())
+print(json.dumps(phases))
+'''
+
+
+def parse_importtime(output):
+    """``(name, self_us, cumulative_us)`` per module from ``python -X importtime`` output."""
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        imports.append((name.strip(), int(own), int(cumulative)))
+    return imports
+
+
+class Command(BaseCommand):
+    help = (
+        'Profile process startup: time django.setup and each warm-up phase '
+        '(alx_backend_graphql.startup) in a fresh interpreter, and list the '
+        'slowest imports and the packages they belong to.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--imports', type=int, default=15, help='Slowest imports to list (default: 15)')
+
+    def handle(self, *args, imports, **options):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings.SETTINGS_MODULE}
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', SCRIPT],
+            capture_output=True, text=True, env=env, cwd=settings.BASE_DIR,
+        )
+        if process.returncode:
+            raise CommandError(process.stderr.strip().splitlines()[-1])
+        phases = json.loads(process.stdout.strip().splitlines()[-1])
+        modules = parse_importtime(process.stderr)
+
+        self.stdout.write('Phases:')
+        for name, seconds in phases.items():
+            self.stdout.write(f'  {name:<16} {seconds * 1000:8.1f}ms')
+        self.stdout.write(f'  {"total":<16} {sum(phases.values()) * 1000:8.1f}ms')
+
+        packages = defaultdict(int)
+        for name, own, cumulative in modules:
+            packages[name.split('.')[0]] += own
+        self.stdout.write(f'Import time by package ({len(modules)} modules):')
+        for name, own in sorted(packages.items(), key=lambda item: -item[1])[:imports]:
+            self.stdout.write(f'  {name:<24} {own / 1000:8.1f}ms')
+
+        self.stdout.write('Slowest imports (self time):')
+        for name, own, cumulative in sorted(modules, key=lambda module: -module[1])[:imports]:
+            self.stdout.write(f'  {name:<48} {own / 1000:8.1f}ms  (cumulative {cumulative / 1000:.1f}ms)')
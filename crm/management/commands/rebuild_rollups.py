@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from crm.rollups import DEFAULT_CHUNK_SIZE, rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the daily, per-product and per-customer sales rollups from '
+        'the orders, e.g. after a backfill or after orders were edited or deleted.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, chunk_size, **options):
+        start = time.perf_counter()
+        written = rebuild(chunk_size=chunk_size)
+        rows = ', '.join(f'{count} {name}' for name, count in written.items())
+        self.stdout.write(f'Rebuilt rollups in {time.perf_counter() - start:.2f}s: {rows}')
@@ -0,0 +1,47 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.jobs import run_worker, worker_name
+
+
+class Command(BaseCommand):
+    help = (
+        'Run background jobs queued by bulk mutations (see crm.jobs) in a pool '
+        'of worker threads, polling the jobs table; no broker is needed. Stops '
+        'after the current chunk on SIGINT/SIGTERM, leaving the job queued.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Worker threads (default: 2)')
+        parser.add_argument('--chunk-size', type=int, help='Payload rows per transaction (default: CRM_BULK_CHUNK_SIZE)')
+        parser.add_argument('--poll-interval', type=float, help='Seconds between polls of an empty queue')
+        parser.add_argument('--burst', action='store_true', help='Exit once the queue is empty')
+
+    def handle(self, *args, workers, chunk_size, poll_interval, burst, **options):
+        if workers < 1:
+            raise CommandError('--workers must be at least 1')
+        stop = threading.Event()
+        options = {'chunk_size': chunk_size, 'poll_interval': poll_interval, 'burst': burst}
+        previous = {signum: signal.signal(signum, lambda *args: stop.set()) for signum in (signal.SIGINT, signal.SIGTERM)}
+        try:
+            if workers == 1:
+                ran = [run_worker(worker_name(), stop, **options)]
+            else:
+                ran = [0] * workers
+
+                def target(index):
+                    ran[index] = run_worker(worker_name(index), stop, **options)
+
+                threads = [threading.Thread(target=target, args=(index,), daemon=True) for index in range(workers)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    # Joined with a timeout so signals still reach the main thread
+                    while thread.is_alive():
+                        thread.join(0.5)
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+        self.stdout.write(f'{sum(ran)} jobs run by {workers} workers')
@@ -0,0 +1,42 @@
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary SQLite database into the read replica file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='replica', help='Replica alias to refresh')
+        parser.add_argument(
+            '--interval', type=float, default=0, help='Sync again every N seconds; 0 syncs once'
+        )
+
+    def handle(self, *args, database, interval, **options):
+        if database not in connections:
+            raise CommandError(f"No database alias '{database}' in DATABASES")
+        primary = connections[DEFAULT_DB_ALIAS]
+        replica = connections[database]
+        if primary.vendor != 'sqlite' or replica.vendor != 'sqlite':
+            raise CommandError('sync_replica copies SQLite files; use the database\'s own replication otherwise')
+        while True:
+            start = time.perf_counter()
+            self.sync(primary.settings_dict['NAME'], replica.settings_dict['NAME'])
+            self.stdout.write(f'Synced {database} in {time.perf_counter() - start:.3f}s')
+            if not interval:
+                break
+            time.sleep(interval)
+
+    @staticmethod
+    def sync(source_name, target_name):
+        # The backup API copies a consistent snapshot even while the primary
+        # is being written; replica readers wait on the target's busy timeout
+        source = sqlite3.connect(source_name)
+        target = sqlite3.connect(target_name, timeout=30)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
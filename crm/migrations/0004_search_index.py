@@ -0,0 +1,71 @@
+from django.db import OperationalError, migrations
+
+# Frozen copy of what crm.search created when this migration was written, so
+# later edits to crm.search cannot change what a fresh `migrate` does
+SEARCH_FIELDS = {
+    'crm_customer': ('name', 'email'),
+    'crm_product': ('name',),
+}
+
+
+def create_sql(source, columns):
+    table = f'{source}_fts'
+    names = ', '.join(columns)
+    new = ', '.join(f'new.{column}' for column in columns)
+    old = ', '.join(f'old.{column}' for column in columns)
+    delete = f'INSERT INTO "{table}"("{table}", rowid, {names}) VALUES (\'delete\', old.id, {old});'
+    insert = f'INSERT INTO "{table}"(rowid, {names}) VALUES (new.id, {new});'
+    return [
+        f'CREATE VIRTUAL TABLE "{table}" USING fts5({names}, content=\'{source}\', '
+        f'content_rowid=\'id\', tokenize=\'unicode61 remove_diacritics 2\', prefix=\'2 3\')',
+        f'CREATE TRIGGER IF NOT EXISTS "{table}_ai" AFTER INSERT ON "{source}" BEGIN {insert} END',
+        f'CREATE TRIGGER IF NOT EXISTS "{table}_ad" AFTER DELETE ON "{source}" BEGIN {delete} END',
+        f'CREATE TRIGGER IF NOT EXISTS "{table}_au" AFTER UPDATE OF {names} ON "{source}" BEGIN {delete} {insert} END',
+        f'INSERT INTO "{table}"("{table}") VALUES (\'rebuild\')',
+    ]
+
+
+def drop_sql(source):
+    table = f'{source}_fts'
+    return [
+        f'DROP TRIGGER IF EXISTS "{table}_{suffix}"' for suffix in ('ai', 'ad', 'au')
+    ] + [f'DROP TABLE IF EXISTS "{table}"']
+
+
+def create_search_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for source, columns in SEARCH_FIELDS.items():
+            for sql in drop_sql(source):
+                cursor.execute(sql)
+            statements = create_sql(source, columns)
+            try:
+                cursor.execute(statements[0])
+            except OperationalError:
+                # SQLite built without FTS5: search falls back to LIKE
+                return
+            for sql in statements[1:]:
+                cursor.execute(sql)
+
+
+def drop_search_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for source in SEARCH_FIELDS:
+            for sql in drop_sql(source):
+                cursor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0003_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def rebuild_rollups(apps, schema_editor):
+    # Backfills the rollups of databases that already hold orders. A frozen
+    # copy of crm.rollups.rebuild as of this migration, so later changes to
+    # that function cannot break a fresh migrate. Line items stored no price
+    # yet, so product revenue is taken at the current price
+    Order = apps.get_model('crm', 'Order')
+    DailySales = apps.get_model('crm', 'DailySales')
+    ProductSales = apps.get_model('crm', 'ProductSales')
+    CustomerSales = apps.get_model('crm', 'CustomerSales')
+    using = schema_editor.connection.alias
+    orders = Order.objects.using(using)
+    DailySales.objects.using(using).bulk_create(
+        DailySales(date=row['day'], orders=row['count'], revenue=row['total'])
+        for row in orders.annotate(day=TruncDate('order_date')).values('day')
+        .annotate(count=Count('pk'), total=Sum('total_amount')).order_by('day')
+    )
+    ProductSales.objects.using(using).bulk_create(
+        ProductSales(product_id=row['product_id'], units=row['count'], revenue=row['total'])
+        for row in Order.products.through.objects.using(using).values('product_id')
+        .annotate(count=Count('pk'), total=Sum('product__price')).order_by('product_id')
+    )
+    CustomerSales.objects.using(using).bulk_create(
+        CustomerSales(customer_id=row['customer_id'], orders=row['count'], revenue=row['total'])
+        for row in orders.values('customer_id')
+        .annotate(count=Count('pk'), total=Sum('total_amount')).order_by('customer_id')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0005_import_checkpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CustomerSales',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='sales', serialize=False, to='crm.customer')),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['revenue', 'customer'], name='crm_customersales_revenue_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductSales',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='sales', serialize=False, to='crm.product')),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['revenue', 'product'], name='crm_productsales_revenue_idx'), models.Index(fields=['units', 'product'], name='crm_productsales_units_idx')],
+            },
+        ),
+        migrations.RunPython(rebuild_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Existing line items get the product's current price, the best record left
+# of what they were sold at
+BACKFILL_SQL = (
+    'UPDATE {table} SET price = '
+    '(SELECT crm_product.price FROM crm_product WHERE crm_product.id = {table}.product_id) '
+    'WHERE price IS NULL'
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0010_job_queue'),
+    ]
+
+    operations = [
+        # Order.products keeps its table: only the state learns the explicit
+        # through model
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='OrderItem',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='crm.order')),
+                        ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='crm.product')),
+                    ],
+                    options={
+                        'db_table': 'crm_order_products',
+                        'unique_together': {('order', 'product')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='order',
+                    name='products',
+                    field=models.ManyToManyField(related_name='orders', through='crm.OrderItem', to='crm.product'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='archivedorderitem',
+            name='price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.RunSQL(BACKFILL_SQL.format(table='crm_order_products'), migrations.RunSQL.noop),
+        migrations.RunSQL(BACKFILL_SQL.format(table='crm_archivedorderitem'), migrations.RunSQL.noop),
+    ]
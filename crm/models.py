@@ -1,4 +1,16 @@
 from django.db import models
+from django.dispatch import Signal
+from django.utils import timezone
+
+# Sent after update() on a queryset of ProductQuerySet, which sends no
+# post_save, with the names of the updated fields
+rows_updated = Signal()
+
+class ProductQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        rows = super().update(**kwargs)
+        rows_updated.send(sender=self.model, fields=frozenset(kwargs))
+        return rows
 
 class Customer(models.Model):
     name = models.CharField(max_length=100)
@@ -6,6 +18,15 @@ class Customer(models.Model):
     phone = models.CharField(max_length=20, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # Composite (key, id) indexes back the keyset pagination orderings
+        indexes = [
+            models.Index(fields=['name', 'id'], name='crm_customer_name_id_idx'),
+            models.Index(fields=['created_at', 'id'], name='crm_customer_created_id_idx'),
+            # Serves phone_pattern; crm.plans checks every filter has an index
+            models.Index(fields=['phone', 'id'], name='crm_customer_phone_id_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -14,14 +35,166 @@ class Product(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.PositiveIntegerField(default=0)
 
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['name', 'id'], name='crm_product_name_id_idx'),
+            models.Index(fields=['price', 'id'], name='crm_product_price_id_idx'),
+            models.Index(fields=['stock', 'id'], name='crm_product_stock_id_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
 class Order(models.Model):
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='orders')
-    products = models.ManyToManyField(Product, related_name='orders')
+    products = models.ManyToManyField(Product, through='OrderItem', related_name='orders')
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
-    order_date = models.DateTimeField(auto_now_add=True)
+    # A default rather than auto_now_add, which bulk_create would apply over
+    # the dates of queued and imported orders
+    order_date = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['order_date', 'id'], name='crm_order_date_id_idx'),
+            models.Index(fields=['total_amount', 'id'], name='crm_order_total_id_idx'),
+            # Covers the per-customer aggregates of crm.computed, so they
+            # never read the order rows themselves
+            models.Index(fields=['customer', 'order_date', 'total_amount'], name='crm_order_customer_stats_idx'),
+        ]
 
     def __str__(self):
         return f"Order {self.id} by {self.customer.name}"
+
+# One product on an order. `price` is the product's price when the order was
+# placed (what the sales rollups count); rows added through `order.products`
+# leave it null, and rebuild_rollups then uses the current price
+class OrderItem(models.Model):
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+
+    class Meta:
+        # The table of the former auto-created through model
+        db_table = 'crm_order_products'
+        unique_together = [('order', 'product')]
+
+    def __str__(self):
+        return f"{self.order_id}: {self.product_id}"
+
+# Orders older than CRM_ORDER_HOT_DAYS, moved out of the order tables with
+# their line items by `manage.py archive_orders` (crm.archive). Ids are kept,
+# so global IDs and cursors stay valid; reverse relations are hidden so the
+# GraphQL types of customers and products do not grow archive fields
+class ArchivedOrder(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='+')
+    products = models.ManyToManyField(Product, through='ArchivedOrderItem', related_name='+')
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    order_date = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['order_date', 'id'], name='crm_archorder_date_id_idx'),
+            models.Index(fields=['total_amount', 'id'], name='crm_archorder_total_id_idx'),
+            models.Index(fields=['customer', 'order_date', 'total_amount'], name='crm_archorder_customer_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived order {self.id}"
+
+class ArchivedOrderItem(models.Model):
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+
+    class Meta:
+        unique_together = [('order', 'product')]
+
+    def __str__(self):
+        return f"{self.order_id}: {self.product_id}"
+
+class ImportCheckpoint(models.Model):
+    # Input rows of an import_crm source already committed, updated in the
+    # same transaction as the rows so a failed import resumes exactly
+    source = models.CharField(max_length=500, unique=True)
+    size = models.BigIntegerField()
+    position = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.source} @ {self.position}"
+
+# Background work queued by bulk mutations and run by `manage.py
+# run_crm_workers` (crm.jobs). `position` counts the payload rows already
+# committed, updated in the same transaction as their writes, so a job
+# picked up again after a crash resumes exactly there
+class Job(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUSES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (SUCCEEDED, 'Succeeded'), (FAILED, 'Failed')]
+
+    kind = models.CharField(max_length=50)
+    status = models.CharField(max_length=10, choices=STATUSES, default=QUEUED)
+    payload = models.JSONField()
+    total = models.PositiveIntegerField()
+    position = models.PositiveIntegerField(default=0)
+    created = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    # {"index", "message"} of the first rejected rows, see crm.jobs.MAX_JOB_ERRORS
+    errors = models.JSONField(default=list)
+    message = models.TextField(blank=True)
+    worker = models.CharField(max_length=100, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id'], name='crm_job_status_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.id} ({self.status})"
+
+# Sales rollups, kept in step with orders by crm.rollups in the transaction
+# that creates them; `manage.py rebuild_rollups` recomputes them from scratch
+class DailySales(models.Model):
+    date = models.DateField(unique=True)
+    orders = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.date}: {self.revenue}"
+
+class ProductSales(models.Model):
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='sales')
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['revenue', 'product'], name='crm_productsales_revenue_idx'),
+            models.Index(fields=['units', 'product'], name='crm_productsales_units_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.units} units"
+
+class CustomerSales(models.Model):
+    customer = models.OneToOneField(Customer, on_delete=models.CASCADE, primary_key=True, related_name='sales')
+    orders = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['revenue', 'customer'], name='crm_customersales_revenue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.customer_id}: {self.revenue}"
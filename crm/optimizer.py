@@ -0,0 +1,173 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from graphene.utils.str_converters import to_snake_case
+from graphene_django.settings import graphene_settings
+from graphql import is_abstract_type, value_from_ast_untyped
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode
+
+from .archive import has_archive
+from .computed import annotate_computed, computed_fields
+from .models import Order
+
+PAGINATION_ARGS = {'first', 'last', 'before', 'after', 'offset'}
+
+
+def collect_fields(field_nodes, info, type_name=None):
+    """Merge the sub-selections of ``field_nodes`` into ``{name: [FieldNode]}``.
+
+    With ``type_name``, fragments on other object types are left out.
+    """
+    fields = {}
+
+    def applies(fragment):
+        if type_name is None or fragment.type_condition is None:
+            return True
+        condition = fragment.type_condition.name.value
+        return condition == type_name or is_abstract_type(info.schema.get_type(condition))
+
+    def visit(selection_set):
+        if selection_set is None:
+            return
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                fields.setdefault(selection.name.value, []).append(selection)
+            elif isinstance(selection, InlineFragmentNode):
+                if applies(selection):
+                    visit(selection.selection_set)
+            elif isinstance(selection, FragmentSpreadNode):
+                fragment = info.fragments[selection.name.value]
+                if applies(fragment):
+                    visit(fragment.selection_set)
+
+    for node in field_nodes:
+        visit(node.selection_set)
+    return fields
+
+
+def node_fields(field_nodes, info):
+    """Return the fields selected on ``edges { node { ... } }`` of a connection."""
+    edges = collect_fields(field_nodes, info).get('edges', [])
+    return collect_fields(collect_fields(edges, info).get('node', []), info)
+
+
+def reads_archive(field):
+    # Orders are partly archived (crm.archive); a prefetch would only see
+    # the live ones, the loaders read both tables
+    return field.related_model is Order and has_archive()
+
+
+def page_limit(field_nodes, info, max_limit=None):
+    """Rows per parent a nested connection reads: ``first`` plus one, to tell if there is a next page.
+
+    None when every row is needed: for ``totalCount``, or when paging with
+    ``last``, ``before``, ``after``, ``offset`` or filter arguments.
+    Without ``first`` the connection's ``max_limit`` applies.
+    """
+    limit = 0
+    for node in field_nodes:
+        arguments = {argument.name.value: argument.value for argument in node.arguments}
+        if set(arguments) - {'first'} or 'totalCount' in collect_fields([node], info):
+            return None
+        first = value_from_ast_untyped(arguments['first'], info.variable_values) if 'first' in arguments else max_limit
+        if first is None:
+            return None
+        limit = max(limit, first)
+    return limit + 1
+
+
+def page_attr(accessor):
+    """Attribute holding the rows of ``accessor`` prefetched up to a ``page_limit``."""
+    return f'_{accessor}_page'
+
+
+def has_filter_arguments(field_nodes):
+    return any(
+        argument.name.value not in PAGINATION_ARGS
+        for node in field_nodes
+        for argument in node.arguments
+    )
+
+
+class Plan:
+    def __init__(self):
+        self.only = set()
+        self.select_related = []
+        self.prefetch = []
+        self.annotate = []
+
+    def apply(self, queryset):
+        queryset = annotate_computed(queryset, self.annotate)
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.prefetch:
+            queryset = queryset.prefetch_related(*self.prefetch)
+        return queryset.only(*self.only)
+
+
+def build_plan(model, fields, info, plan=None, prefix=''):
+    """Translate selected GraphQL fields on ``model`` into queryset hints.
+
+    Foreign keys are followed with ``select_related`` and many-valued
+    relations (which the schema exposes as connections) with a ``Prefetch``
+    whose queryset is narrowed the same way, and cut to ``page_limit`` rows
+    per parent. Nested connections that take filter arguments are left to
+    their own resolver. Selected
+    ``crm.computed`` fields are annotated, except on rows reached through
+    ``select_related``; their resolver batches those through the loaders.
+    """
+    plan = plan or Plan()
+    plan.only.add(prefix + model._meta.pk.attname)
+    # Foreign key columns are always kept so loaders can read them without
+    # triggering a deferred load per row.
+    for field in model._meta.concrete_fields:
+        if field.is_relation:
+            plan.only.add(prefix + field.attname)
+
+    for name, nodes in fields.items():
+        try:
+            field = model._meta.get_field(to_snake_case(name))
+        except FieldDoesNotExist:
+            if not prefix and to_snake_case(name) in computed_fields(model):
+                plan.annotate.append(to_snake_case(name))
+            continue
+        if not field.is_relation:
+            if field.concrete:
+                plan.only.add(prefix + field.attname)
+        elif field.many_to_one or field.one_to_one:
+            path = prefix + field.name
+            plan.select_related.append(path)
+            build_plan(field.related_model, collect_fields(nodes, info), info, plan, path + '__')
+        elif not has_filter_arguments(nodes) and not reads_archive(field):
+            related = build_plan(field.related_model, node_fields(nodes, info), info)
+            if field.one_to_many:
+                related.only.add(field.remote_field.attname)
+            accessor = field.get_accessor_name() if field.auto_created else field.name
+            queryset = related.apply(field.related_model.objects.order_by('pk'))
+            limit = page_limit(nodes, info, graphene_settings.RELAY_CONNECTION_MAX_LIMIT)
+            if limit is None:
+                plan.prefetch.append(Prefetch(prefix + accessor, queryset=queryset))
+            else:
+                # Cut per parent with a window function; Django only keeps
+                # sliced prefetches in a to_attr
+                plan.prefetch.append(Prefetch(prefix + accessor, queryset=queryset[:limit], to_attr=page_attr(accessor)))
+    return plan
+
+
+def optimize_queryset(queryset, info, extra_fields=()):
+    """Shape a connection queryset to the selection set of the current field.
+
+    ``extra_fields`` are model field names that must stay loaded even if not
+    selected, such as the key a page is ordered by.
+    """
+    fields = node_fields(info.field_nodes, info)
+    if not fields:
+        return queryset
+    plan = build_plan(queryset.model, fields, info)
+    for name in extra_fields:
+        try:
+            field = queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            continue
+        if field.concrete:
+            plan.only.add(field.attname)
+    return plan.apply(queryset)
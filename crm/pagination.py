@@ -0,0 +1,239 @@
+import base64
+import binascii
+import heapq
+import json
+
+import graphene
+from django.db.models import Q
+from graphene.relay.connection import PageInfo
+from graphene.utils.str_converters import to_snake_case
+from graphql import GraphQLError
+
+from .aio import is_async
+from .computed import annotate_computed, computed_fields
+
+CURSOR_PREFIX = 'keyset:'
+
+
+class CRMConnection(graphene.relay.Connection):
+    """Relay connection with an opt-in ``totalCount``.
+
+    The count is only run when the field is selected; offset pages reuse the
+    length they already computed.
+    """
+
+    class Meta:
+        abstract = True
+
+    total_count = graphene.Int()
+
+    def resolve_total_count(self, info):
+        length = getattr(self, 'length', None)
+        if length is not None:
+            return length
+        if is_async(info):
+            return self.iterable.acount()
+        return self.iterable.count()
+
+
+def encode_cursor(values):
+    payload = CURSOR_PREFIX + json.dumps(values, separators=(',', ':'))
+    return base64.b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Return the ``[order key, id]`` stored in a keyset cursor, or None."""
+    try:
+        payload = base64.b64decode(cursor.encode(), validate=True).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        return None
+    if not payload.startswith(CURSOR_PREFIX):
+        return None
+    try:
+        values = json.loads(payload[len(CURSOR_PREFIX):])
+    except ValueError:
+        return None
+    if not isinstance(values, list) or len(values) != 2:
+        return None
+    return values
+
+
+def is_keyset_request(args):
+    """Offset arguments and cursors issued by the offset paginator keep the offset path."""
+    if args.get('offset') is not None:
+        return False
+    return all(
+        decode_cursor(args[name]) is not None
+        for name in ('after', 'before')
+        if args.get(name)
+    )
+
+
+class Ordering:
+    """A validated ``orderBy`` value: one model field plus the pk as tie-breaker.
+
+    The field may also be one of the model's ``crm.computed`` fields, which
+    ``annotate`` adds to the queryset to be ordered.
+    """
+
+    def __init__(self, model, value, allowed=None):
+        value = value or 'id'
+        self.descending = value.startswith('-')
+        name = to_snake_case(value.lstrip('-'))
+        if allowed is not None and name not in ('id', 'pk') and name not in allowed:
+            raise GraphQLError(
+                f"Cannot order by '{value}'. Choose from: {', '.join(sorted(allowed))}."
+            )
+        self.model = model
+        self.computed = computed_fields(model).get(name)
+        if name in ('id', 'pk'):
+            self.field = model._meta.pk
+        elif self.computed is not None:
+            self.field = self.computed.field
+        else:
+            self.field = model._meta.get_field(name)
+
+    def annotate(self, queryset):
+        if self.computed is None:
+            return queryset
+        return annotate_computed(queryset, [self.computed.name])
+
+    def order_by(self, reverse=False):
+        descending = self.descending != reverse
+        sign = '-' if descending else ''
+        if self.field.primary_key:
+            return [sign + 'pk']
+        return [sign + self.field.name, sign + 'pk']
+
+    def cursor(self, instance):
+        value = self.field.value_from_object(instance)
+        if not self.field.primary_key:
+            value = self.field.value_to_string(instance)
+        return encode_cursor([value, instance.pk])
+
+    def seek(self, cursor, forward):
+        """Filter for the rows strictly after (or before) ``cursor`` in this ordering."""
+        value, pk = cursor
+        greater = forward != self.descending
+        op = 'gt' if greater else 'lt'
+        if self.field.primary_key:
+            return Q(**{f'pk__{op}': pk})
+        value = self.field.to_python(value)
+        return Q(**{f'{self.field.name}__{op}': value}) | Q(
+            **{self.field.name: value, f'pk__{op}': pk}
+        )
+
+
+class KeysetPage:
+    """One page of a connection fetched by seeking on ``ordering``.
+
+    Each page reads at most ``first``/``last`` + 1 rows through an indexable
+    ``WHERE (key, id) > (cursor)`` condition, so deep pages cost the same as
+    the first one and no ``COUNT(*)`` is issued unless ``totalCount`` is asked.
+    Building the page is split from fetching ``queryset`` so the rows can be
+    read with either the sync or the async ORM.
+    """
+
+    def __init__(self, queryset, args, ordering, max_limit=None):
+        first = args.get('first')
+        last = args.get('last')
+        after = decode_cursor(args['after']) if args.get('after') else None
+        before = decode_cursor(args['before']) if args.get('before') else None
+        if first is None and last is None:
+            first = max_limit
+        for name, value in (('first', first), ('last', last)):
+            if value is not None and value < 0:
+                raise GraphQLError(f'`{name}` must be non-negative.')
+            if value is not None and max_limit and value > max_limit:
+                raise GraphQLError(
+                    f'Requesting {value} records on the connection exceeds the `{name}` limit of {max_limit} records.'
+                )
+
+        qs = queryset = ordering.annotate(queryset)
+        if after is not None:
+            qs = qs.filter(ordering.seek(after, forward=True))
+        if before is not None:
+            qs = qs.filter(ordering.seek(before, forward=False))
+
+        self.backwards = first is None and last is not None
+        self.limit = last if self.backwards else first
+        qs = qs.order_by(*ordering.order_by(reverse=self.backwards))
+        if self.limit is not None:
+            qs = qs[:self.limit + 1]
+
+        self.source = queryset
+        self.queryset = qs
+        self.ordering = ordering
+        self.first, self.last = first, last
+        self.after, self.before = after, before
+
+    def merge(self, pages):
+        """Merge the rows of ``pages`` (lists in this page's query order) into one page's worth."""
+        field = self.ordering.field
+        rows = list(heapq.merge(
+            *pages,
+            key=lambda row: (field.value_from_object(row), row.pk),
+            reverse=self.ordering.descending != self.backwards,
+        ))
+        return rows[:self.limit + 1] if self.limit is not None else rows
+
+    def connection(self, connection_type, rows):
+        rows = list(rows)
+        has_more = self.limit is not None and len(rows) > self.limit
+        if self.limit is not None:
+            rows = rows[:self.limit]
+        if self.backwards:
+            rows.reverse()
+        if self.first is not None and self.last is not None and len(rows) > self.last:
+            rows = rows[len(rows) - self.last:]
+            has_more_before = True
+        else:
+            has_more_before = has_more if self.backwards else self.after is not None
+
+        edges = [connection_type.Edge(node=row, cursor=self.ordering.cursor(row)) for row in rows]
+        connection = connection_type(
+            edges=edges,
+            page_info=PageInfo(
+                start_cursor=edges[0].cursor if edges else None,
+                end_cursor=edges[-1].cursor if edges else None,
+                has_previous_page=has_more_before,
+                has_next_page=self.before is not None if self.backwards else has_more,
+            ),
+        )
+        connection.iterable = self.source
+        connection.length = None
+        return connection
+
+
+def union_count(querysets):
+    """Queryset whose ``count()`` is the number of rows in all of ``querysets``."""
+    first, *rest = [queryset.order_by().values('pk') for queryset in querysets]
+    return first.union(*rest, all=True)
+
+
+def keyset_connection(connection_type, queryset, args, ordering, max_limit=None, partitions=()):
+    """Build one page of ``connection_type`` with the sync ORM.
+
+    ``partitions`` are querysets of other tables holding rows of the same
+    connection (archived orders, see ``crm.archive``). Each is paged the
+    same way and the pages are merged, so the cursors work across tables.
+    """
+    page = KeysetPage(queryset, args, ordering, max_limit)
+    if not partitions:
+        return page.connection(connection_type, page.queryset)
+    pages = [page] + [KeysetPage(partition, args, ordering, max_limit) for partition in partitions]
+    connection = page.connection(connection_type, page.merge([list(each.queryset) for each in pages]))
+    connection.iterable = union_count([each.source for each in pages])
+    return connection
+
+
+async def keyset_connection_async(connection_type, queryset, args, ordering, max_limit=None, partitions=()):
+    """Build one page of ``connection_type`` with the async ORM."""
+    page = KeysetPage(queryset, args, ordering, max_limit)
+    if not partitions:
+        return page.connection(connection_type, [row async for row in page.queryset])
+    pages = [page] + [KeysetPage(partition, args, ordering, max_limit) for partition in partitions]
+    rows = [[row async for row in each.queryset] for each in pages]
+    connection = page.connection(connection_type, page.merge(rows))
+    connection.iterable = union_count([each.source for each in pages])
+    return connection
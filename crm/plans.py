@@ -0,0 +1,209 @@
+import re
+
+from django.db import connections
+
+from .filters import CustomerFilter, OrderFilter, ProductFilter
+from .pagination import Ordering
+
+PAGE = 50
+
+# Form data for each filter of the connection fields, keyed by filter name
+FILTER_DATA = {
+    CustomerFilter: {
+        'search': {'search': 'ada'},
+        'name': {'name': 'ada'},
+        'email': {'email': 'customer1'},
+        'created_at': {'created_at_after': '2024-01-01', 'created_at_before': '2024-01-31'},
+        'phone_pattern': {'phone_pattern': '+1555'},
+        'order_count_gte': {'order_count_gte': '8'},
+        'order_count_lte': {'order_count_lte': '2'},
+        'total_spent_gte': {'total_spent_gte': '5000'},
+        'total_spent_lte': {'total_spent_lte': '500'},
+        'last_order_date_gte': {'last_order_date_gte': '2024-12-01'},
+        'last_order_date_lte': {'last_order_date_lte': '2024-01-31'},
+    },
+    ProductFilter: {
+        'search': {'search': 'brass'},
+        'name': {'name': 'lamp'},
+        'price': {'price_min': '10', 'price_max': '100'},
+        'stock': {'stock': '10'},
+        'price_gte': {'price_gte': '100'},
+        'price_lte': {'price_lte': '200'},
+        'stock_gte': {'stock_gte': '100'},
+        'stock_lte': {'stock_lte': '5'},
+        'units_sold_gte': {'units_sold_gte': '150'},
+        'units_sold_lte': {'units_sold_lte': '50'},
+    },
+    OrderFilter: {
+        'search': {'search': 'ada'},
+        'total_amount': {'total_amount': '500'},
+        'total_amount_gte': {'total_amount_gte': '500'},
+        'total_amount_lte': {'total_amount_lte': '800'},
+        'order_date': {'order_date_after': '2024-01-01', 'order_date_before': '2024-01-31'},
+        'order_date_gte': {'order_date_gte': '2024-12-01T00:00:00'},
+        'order_date_lte': {'order_date_lte': '2024-01-31T00:00:00'},
+        'customer_name': {'customer_name': 'ada'},
+        'product_name': {'product_name': 'lamp'},
+    },
+}
+
+# Filters used together by clients, checked in addition to each one alone
+COMBINATIONS = {
+    CustomerFilter: [('created_at', 'phone_pattern'), ('created_at', 'total_spent_gte')],
+    ProductFilter: [('price_gte', 'price_lte'), ('price_gte', 'stock_lte'), ('stock_gte', 'stock_lte')],
+    OrderFilter: [
+        ('order_date', 'total_amount_gte'), ('total_amount_gte', 'total_amount_lte'),
+        ('order_date_gte', 'order_date_lte'),
+    ],
+}
+
+# Filters whose plans are allowed to scan, and why
+EXEMPT = {
+    'name': 'substring match; indexed by the full-text `search` filter',
+    'email': 'substring match; indexed by the full-text `search` filter',
+    'customer_name': 'substring match on the joined customer',
+    'product_name': 'substring match on the joined products',
+    'search': 'ranked by relevance, which no index stores',
+    'order_count_gte': 'computed per customer (crm.computed)',
+    'order_count_lte': 'computed per customer (crm.computed)',
+    'total_spent_gte': 'computed per customer (crm.computed)',
+    'total_spent_lte': 'computed per customer (crm.computed)',
+    'last_order_date_gte': 'computed per customer (crm.computed)',
+    'last_order_date_lte': 'computed per customer (crm.computed)',
+    'units_sold_gte': 'computed per product (crm.computed)',
+    'units_sold_lte': 'computed per product (crm.computed)',
+}
+
+# Orderings allowed to sort the whole table; topCustomers and topProducts
+# serve the same rankings from indexed rollups
+EXEMPT_ORDERINGS = {
+    'order_count': 'computed per customer (crm.computed)',
+    'total_spent': 'computed per customer (crm.computed)',
+    'units_sold': 'computed per product (crm.computed)',
+}
+
+# ``SCAN t`` without an index, as opposed to walking an index in order
+SCAN_RE = re.compile(r'\bSCAN (\w+)$', re.MULTILINE)
+
+
+class PlanCase:
+    """Filters plus an ``orderBy``, checked as two plans.
+
+    The access plan (the filters alone) must reach the rows through an
+    index; the page plan (ordered, with the keyset ``LIMIT``) must not sort
+    the whole table. Walking the table in primary key order until the page
+    is full is accepted: it is how SQLite serves a range filter on one
+    column and an ordering on another when the filter matches many rows.
+    """
+
+    def __init__(self, filterset_class, filters, ordering=None):
+        self.filterset_class = filterset_class
+        self.filters = filters
+        self.ordering = ordering
+
+    @property
+    def model(self):
+        return self.filterset_class._meta.model
+
+    @property
+    def name(self):
+        return f'{self.model.__name__}({", ".join(self.filters)}) orderBy {self.ordering or "id"}'
+
+    @property
+    def exempt(self):
+        return any(name in EXEMPT for name in self.filters) or self.ordering in EXEMPT_ORDERINGS
+
+    def filtered(self):
+        data = {}
+        for name in self.filters:
+            data.update(FILTER_DATA[self.filterset_class][name])
+        filterset = self.filterset_class(data, queryset=self.model.objects.all())
+        if not filterset.is_valid():
+            raise ValueError(f'{self.name}: {filterset.errors.as_text()}')
+        return filterset.qs
+
+    def page(self):
+        ordering = Ordering(self.model, self.ordering)
+        return ordering.annotate(self.filtered()).order_by(*ordering.order_by())[:PAGE + 1]
+
+    def explain(self, using='default'):
+        """``(access plan, page plan)``; the access plan is None without filters."""
+        if connections[using].vendor != 'sqlite':
+            raise ValueError('Query plans are only checked on SQLite')
+        access = self.filtered().order_by().using(using).explain() if self.filters else None
+        return access, self.page().using(using).explain()
+
+    def problems(self, using='default'):
+        access, page = self.explain(using)
+        table = self.model._meta.db_table
+        found = []
+        if access is not None and table in SCAN_RE.findall(access):
+            found.append(f'no index serves the filters on {table}')
+        if table in SCAN_RE.findall(page) and 'USE TEMP B-TREE' in page:
+            found.append(f'sorts every row of {table}')
+        return found
+
+
+def orderings():
+    """``{filterset class: orderBy values}`` of the root connection fields."""
+    from .schema import Query
+
+    fields = Query._meta.fields
+    return {
+        CustomerFilter: fields['all_customers'].orderings,
+        ProductFilter: fields['all_products'].orderings,
+        OrderFilter: fields['all_orders'].orderings,
+    }
+
+
+def build_cases():
+    cases = []
+    for filterset_class, allowed in orderings().items():
+        for filters in [(name,) for name in FILTER_DATA[filterset_class]] + COMBINATIONS[filterset_class]:
+            for ordering in (None, *allowed):
+                cases.append(PlanCase(filterset_class, filters, ordering))
+        for ordering in allowed:
+            cases.append(PlanCase(filterset_class, (), ordering))
+    return cases
+
+
+def missing_filters():
+    """Filters declared in crm.filters without plan data here."""
+    return [
+        f'{filterset_class.__name__}.{name}'
+        for filterset_class, data in FILTER_DATA.items()
+        for name in filterset_class.base_filters
+        if name not in data
+    ]
+
+
+def check(cases=None, using='default'):
+    """Return ``[(case, problems)]`` for the cases that are not exempt and have problems."""
+    failures = []
+    for case in cases if cases is not None else build_cases():
+        if case.exempt:
+            continue
+        found = case.problems(using)
+        if found:
+            failures.append((case, found))
+    return failures
+
+
+def scale_statistics(factor, using='default'):
+    """Run ANALYZE, then make SQLite plan as if every table had ``factor`` times its rows.
+
+    Only the row counts in ``sqlite_stat1`` grow, not the rows per distinct
+    value, which is what a larger dataset of the same shape looks like to
+    the planner. Lets tests check plans of production-sized tables.
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute('ANALYZE')
+        cursor.execute('SELECT rowid, stat FROM sqlite_stat1')
+        for rowid, stat in cursor.fetchall():
+            rows, *rest = stat.split(' ')
+            cursor.execute(
+                'UPDATE sqlite_stat1 SET stat = %s WHERE rowid = %s',
+                [' '.join([str(int(rows) * factor), *rest]), rowid],
+            )
+        # Reloads the statistics
+        cursor.execute('ANALYZE sqlite_schema')
@@ -0,0 +1,153 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import ArchivedOrder, CustomerSales, DailySales, Order, ProductSales
+from .versions import model_versions
+
+DEFAULT_CHUNK_SIZE = 2000
+
+
+def upsert_sql(model, key, columns):
+    """``INSERT ... ON CONFLICT (key) DO UPDATE`` adding ``columns`` to the stored row."""
+    table = connection.ops.quote_name(model._meta.db_table)
+    quote = connection.ops.quote_name
+    names = [model._meta.get_field(name).column for name in [key, *columns]]
+    increments = ', '.join(f'{quote(name)} = {table}.{quote(name)} + excluded.{quote(name)}' for name in names[1:])
+    return (
+        f'INSERT INTO {table} ({", ".join(map(quote, names))}) VALUES ({", ".join(["%s"] * len(names))}) '
+        f'ON CONFLICT ({quote(names[0])}) DO UPDATE SET {increments}'
+    )
+
+
+def record_orders(orders):
+    """Add new orders to the sales rollups.
+
+    ``orders`` is a list of ``(order, lines)`` pairs where ``lines`` holds a
+    ``(product_id, price)`` per product on the order. Call it inside the
+    transaction that writes the orders: each rollup table gets a single
+    upsert that increments its rows, so concurrent writers never overwrite
+    each other's totals. Orders changed or deleted later are not tracked;
+    run ``rebuild_rollups`` after such edits.
+    """
+    if not orders:
+        return
+    days = defaultdict(lambda: [0, Decimal(0)])
+    products = defaultdict(lambda: [0, Decimal(0)])
+    customers = defaultdict(lambda: [0, Decimal(0)])
+    for order, lines in orders:
+        total = Decimal(order.total_amount)
+        for totals in (days[timezone.localdate(order.order_date)], customers[order.customer_id]):
+            totals[0] += 1
+            totals[1] += total
+        for product_id, price in lines:
+            products[product_id][0] += 1
+            products[product_id][1] += Decimal(price)
+
+    with connection.cursor() as cursor:
+        for model, key, columns, rows in (
+            (DailySales, 'date', ['orders', 'revenue'], days),
+            (ProductSales, 'product', ['units', 'revenue'], products),
+            (CustomerSales, 'customer', ['orders', 'revenue'], customers),
+        ):
+            fields = [model._meta.get_field(name) for name in [key, *columns]]
+            # Sorted keys take row locks in the same order in every writer
+            cursor.executemany(upsert_sql(model, key, columns), [
+                [field.get_db_prep_value(value, connection) for field, value in zip(fields, (key_value, *totals))]
+                for key_value, totals in sorted(rows.items())
+            ])
+    # Raw SQL sends no post_save signals
+    model_versions.bump(DailySales, ProductSales, CustomerSales)
+
+
+def line_price():
+    # The price stored on the line item when the order was placed; lines
+    # added through ``order.products`` have none and count the current price
+    return Coalesce('price', 'product__price')
+
+
+def rebuild(chunk_size=DEFAULT_CHUNK_SIZE):
+    """Recompute every rollup row from the live and archived orders, in one transaction.
+
+    Returns ``{model name: rows written}``.
+    """
+    Line = Order.products.through
+    sources = (
+        (
+            DailySales,
+            Order.objects.annotate(day=TruncDate('order_date')).values('day')
+            .annotate(count=Count('pk'), total=Sum('total_amount')).order_by('day'),
+            lambda row: DailySales(date=row['day'], orders=row['count'], revenue=row['total']),
+        ),
+        (
+            ProductSales,
+            Line.objects.values('product_id')
+            .annotate(count=Count('pk'), total=Sum(line_price())).order_by('product_id'),
+            lambda row: ProductSales(product_id=row['product_id'], units=row['count'], revenue=row['total']),
+        ),
+        (
+            CustomerSales,
+            Order.objects.values('customer_id')
+            .annotate(count=Count('pk'), total=Sum('total_amount')).order_by('customer_id'),
+            lambda row: CustomerSales(customer_id=row['customer_id'], orders=row['count'], revenue=row['total']),
+        ),
+    )
+    written = {}
+    with transaction.atomic():
+        for model, rows, build in sources:
+            # Plain DELETE: the ORM would fetch every row to send signals
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {connection.ops.quote_name(model._meta.db_table)}')
+            written[model.__name__] = 0
+            batch = []
+            for row in rows.iterator(chunk_size=chunk_size):
+                batch.append(build(row))
+                if len(batch) == chunk_size:
+                    model.objects.bulk_create(batch)
+                    written[model.__name__] += len(batch)
+                    batch = []
+            model.objects.bulk_create(batch)
+            written[model.__name__] += len(batch)
+        for model, key, columns, rows in archive_sources():
+            fields = [model._meta.get_field(name) for name in [key, *columns]]
+            with connection.cursor() as cursor:
+                batch = []
+                for row in rows.iterator(chunk_size=chunk_size):
+                    batch.append([field.get_db_prep_value(value, connection) for field, value in zip(fields, row)])
+                    if len(batch) == chunk_size:
+                        cursor.executemany(upsert_sql(model, key, columns), batch)
+                        written[model.__name__] += len(batch)
+                        batch = []
+                cursor.executemany(upsert_sql(model, key, columns), batch)
+                written[model.__name__] += len(batch)
+    model_versions.bump(DailySales, ProductSales, CustomerSales)
+    return written
+
+
+def archive_sources():
+    """``(model, key, columns, rows)`` totals of the archived orders (``crm.archive``).
+
+    ``rebuild`` adds them onto the totals of the live orders.
+    """
+    Item = ArchivedOrder.products.through
+    return (
+        (
+            DailySales, 'date', ['orders', 'revenue'],
+            ArchivedOrder.objects.annotate(day=TruncDate('order_date')).values_list('day')
+            .annotate(count=Count('pk'), total=Sum('total_amount')).order_by('day'),
+        ),
+        (
+            ProductSales, 'product', ['units', 'revenue'],
+            Item.objects.values_list('product_id')
+            .annotate(count=Count('pk'), total=Sum(line_price())).order_by('product_id'),
+        ),
+        (
+            CustomerSales, 'customer', ['orders', 'revenue'],
+            ArchivedOrder.objects.values_list('customer_id')
+            .annotate(count=Count('pk'), total=Sum('total_amount')).order_by('customer_id'),
+        ),
+    )
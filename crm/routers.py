@@ -0,0 +1,72 @@
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_read_alias = ContextVar('crm_read_alias', default=None)
+_synced = set()
+
+
+@contextmanager
+def replica_reads():
+    """Route reads made inside the block to ``CRM_READ_DATABASE``.
+
+    The GraphQL views wrap each request in this; everything else (admin,
+    commands, writes) keeps using the primary.
+    """
+    token = _read_alias.set(getattr(settings, 'CRM_READ_DATABASE', None))
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def pin_primary():
+    """Send the rest of the current ``replica_reads`` block to the primary.
+
+    Called before mutations and on every write so a request reads its own
+    writes even when the replica lags behind.
+    """
+    if _read_alias.get() is not None:
+        _read_alias.set(None)
+
+
+def is_replica(alias):
+    """False for an alias naming the primary's own database (as a test mirror
+    does) or an SQLite replica file that ``sync_replica`` has not written yet.
+    """
+    if alias in _synced:
+        return True
+    connection = connections[alias]
+    if connection.settings_dict['NAME'] == connections[DEFAULT_DB_ALIAS].settings_dict['NAME']:
+        return False
+    if connection.vendor == 'sqlite' and not connection.is_in_memory_db():
+        name = connection.settings_dict['NAME']
+        if not os.path.exists(name) or not os.path.getsize(name):
+            return False
+    _synced.add(alias)
+    return True
+
+
+class PrimaryReplicaRouter:
+    """Reads inside ``replica_reads`` go to the replica, all writes to the primary."""
+
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        if alias is not None and is_replica(alias):
+            return alias
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        pin_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is a file copy of the primary, never migrated itself
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,208 @@
+import re
+
+from django.db import OperationalError, connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import ArchivedOrder, Customer, Order, Product
+
+TOKEN_RE = re.compile(r'\w+')
+
+# Text columns indexed per model
+SEARCH_FIELDS = {
+    'crm.Customer': ('name', 'email'),
+    'crm.Product': ('name',),
+}
+
+_available = {}
+
+
+class SearchIndex:
+    """External-content FTS5 table over text columns of one model.
+
+    Rows live only in the model's table; triggers copy every insert, update
+    and delete into the index, so ``bulk_create`` and ``update()`` stay in
+    sync too. Django's SQLite schema editor rebuilds a table to alter it,
+    which drops its triggers: a migration that alters an indexed model has
+    to run ``create_search_indexes`` again, which restores them and
+    rebuilds the index.
+    """
+
+    def __init__(self, model, fields):
+        self.model = model
+        self.fields = fields
+
+    @property
+    def table(self):
+        return f'{self.model._meta.db_table}_fts'
+
+    def columns(self):
+        return [self.model._meta.get_field(name).column for name in self.fields]
+
+    def table_sql(self):
+        source = self.model._meta.db_table
+        pk = self.model._meta.pk.column
+        return (
+            f'CREATE VIRTUAL TABLE "{self.table}" USING fts5({", ".join(self.columns())}, content=\'{source}\', '
+            f'content_rowid=\'{pk}\', tokenize=\'unicode61 remove_diacritics 2\', prefix=\'2 3\')'
+        )
+
+    def trigger_sql(self):
+        """``{trigger name: CREATE TRIGGER IF NOT EXISTS ...}`` keeping the index in sync."""
+        source = self.model._meta.db_table
+        pk = self.model._meta.pk.column
+        columns = self.columns()
+        names = ', '.join(columns)
+        new = ', '.join(f'new.{column}' for column in columns)
+        old = ', '.join(f'old.{column}' for column in columns)
+        delete = f'INSERT INTO "{self.table}"("{self.table}", rowid, {names}) VALUES (\'delete\', old.{pk}, {old});'
+        insert = f'INSERT INTO "{self.table}"(rowid, {names}) VALUES (new.{pk}, {new});'
+        events = {
+            'ai': f'AFTER INSERT ON "{source}" BEGIN {insert} END',
+            'ad': f'AFTER DELETE ON "{source}" BEGIN {delete} END',
+            'au': f'AFTER UPDATE OF {names} ON "{source}" BEGIN {delete} {insert} END',
+        }
+        return {
+            f'{self.table}_{suffix}': f'CREATE TRIGGER IF NOT EXISTS "{self.table}_{suffix}" {event}'
+            for suffix, event in events.items()
+        }
+
+    def rebuild_sql(self):
+        return f'INSERT INTO "{self.table}"("{self.table}") VALUES (\'rebuild\')'
+
+    def drop_sql(self):
+        return [
+            f'DROP TRIGGER IF EXISTS "{self.table}_{suffix}"' for suffix in ('ai', 'ad', 'au')
+        ] + [f'DROP TABLE IF EXISTS "{self.table}"']
+
+    def matches(self, expression):
+        """Subquery of the pks whose indexed text matches ``expression``."""
+        return RawSQL(f'SELECT rowid FROM "{self.table}" WHERE "{self.table}" MATCH %s', [expression])
+
+    def rank_sql(self, pk_sql):
+        """Scalar SQL for the bm25 rank of the row whose pk is ``pk_sql`` (lower is better)."""
+        return f'(SELECT rank FROM "{self.table}" WHERE "{self.table}" MATCH %s AND rowid = {pk_sql})'
+
+
+def get_index(model):
+    fields = SEARCH_FIELDS.get(model._meta.label)
+    return SearchIndex(model, fields) if fields else None
+
+
+def create_search_index(connection, model):
+    """Create whatever is missing of the FTS5 table and triggers of ``model``.
+
+    The index is rebuilt from the model's table when the FTS table or any
+    trigger had to be created, since writes made without the triggers are
+    missing from it. Returns False where FTS5 is unavailable; ``search``
+    then keeps using LIKE.
+    """
+    index = get_index(model)
+    if index is None or connection.vendor != 'sqlite':
+        return False
+    _available.clear()
+    triggers = index.trigger_sql()
+    with connection.cursor() as cursor:
+        created = index.table not in connection.introspection.table_names()
+        if created:
+            try:
+                cursor.execute(index.table_sql())
+            except OperationalError:
+                # SQLite built without FTS5
+                return False
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name IN (%s)" % ', '.join(['%s'] * len(triggers)),
+            list(triggers),
+        )
+        present = {name for name, in cursor.fetchall()}
+        for sql in triggers.values():
+            cursor.execute(sql)
+        if created or present != set(triggers):
+            cursor.execute(index.rebuild_sql())
+    return True
+
+
+def drop_search_index(connection, model):
+    index = get_index(model)
+    if index is None or connection.vendor != 'sqlite':
+        return
+    _available.clear()
+    with connection.cursor() as cursor:
+        for sql in index.drop_sql():
+            cursor.execute(sql)
+
+
+def fts_available(alias):
+    """True when the FTS5 tables exist on ``alias`` (checked once per database)."""
+    connection = connections[alias]
+    key = (alias, connection.settings_dict['NAME'])
+    if key not in _available:
+        tables = set(connection.introspection.table_names())
+        _available[key] = connection.vendor == 'sqlite' and all(
+            get_index(model).table in tables for model in (Customer, Product)
+        )
+    return _available[key]
+
+
+def match_expression(text):
+    """FTS5 query requiring every word of ``text`` as a prefix, or '' if it has none."""
+    return ' '.join(f'"{token}"*' for token in TOKEN_RE.findall(text))
+
+
+def search(queryset, text):
+    """Rows of ``queryset`` matching ``text``, most relevant first.
+
+    Customers match on name and email, products on name, and orders (live
+    or archived) on their customer's or any of their products' text. Without the FTS5 index
+    this falls back to the ``icontains`` scans in unspecified order.
+    """
+    expression = match_expression(text)
+    if not expression or not fts_available(queryset.db):
+        return like_search(queryset, text)
+
+    model = queryset.model
+    table = model._meta.db_table
+    if model in (Order, ArchivedOrder):
+        customers = get_index(Customer)
+        products = get_index(Product)
+        through = model.products.through._meta
+        order_column = through.get_field('order').column
+        product_column = through.get_field('product').column
+        pk = f'"{table}".{model._meta.pk.column}'
+        customer_rank = customers.rank_sql(f'"{table}".{model._meta.get_field("customer").column}')
+        product_rank = (
+            f'(SELECT MIN(rank) FROM "{products.table}" JOIN "{through.db_table}" '
+            f'ON "{through.db_table}".{product_column} = "{products.table}".rowid '
+            f'WHERE "{products.table}" MATCH %s AND "{through.db_table}".{order_column} = {pk})'
+        )
+        # Best of the customer's rank and the best matching product's rank
+        rank = RawSQL(
+            f'MIN(COALESCE({customer_rank}, 0), COALESCE({product_rank}, 0))',
+            [expression, expression],
+        )
+        by_product = RawSQL(
+            f'SELECT {order_column} FROM "{through.db_table}" WHERE {product_column} IN '
+            f'(SELECT rowid FROM "{products.table}" WHERE "{products.table}" MATCH %s)',
+            [expression],
+        )
+        queryset = queryset.filter(
+            Q(customer_id__in=customers.matches(expression)) | Q(pk__in=by_product)
+        )
+    else:
+        index = get_index(model)
+        rank = RawSQL(index.rank_sql(f'"{table}".{model._meta.pk.column}'), [expression])
+        queryset = queryset.filter(pk__in=index.matches(expression))
+    return queryset.annotate(search_rank=rank).order_by('search_rank', 'pk')
+
+
+def like_search(queryset, text):
+    model = queryset.model
+    if model in (Order, ArchivedOrder):
+        by_product = model.objects.filter(products__name__icontains=text).values('pk')
+        return queryset.filter(
+            Q(customer__name__icontains=text) | Q(customer__email__icontains=text) | Q(pk__in=by_product)
+        )
+    condition = Q()
+    for name in SEARCH_FIELDS[model._meta.label]:
+        condition |= Q(**{f'{name}__icontains': text})
+    return queryset.filter(condition)
@@ -0,0 +1,93 @@
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+from django.db.models import Case, F, Value, When
+
+from .models import Order, Product
+from .rollups import record_orders
+from .versions import model_versions
+
+DEFAULT_LOCK_RETRIES = 3
+DEFAULT_LOCK_RETRY_BACKOFF = 0.05
+# PostgreSQL lock_not_available, deadlock_detected and serialization_failure
+LOCK_ERROR_CODES = {'55P03', '40P01', '40001'}
+
+
+class OutOfStock(Exception):
+    def __init__(self, products):
+        self.products = products
+        super().__init__('Insufficient stock for: ' + ', '.join(product.name for product in products))
+
+
+def is_lock_error(error):
+    """True for errors worth retrying: lock and busy timeouts, deadlocks."""
+    code = getattr(error.__cause__, 'pgcode', None) or getattr(error.__cause__, 'sqlstate', None)
+    # SQLite reports "database is locked" / "database table is locked"
+    return code in LOCK_ERROR_CODES or 'locked' in str(error)
+
+
+def retry_on_lock(func, retries=None, backoff=None):
+    """Call ``func``, retrying with jittered exponential backoff on lock errors.
+
+    Inside an outer transaction the failed statement has already aborted
+    it, so the error is raised straight away for the caller to retry.
+    """
+    if retries is None:
+        retries = getattr(settings, 'CRM_LOCK_RETRIES', DEFAULT_LOCK_RETRIES)
+    if backoff is None:
+        backoff = getattr(settings, 'CRM_LOCK_RETRY_BACKOFF', DEFAULT_LOCK_RETRY_BACKOFF)
+    for attempt in range(retries + 1):
+        try:
+            return func()
+        except OperationalError as error:
+            if attempt == retries or connection.in_atomic_block or not is_lock_error(error):
+                raise
+        time.sleep(backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+
+
+def reserve_stock(quantities):
+    """Take ``{product_pk: quantity}`` out of stock, all or nothing.
+
+    One conditional ``UPDATE ... SET stock = stock - n WHERE stock >= n``
+    covers every product, so concurrent orders can never drive stock below
+    zero and no row is read first. When any product is short the update is
+    rolled back and ``OutOfStock`` names the short products.
+    """
+    if not quantities:
+        return
+    quantity = Case(*[When(pk=pk, then=Value(n)) for pk, n in quantities.items()])
+    with transaction.atomic():
+        updated = (
+            Product.objects
+            .filter(pk__in=list(quantities), stock__gte=quantity)
+            .update(stock=F('stock') - quantity)
+        )
+        if updated != len(quantities):
+            transaction.set_rollback(True)
+    if updated != len(quantities):
+        products = Product.objects.filter(pk__in=list(quantities)).only('name', 'stock').order_by('pk')
+        raise OutOfStock([product for product in products if product.stock < quantities[product.pk]])
+
+
+def place_order(customer, products):
+    """Reserve one unit of each of ``products`` and create the order in one transaction."""
+
+    def attempt():
+        with transaction.atomic():
+            reserve_stock({product.pk: 1 for product in products})
+            order = Order.objects.create(
+                customer=customer,
+                total_amount=sum(product.price for product in products),
+            )
+            through = Order.products.through
+            through.objects.bulk_create(
+                through(order_id=order.pk, product_id=product.pk, price=product.price) for product in products
+            )
+            record_orders([(order, [(product.pk, product.price) for product in products])])
+        # bulk_create sends no m2m_changed signals
+        model_versions.bump(through)
+        return order
+
+    return retry_on_lock(attempt)
@@ -1,3 +1,1576 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase
+from graphql_relay import to_global_id
+
+from .models import Customer, Product, Order
+
+
+class GraphQLTestMixin:
+    def setUp(self):
+        from alx_backend_graphql.result_cache import result_cache
+        from .archive import archive_boundary
+        from .catalog import catalog
+
+        result_cache.clear()
+        catalog.clear()
+        archive_boundary.clear()
+        # Read once per archive version by a running process, so query
+        # counts below are those of a warm one
+        archive_boundary.get()
+
+    def query(self, query, variables=None):
+        response = self.client.post(
+            '/graphql',
+            data=json.dumps({'query': query, 'variables': variables or {}}),
+            content_type='application/json',
+        )
+        return response.json()
+
+    def create_orders(self, count, products_per_order=2):
+        products = [
+            Product.objects.create(name=f'Product {i}', price='10.00', stock=5)
+            for i in range(products_per_order)
+        ]
+        orders = []
+        start = Customer.objects.count()
+        for i in range(start, start + count):
+            customer = Customer.objects.create(name=f'Customer {i}', email=f'c{i}@example.com')
+            order = Order.objects.create(customer=customer, total_amount='20.00')
+            order.products.set(products)
+            orders.append(order)
+        return orders
+
+
+class GraphQLTestCase(GraphQLTestMixin, TestCase):
+    pass
+
+
+class LoaderTests(GraphQLTestCase):
+    QUERY = '''
+    {
+      allOrders {
+        edges { node {
+          customer { name orders { edges { node { totalAmount } } } }
+          products { edges { node { name orders { edges { node { id } } } } } }
+        } }
+      }
+    }
+    '''
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        self.create_orders(3)
+        with self.assertNumQueries(4) as small:
+            result = self.query(self.QUERY)
+        self.assertNotIn('errors', result)
+        self.create_orders(20)
+        with self.assertNumQueries(len(small.captured_queries)):
+            result = self.query(self.QUERY)
+        self.assertEqual(len(result['data']['allOrders']['edges']), 23)
+
+    def test_nested_connections_match_related_managers(self):
+        order = self.create_orders(1, products_per_order=3)[0]
+        result = self.query(self.QUERY)
+        node = result['data']['allOrders']['edges'][0]['node']
+        self.assertEqual(node['customer']['name'], order.customer.name)
+        self.assertEqual(
+            [edge['node']['name'] for edge in node['products']['edges']],
+            [product.name for product in order.products.order_by('pk')],
+        )
+
+    def test_nested_first_reads_one_page_per_parent(self):
+        self.create_orders(6)
+        query = '''{ allProducts { edges { node {
+            orders(first: 2) { %s edges { node { id } } pageInfo { hasNextPage } }
+        } } } }'''
+        with self.assertNumQueries(2) as queries:
+            result = self.query(query % '')
+        self.assertIn('ROW_NUMBER', queries.captured_queries[-1]['sql'])
+        for edge in result['data']['allProducts']['edges']:
+            orders = edge['node']['orders']
+            self.assertEqual((len(orders['edges']), orders['pageInfo']['hasNextPage']), (2, True))
+        # totalCount needs every row
+        with self.assertNumQueries(2) as queries:
+            result = self.query(query % 'totalCount')
+        self.assertNotIn('ROW_NUMBER', queries.captured_queries[-1]['sql'])
+        self.assertEqual(result['data']['allProducts']['edges'][0]['node']['orders']['totalCount'], 6)
+
+    def test_limited_loader_batches_the_primed_parents(self):
+        from .loaders import Loaders
+
+        self.create_orders(6)
+        products = list(Product.objects.all())
+        loaders = Loaders()
+        loaders.prime(products)
+        with self.assertNumQueries(1):
+            groups = [loaders.limited('product_orders', 3).load(product.pk) for product in products]
+        self.assertEqual([len(orders) for orders in groups], [3, 3])
+        self.assertEqual(len(loaders.product_orders.load(products[0].pk)), 6)
+
+    def test_filtered_nested_connection_falls_back_to_queryset(self):
+        self.create_orders(2, products_per_order=3)
+        result = self.query('{ allOrders { edges { node { products(name: "1") { edges { node { name } } } } } } }')
+        for edge in result['data']['allOrders']['edges']:
+            names = [product['node']['name'] for product in edge['node']['products']['edges']]
+            self.assertEqual(names, ['Product 1'])
+
+
+class OptimizerTests(GraphQLTestCase):
+    def test_narrow_selection_reads_narrow_rows(self):
+        self.create_orders(2)
+        with self.assertNumQueries(1) as queries:
+            self.query('{ allCustomers { edges { node { name } } } }')
+        sql = queries.captured_queries[-1]['sql']
+        self.assertIn('"crm_customer"."name"', sql)
+        self.assertNotIn('"crm_customer"."email"', sql)
+
+    def test_foreign_key_is_joined(self):
+        self.create_orders(5)
+        with self.assertNumQueries(1) as queries:
+            result = self.query('{ allOrders { edges { node { totalAmount customer { email } } } } }')
+        self.assertIn('JOIN "crm_customer"', queries.captured_queries[-1]['sql'])
+        self.assertEqual(len(result['data']['allOrders']['edges']), 5)
+
+    def test_product_name_filter_does_not_repeat_orders(self):
+        self.create_orders(2, products_per_order=3)
+        result = self.query('{ allOrders(productName: "Product") { edges { node { id } } } }')
+        self.assertEqual(len(result['data']['allOrders']['edges']), 2)
+
+
+class KeysetPaginationTests(GraphQLTestCase):
+    QUERY = '''
+    query ($after: String, $before: String, $first: Int, $last: Int, $orderBy: String) {
+      allOrders(after: $after, before: $before, first: $first, last: $last, orderBy: $orderBy) {
+        edges { cursor node { id totalAmount } }
+        pageInfo { hasNextPage hasPreviousPage endCursor startCursor }
+      }
+    }
+    '''
+
+    def setUp(self):
+        super().setUp()
+        self.orders = self.create_orders(7, products_per_order=1)
+        for i, order in enumerate(self.orders):
+            order.total_amount = [5, 3, 5, 9, 1, 3, 5][i]
+            order.save()
+
+    def page(self, **variables):
+        result = self.query(self.QUERY, variables)
+        self.assertNotIn('errors', result)
+        return result['data']['allOrders']
+
+    def test_walks_every_row_once_in_order(self):
+        seen, after = [], None
+        while True:
+            page = self.page(first=3, after=after, orderBy='-totalAmount')
+            seen += [edge['node']['totalAmount'] for edge in page['edges']]
+            if not page['pageInfo']['hasNextPage']:
+                break
+            after = page['pageInfo']['endCursor']
+        self.assertEqual(seen, ['9.00', '5.00', '5.00', '5.00', '3.00', '3.00', '1.00'])
+
+    def test_backwards_page(self):
+        last_page = self.page(first=4, orderBy='totalAmount')
+        page = self.page(last=2, before=last_page['pageInfo']['endCursor'], orderBy='totalAmount')
+        self.assertEqual([edge['node']['totalAmount'] for edge in page['edges']], ['3.00', '3.00'])
+        self.assertTrue(page['pageInfo']['hasPreviousPage'])
+        self.assertTrue(page['pageInfo']['hasNextPage'])
+
+    def test_deep_page_issues_no_count(self):
+        first = self.page(first=5)
+        with self.assertNumQueries(1) as queries:
+            self.page(first=5, after=first['pageInfo']['endCursor'])
+        self.assertNotIn('COUNT', queries.captured_queries[0]['sql'])
+        self.assertNotIn('OFFSET', queries.captured_queries[0]['sql'])
+
+    def test_total_count_is_opt_in(self):
+        result = self.query('{ allOrders(first: 2) { totalCount edges { node { id } } } }')
+        self.assertEqual(result['data']['allOrders']['totalCount'], 7)
+
+    def test_rejects_unknown_ordering(self):
+        result = self.query('{ allOrders(orderBy: "customer__email") { edges { node { id } } } }')
+        self.assertIn('Cannot order by', result['errors'][0]['message'])
+
+    def test_offset_still_supported(self):
+        page = self.page(first=2)
+        result = self.query('{ allOrders(offset: 5) { edges { node { id } } } }')
+        self.assertEqual(len(result['data']['allOrders']['edges']), 2)
+        self.assertEqual(len(page['edges']), 2)
+
+
+class BulkCreateCustomersTests(GraphQLTestCase):
+    MUTATION = '''
+    mutation ($input: [CreateCustomerInput]!) {
+      bulkCreateCustomers(input: $input) {
+        customers { id email }
+        errors
+        rowErrors { index message }
+      }
+    }
+    '''
+
+    def test_reports_duplicates_with_input_indexes(self):
+        Customer.objects.create(name='Existing', email='taken@example.com')
+        rows = [
+            {'name': 'A', 'email': 'a@example.com'},
+            {'name': 'B', 'email': 'taken@example.com'},
+            {'name': 'C', 'email': 'a@example.com'},
+            {'name': 'D', 'email': 'd@example.com', 'phone': '+123'},
+        ]
+        result = self.query(self.MUTATION, {'input': rows})['data']['bulkCreateCustomers']
+        self.assertEqual([c['email'] for c in result['customers']], ['a@example.com', 'd@example.com'])
+        self.assertTrue(all(c['id'] for c in result['customers']))
+        self.assertEqual([e['index'] for e in result['rowErrors']], [1, 2])
+        self.assertEqual(result['errors'][0], 'Email taken@example.com already exists')
+        self.assertEqual(Customer.objects.count(), 3)
+
+    def test_query_count_is_per_chunk(self):
+        rows = [{'name': f'C{i}', 'email': f'c{i}@example.com'} for i in range(30)]
+        with self.settings(CRM_BULK_CHUNK_SIZE=10):
+            with self.assertNumQueries(3 * 4 + 2):
+                result = self.query(self.MUTATION, {'input': rows})
+        self.assertEqual(len(result['data']['bulkCreateCustomers']['customers']), 30)
+
+
+class BulkCreateOrdersTests(GraphQLTestCase):
+    MUTATION = '''
+    mutation ($input: [CreateOrderInput]!) {
+      bulkCreateOrders(input: $input) {
+        orders { totalAmount customer { name } products { edges { node { name } } } }
+        rowErrors { index message }
+      }
+    }
+    '''
+
+    def test_creates_orders_with_totals_and_line_items(self):
+        customer = Customer.objects.create(name='Alice', email='alice@example.com')
+        laptop = Product.objects.create(name='Laptop', price='999.99', stock=3)
+        mouse = Product.objects.create(name='Mouse', price='20.01', stock=3)
+        rows = [
+            {'customerId': str(customer.pk), 'productIds': [str(laptop.pk), str(mouse.pk)]},
+            {'customerId': '999', 'productIds': [str(laptop.pk)]},
+            {'customerId': str(customer.pk), 'productIds': ['999']},
+            {'customerId': str(customer.pk), 'productIds': [str(mouse.pk), '999']},
+        ]
+        result = self.query(self.MUTATION, {'input': rows})['data']['bulkCreateOrders']
+        self.assertEqual([o['totalAmount'] for o in result['orders']], ['1020.00', '20.01'])
+        self.assertEqual(result['orders'][0]['customer']['name'], 'Alice')
+        self.assertEqual(
+            [edge['node']['name'] for edge in result['orders'][0]['products']['edges']],
+            ['Laptop', 'Mouse'],
+        )
+        self.assertEqual(
+            result['rowErrors'],
+            [{'index': 1, 'message': 'Customer not found'}, {'index': 2, 'message': 'No valid products found'}],
+        )
+        self.assertEqual(Order.products.through.objects.count(), 3)
+
+    def test_query_count_does_not_grow_with_payload(self):
+        customer = Customer.objects.create(name='Alice', email='alice@example.com')
+        product = Product.objects.create(name='Laptop', price='10.00', stock=50)
+        rows = [{'customerId': str(customer.pk), 'productIds': [str(product.pk)]}] * 50
+        # Lookups, stock update (in its savepoint), order and line inserts,
+        # one upsert per sales rollup, all in one savepoint
+        with self.assertNumQueries(12):
+            self.query('mutation ($input: [CreateOrderInput]!) { bulkCreateOrders(input: $input) { errors } }', {'input': rows})
+        self.assertEqual(Order.objects.count(), 50)
+
+    def test_rows_short_on_stock_are_rejected(self):
+        customer = Customer.objects.create(name='Alice', email='alice@example.com')
+        laptop = Product.objects.create(name='Laptop', price='10.00', stock=2)
+        mouse = Product.objects.create(name='Mouse', price='1.00', stock=0)
+        cable = Product.objects.create(name='Cable', price='2.00', stock=5)
+        row = lambda *products: {'customerId': str(customer.pk), 'productIds': [str(p.pk) for p in products]}
+        rows = [row(laptop, cable), row(mouse), row(laptop), row(laptop, cable), row(cable)]
+        result = self.query(self.MUTATION, {'input': rows})['data']['bulkCreateOrders']
+        self.assertEqual([o['totalAmount'] for o in result['orders']], ['12.00', '10.00', '2.00'])
+        self.assertEqual(result['rowErrors'], [
+            {'index': 1, 'message': 'Insufficient stock for: Mouse'},
+            {'index': 3, 'message': 'Insufficient stock for: Laptop'},
+        ])
+        stock = dict(Product.objects.values_list('name', 'stock'))
+        self.assertEqual(stock, {'Laptop': 0, 'Mouse': 0, 'Cable': 3})
+
+
+class StockReservationTests(GraphQLTestCase):
+    MUTATION = 'mutation($c: ID!, $p: [ID]!) { createOrder(input: {customerId: $c, productIds: $p}) { order { totalAmount } } }'
+
+    def setUp(self):
+        super().setUp()
+        self.customer = Customer.objects.create(name='Ada', email='ada@example.com')
+        self.pen = Product.objects.create(name='Pen', price='2.50', stock=2)
+        self.ink = Product.objects.create(name='Ink', price='4.00', stock=1)
+
+    def order(self, *products):
+        return self.query(self.MUTATION, {'c': self.customer.pk, 'p': [product.pk for product in products]})
+
+    def test_decrements_every_product_in_one_update(self):
+        with self.assertNumQueries(12) as queries:
+            result = self.order(self.pen, self.ink)
+        self.assertEqual(result['data']['createOrder']['order']['totalAmount'], '6.50')
+        updates = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"stock" >=', updates[0])
+        self.assertEqual(
+            dict(Product.objects.values_list('name', 'stock')), {'Pen': 1, 'Ink': 0}
+        )
+
+    def test_out_of_stock_fails_without_side_effects(self):
+        self.order(self.ink)
+        result = self.order(self.pen, self.ink)
+        self.assertEqual(result['errors'][0]['message'], 'Insufficient stock for: Ink')
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(Product.objects.get(pk=self.pen.pk).stock, 2)
+
+    def test_retries_lock_timeouts(self):
+        from django.db import OperationalError
+
+        from crm import stock
+
+        calls = []
+
+        def flaky():
+            calls.append(1)
+            if len(calls) < 3:
+                raise OperationalError('database is locked')
+            return 'done'
+
+        with mock.patch.object(stock.connection, 'in_atomic_block', False), mock.patch.object(stock.time, 'sleep') as sleep:
+            self.assertEqual(stock.retry_on_lock(flaky, retries=3, backoff=0.1), 'done')
+            self.assertEqual(sleep.call_count, 2)
+            with self.assertRaises(OperationalError):
+                stock.retry_on_lock(mock.Mock(side_effect=OperationalError('no such table')), retries=3)
+        self.assertEqual(sleep.call_count, 2)
+
+
+class CatalogTests(GraphQLTestCase):
+    CREATE = 'mutation($c: ID!, $p: [ID]!) { createOrder(input: {customerId: $c, productIds: $p}) { order { totalAmount } } }'
+
+    def setUp(self):
+        super().setUp()
+        from .catalog import catalog
+
+        self.catalog = catalog
+        self.customer = Customer.objects.create(name='Ada', email='ada@example.com')
+        self.pen = Product.objects.create(name='Pen', price='2.50', stock=10)
+        self.ink = Product.objects.create(name='Ink', price='4.00', stock=10)
+
+    def order(self, *products):
+        result = self.query(self.CREATE, {'c': self.customer.pk, 'p': [product.pk for product in products]})
+        return result['data']['createOrder']['order']['totalAmount']
+
+    def test_create_order_prices_from_the_catalog(self):
+        self.order(self.pen, self.ink)
+        with self.assertNumQueries(11) as queries:
+            self.assertEqual(self.order(self.pen, self.ink), '6.50')
+        self.assertFalse(any('FROM "crm_product"' in query['sql'] for query in queries.captured_queries))
+        self.assertEqual(self.catalog.stats()['hits'], 2)
+
+    def test_product_save_invalidates(self):
+        self.order(self.pen)
+        self.pen.price = '3.00'
+        self.pen.save()
+        self.assertEqual(self.order(self.pen), '3.00')
+
+    def test_product_update_invalidates(self):
+        self.order(self.pen)
+        Product.objects.filter(pk=self.pen.pk).update(stock=20)
+        self.order(self.pen)
+        self.assertEqual(self.catalog.stats()['hits'], 1)
+        Product.objects.filter(pk=self.pen.pk).update(price='3.00')
+        self.assertEqual(self.order(self.pen), '3.00')
+
+    def test_records_expire(self):
+        from django.db import connection
+        from django.test import override_settings
+
+        self.order(self.pen)
+        # Another process writing leaves this one's versions as they are
+        with connection.cursor() as cursor:
+            cursor.execute('UPDATE crm_product SET price = 3.00 WHERE id = %s', [self.pen.pk])
+        self.assertEqual(self.order(self.pen), '2.50')
+        with override_settings(CRM_CATALOG_TTL=0):
+            self.assertEqual(self.order(self.pen), '3.00')
+
+    def test_stock_is_read_fresh(self):
+        self.order(self.pen)
+        product = self.catalog.product(self.pen.pk)
+        self.assertEqual((product.name, str(product.price)), ('Pen', '2.50'))
+        with self.assertNumQueries(1):
+            self.assertEqual(product.stock, 9)
+        self.assertIsNone(self.catalog.product('not an id'))
+
+    def test_lru_eviction_and_warm_up(self):
+        from django.test import override_settings
+
+        from .rollups import rebuild
+
+        tape = Product.objects.create(name='Tape', price='1.00', stock=10)
+        self.order(self.ink)
+        rebuild()
+        self.catalog.clear()
+        with override_settings(CRM_CATALOG_SIZE=2):
+            # The best seller first, then the lowest ids
+            self.assertEqual(self.catalog.warm(), 2)
+            self.assertEqual(set(self.catalog.get_many([self.ink.pk, self.pen.pk])), {self.ink.pk, self.pen.pk})
+            self.catalog.get_many([tape.pk])
+            stats = self.catalog.stats()
+        self.assertEqual((stats['size'], stats['evictions'], stats['hits'], stats['misses']), (2, 1, 2, 3))
+        self.assertIn('crm_catalog_hits_total 2', self.client.get('/metrics').content.decode())
+
+
+class SalesRollupTests(GraphQLTestCase):
+    def setUp(self):
+        super().setUp()
+        self.ada = Customer.objects.create(name='Ada', email='ada@example.com')
+        self.bob = Customer.objects.create(name='Bob', email='bob@example.com')
+        self.pen = Product.objects.create(name='Pen', price='2.50', stock=10)
+        self.ink = Product.objects.create(name='Ink', price='4.00', stock=10)
+
+    def snapshot(self):
+        from .models import CustomerSales, DailySales, ProductSales
+
+        return (
+            list(DailySales.objects.order_by('date').values_list('date', 'orders', 'revenue')),
+            list(ProductSales.objects.order_by('pk').values_list('product_id', 'units', 'revenue')),
+            list(CustomerSales.objects.order_by('pk').values_list('customer_id', 'orders', 'revenue')),
+        )
+
+    def place_orders(self):
+        create = 'mutation($c: ID!, $p: [ID]!) { createOrder(input: {customerId: $c, productIds: $p}) { order { id } } }'
+        self.query(create, {'c': self.ada.pk, 'p': [self.pen.pk, self.ink.pk]})
+        self.query(create, {'c': self.bob.pk, 'p': [self.pen.pk]})
+        self.query(
+            'mutation($input: [CreateOrderInput]!) { bulkCreateOrders(input: $input) { errors } }',
+            {'input': [{'customerId': self.ada.pk, 'productIds': [self.ink.pk]}] * 2},
+        )
+
+    def test_writes_keep_rollups_in_step_with_rebuild(self):
+        from decimal import Decimal
+
+        from .rollups import rebuild
+
+        self.place_orders()
+        incremental = self.snapshot()
+        days, products, customers = incremental
+        self.assertEqual([row[1:] for row in days], [(4, Decimal('17.00'))])
+        self.assertEqual(products, [(self.pen.pk, 2, Decimal('5.00')), (self.ink.pk, 3, Decimal('12.00'))])
+        self.assertEqual(customers, [(self.ada.pk, 3, Decimal('14.50')), (self.bob.pk, 1, Decimal('2.50'))])
+        rebuild()
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_rebuild_keeps_revenue_at_order_time_prices(self):
+        from datetime import timedelta
+
+        from django.utils import timezone
+
+        from .archive import archive_orders
+        from .rollups import rebuild
+
+        self.place_orders()
+        before = self.snapshot()
+        Product.objects.update(price='99.00')
+        rebuild()
+        self.assertEqual(self.snapshot(), before)
+        list(archive_orders(timezone.now() + timedelta(days=1)))
+        rebuild()
+        self.assertEqual(self.snapshot(), before)
+
+    def test_report_fields(self):
+        self.place_orders()
+        today = Order.objects.first().order_date.date().isoformat()
+        with self.assertNumQueries(1):
+            result = self.query('{ topProducts(n: 1) { product { name } units revenue } }')
+        self.assertEqual(result['data']['topProducts'], [{'product': {'name': 'Ink'}, 'units': 3, 'revenue': '12.00'}])
+        result = self.query('{ topProducts(n: 1, by: "units") { product { name } } topCustomers(n: 5) { customer { name } orders } }')
+        self.assertEqual(result['data']['topProducts'], [{'product': {'name': 'Ink'}}])
+        self.assertEqual(
+            result['data']['topCustomers'],
+            [{'customer': {'name': 'Ada'}, 'orders': 3}, {'customer': {'name': 'Bob'}, 'orders': 1}],
+        )
+        days = self.query('query($d: Date) { salesByDay(from: $d, to: $d) { date orders revenue } }', {'d': today})
+        self.assertEqual(days['data']['salesByDay'], [{'date': today, 'orders': 4, 'revenue': '17.00'}])
+        self.assertEqual(self.query('{ salesByDay(from: "2000-01-01", to: "2000-12-31") { date } }')['data']['salesByDay'], [])
+        self.assertIn('between 1 and 100', self.query('{ topCustomers(n: 0) { orders } }')['errors'][0]['message'])
+
+    def test_rebuild_command(self):
+        self.create_orders(3)
+        out = io.StringIO()
+        call_command('rebuild_rollups', stdout=out)
+        self.assertIn('3 CustomerSales', out.getvalue())
+        self.assertEqual(sum(row[1] for row in self.snapshot()[0]), 3)
+
+
+class ComputedFieldTests(GraphQLTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pen = Product.objects.create(name='Pen', price='2.50', stock=10)
+        self.ink = Product.objects.create(name='Ink', price='4.00', stock=10)
+        for i, totals in enumerate([['5.00', '7.50'], ['30.00'], [], ['1.00', '2.00', '3.00']]):
+            customer = Customer.objects.create(name=f'Customer {i}', email=f'c{i}@example.com')
+            for total in totals:
+                order = Order.objects.create(customer=customer, total_amount=total)
+                order.products.set([self.pen, self.ink] if total == '30.00' else [self.pen])
+
+    def test_annotated_in_one_query(self):
+        query = '{ allCustomers(orderBy: "-totalSpent") { edges { node { name orderCount totalSpent lastOrderDate } } } }'
+        with self.assertNumQueries(1):
+            result = self.query(query)
+        nodes = [edge['node'] for edge in result['data']['allCustomers']['edges']]
+        self.assertEqual(
+            [(node['name'], node['orderCount'], node['totalSpent']) for node in nodes],
+            [('Customer 1', 1, '30.00'), ('Customer 0', 2, '12.50'), ('Customer 3', 3, '6.00'), ('Customer 2', 0, '0.00')],
+        )
+        self.assertIsNotNone(nodes[0]['lastOrderDate'])
+        self.assertIsNone(nodes[-1]['lastOrderDate'])
+
+    def test_keyset_pages_and_filters(self):
+        query = '''query($after: String) {
+            allCustomers(first: 2, after: $after, orderBy: "orderCount", totalSpentGte: 1) {
+                edges { node { name } } pageInfo { hasNextPage endCursor }
+            }
+        }'''
+        first = self.query(query)['data']['allCustomers']
+        second = self.query(query, {'after': first['pageInfo']['endCursor']})['data']['allCustomers']
+        names = [edge['node']['name'] for page in (first, second) for edge in page['edges']]
+        self.assertEqual(names, ['Customer 1', 'Customer 0', 'Customer 3'])
+        self.assertFalse(second['pageInfo']['hasNextPage'])
+
+        result = self.query('{ allCustomers(orderCountLte: 1, lastOrderDateGte: "2000-01-01") { edges { node { name } } } }')
+        self.assertEqual([edge['node']['name'] for edge in result['data']['allCustomers']['edges']], ['Customer 1'])
+        result = self.query('{ allProducts(orderBy: "-unitsSold", unitsSoldGte: 1) { edges { node { name unitsSold } } } }')
+        self.assertEqual(
+            [edge['node'] for edge in result['data']['allProducts']['edges']],
+            [{'name': 'Pen', 'unitsSold': 6}, {'name': 'Ink', 'unitsSold': 1}],
+        )
+
+    def test_related_rows_are_batched(self):
+        # Customers come through select_related, products through a prefetch
+        query = '{ allOrders { edges { node { customer { totalSpent } products { edges { node { unitsSold } } } } } } }'
+        with self.assertNumQueries(3):
+            result = self.query(query)
+        totals = [edge['node']['customer']['totalSpent'] for edge in result['data']['allOrders']['edges']]
+        self.assertEqual(totals, ['12.50', '12.50', '30.00', '6.00', '6.00', '6.00'])
+
+
+class QueryPlanTests(GraphQLTestCase):
+    def setUp(self):
+        super().setUp()
+        from .plans import scale_statistics
+
+        self.create_orders(20)
+        # Plans of a table with this few rows would say nothing about production
+        scale_statistics(10000)
+
+    def test_every_filter_has_plan_data(self):
+        from .plans import missing_filters
+
+        self.assertEqual(missing_filters(), [])
+
+    def test_no_filter_or_ordering_scans_a_table(self):
+        from .plans import check
+
+        failures = check()
+        self.assertEqual([f'{case.name}: {problems}' for case, problems in failures], [])
+
+    def test_other_databases_are_refused(self):
+        from django.core.management.base import CommandError
+        from django.db import connection
+
+        with mock.patch.object(connection, 'vendor', 'postgresql'):
+            with self.assertRaisesMessage(CommandError, 'only checked on SQLite, not postgresql'):
+                call_command('check_query_plans', stdout=io.StringIO())
+
+    def test_dropped_index_is_reported(self):
+        from django.db import connection
+
+        from .plans import PlanCase
+        from .filters import ProductFilter
+
+        with connection.cursor() as cursor:
+            cursor.execute('DROP INDEX crm_product_stock_id_idx')
+        case = PlanCase(ProductFilter, ('stock_lte',), 'stock')
+        self.assertEqual(
+            case.problems(), ['no index serves the filters on crm_product', 'sorts every row of crm_product'],
+        )
+
+    def test_phone_pattern_matches_prefixes(self):
+        Customer.objects.create(name='Ada', email='ada@example.com', phone='+15551234')
+        Customer.objects.create(name='Bob', email='bob@example.com', phone='+15561234')
+        result = self.query('{ allCustomers(phonePattern: "+1555") { edges { node { name } } } }')
+        self.assertEqual([edge['node']['name'] for edge in result['data']['allCustomers']['edges']], ['Ada'])
+
+    def test_phone_pattern_with_letters_ignores_case(self):
+        Customer.objects.create(name='Ada', email='ada@example.com', phone='EXT-12')
+        result = self.query('{ allCustomers(phonePattern: "ext") { edges { node { name } } } }')
+        self.assertEqual([edge['node']['name'] for edge in result['data']['allCustomers']['edges']], ['Ada'])
+
+
+class PersistedQueryTests(GraphQLTestCase):
+    QUERY = '{ hello }'
+
+    def setUp(self):
+        super().setUp()
+        from django.core.cache import cache
+        from alx_backend_graphql.documents import document_cache
+
+        cache.clear()
+        document_cache.clear()
+        self.document_cache = document_cache
+
+    def post(self, body):
+        return self.client.post('/graphql', data=json.dumps(body), content_type='application/json').json()
+
+    def persisted(self, query=None):
+        from alx_backend_graphql.documents import query_hash
+
+        body = {'extensions': {'persistedQuery': {'version': 1, 'sha256Hash': query_hash(self.QUERY)}}}
+        if query:
+            body['query'] = query
+        return body
+
+    def test_hash_only_request_registers_on_miss(self):
+        miss = self.post(self.persisted())
+        self.assertEqual(miss['errors'][0]['extensions']['code'], 'PERSISTED_QUERY_NOT_FOUND')
+        registered = self.post(self.persisted(self.QUERY))
+        self.assertEqual(registered['data'], {'hello': 'Hello, GraphQL!'})
+        self.assertEqual(self.post(self.persisted())['data'], {'hello': 'Hello, GraphQL!'})
+
+    def test_mismatched_hash_is_rejected(self):
+        result = self.post(self.persisted('{ __typename }'))
+        self.assertEqual(result['errors'][0]['extensions']['code'], 'INVALID_PERSISTED_QUERY')
+
+    def test_documents_are_parsed_once(self):
+        self.query(self.QUERY)
+        self.query(self.QUERY)
+        self.assertEqual(self.document_cache.stats()['misses'], 1)
+        self.assertEqual(self.document_cache.stats()['hits'], 1)
+
+    def test_allow_list_mode(self):
+        import tempfile
+        from alx_backend_graphql.documents import persisted_queries, query_hash
+
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as manifest:
+            json.dump({query_hash(self.QUERY): self.QUERY}, manifest)
+            manifest.flush()
+            persisted_queries.reset()
+            try:
+                with self.settings(GRAPHQL_PERSISTED_QUERIES_ONLY=True, GRAPHQL_PERSISTED_QUERY_MANIFEST=manifest.name):
+                    self.assertEqual(self.post(self.persisted())['data'], {'hello': 'Hello, GraphQL!'})
+                    rejected = self.query('{ __typename }')
+                    self.assertEqual(rejected['errors'][0]['extensions']['code'], 'PERSISTED_QUERY_NOT_ALLOWED')
+            finally:
+                persisted_queries.reset()
+
+
+class QueryCostTests(GraphQLTestCase):
+    def test_cost_is_reported_in_extensions(self):
+        result = self.query('{ allOrders(first: 10) { edges { node { customer { name } products(first: 5) { edges { node { name } } } } } } }')
+        self.assertEqual(result['extensions']['cost'], {'requested': 1 + 10 * 1 + 10 * 2, 'depth': 2})
+
+    def test_variables_drive_page_size(self):
+        query = 'query ($n: Int) { allProducts(first: $n) { edges { node { orders { edges { node { id } } } } } } }'
+        result = self.query(query, {'n': 4})
+        self.assertEqual(result['extensions']['cost']['requested'], 1 + 4 * 3)
+
+    def test_rejects_deep_cycles_before_execution(self):
+        query = '{ allCustomers { edges { node { orders { edges { node { customer { orders { edges { node { id } } } } } } } } } } }'
+        with self.settings(GRAPHQL_MAX_DEPTH=3):
+            with self.assertNumQueries(0):
+                result = self.query(query)
+        self.assertEqual(result['errors'][0]['extensions']['code'], 'MAX_DEPTH_EXCEEDED')
+
+    def test_rejects_expensive_fan_out(self):
+        query = '{ allCustomers(first: 100) { edges { node { orders(first: 100) { edges { node { products(first: 100) { edges { node { orders(first: 2) { edges { node { id } } } } } } } } } } } } }'
+        result = self.query(query)
+        self.assertEqual(result['errors'][0]['extensions']['code'], 'MAX_COST_EXCEEDED')
+
+    def test_client_budget(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        with self.settings(GRAPHQL_COST_BUDGET=25):
+            first = self.query('{ allOrders(first: 10) { edges { node { customer { name } } } } }')
+            self.assertEqual(first['extensions']['cost']['budgetRemaining'], 14)
+            self.query('{ allOrders(first: 10) { edges { node { customer { name } } } } }')
+            result = self.query('{ allOrders(first: 10) { edges { node { customer { name } } } } }')
+        self.assertEqual(result['errors'][0]['extensions']['code'], 'COST_BUDGET_EXCEEDED')
+
+    def test_introspection_is_free(self):
+        result = self.query('{ __schema { types { name fields { name type { name ofType { name ofType { name } } } } } } }')
+        self.assertEqual(result['extensions']['cost']['requested'], 0)
+
+
+class ResultCacheTests(GraphQLTestCase):
+    QUERY = '{ allProducts { edges { node { name } } } }'
+
+    def test_repeated_query_is_served_from_cache(self):
+        Product.objects.create(name='Laptop', price='10.00')
+        self.query(self.QUERY)
+        with self.assertNumQueries(0):
+            result = self.query(self.QUERY)
+        self.assertEqual(result['data']['allProducts']['edges'], [{'node': {'name': 'Laptop'}}])
+
+    def test_write_to_a_touched_model_invalidates(self):
+        self.query(self.QUERY)
+        self.query('mutation { createProduct(input: {name: "Mouse", price: "5.00"}) { product { id } } }')
+        result = self.query(self.QUERY)
+        self.assertEqual(result['data']['allProducts']['edges'], [{'node': {'name': 'Mouse'}}])
+
+    def test_unrelated_write_keeps_entry(self):
+        Product.objects.create(name='Laptop', price='10.00')
+        self.query(self.QUERY)
+        self.query('mutation { bulkCreateCustomers(input: [{name: "A", email: "a@example.com"}]) { errors } }')
+        with self.assertNumQueries(0):
+            self.query(self.QUERY)
+
+    def test_writes_from_other_processes(self):
+        from django.core.cache import caches
+        from django.db import connection
+        from django.test import override_settings
+
+        from .versions import ModelVersions
+
+        # The versions another process keeps, and one of its raw writes
+        other = ModelVersions()
+
+        def rename(name):
+            with connection.cursor() as cursor:
+                cursor.execute('UPDATE crm_product SET name = %s', [name])
+            other.bump(Product)
+
+        Product.objects.create(name='Laptop', price='10.00')
+        self.query(self.QUERY)
+        rename('Desk')
+        # In-process versions never see it; the entry lives until its TTL
+        self.assertEqual(self.query(self.QUERY)['data']['allProducts']['edges'], [{'node': {'name': 'Laptop'}}])
+
+        self.addCleanup(caches['default'].clear)
+        with override_settings(CRM_VERSION_CACHE='default'):
+            self.query(self.QUERY)
+            rename('Lamp')
+            self.assertEqual(self.query(self.QUERY)['data']['allProducts']['edges'], [{'node': {'name': 'Lamp'}}])
+
+    def test_catalog_reads_are_tracked(self):
+        from graphql_relay import to_global_id
+
+        from .catalog import catalog
+
+        product = Product.objects.create(name='Old', price='10.00')
+        catalog.warm()
+        node = to_global_id('ProductType', product.pk)
+        query = '''query($id: ID!) {
+            node(id: $id) { ... on ProductType { name } }
+            nodes(ids: [$id]) { ... on ProductType { name } }
+        }'''
+        with self.assertNumQueries(0):
+            self.assertEqual(self.query(query, {'id': node})['data']['node'], {'name': 'Old'})
+        product.name = 'New'
+        product.save()
+        data = self.query(query, {'id': node})['data']
+        self.assertEqual((data['node'], data['nodes']), ({'name': 'New'}, [{'name': 'New'}]))
+
+    def test_filter_joins_are_tracked(self):
+        order = self.create_orders(1)[0]
+        query = '{ allOrders(customerName: "Renamed") { edges { node { id } } } }'
+        self.assertEqual(self.query(query)['data']['allOrders']['edges'], [])
+        order.customer.name = 'Renamed'
+        order.customer.save()
+        self.assertEqual(len(self.query(query)['data']['allOrders']['edges']), 1)
+
+    def test_mutations_are_never_cached(self):
+        mutation = 'mutation { createProduct(input: {name: "Mouse", price: "5.00"}) { product { id } } }'
+        self.query(mutation)
+        self.query(mutation)
+        self.assertEqual(Product.objects.count(), 2)
+
+
+class BatchTests(GraphQLTestCase):
+    def batch(self, operations, path='/graphql'):
+        return self.client.post(path, data=json.dumps(operations), content_type='application/json')
+
+    def test_results_in_order(self):
+        Product.objects.create(name='Laptop', price='10.00')
+        response = self.batch([
+            {'id': 'a', 'query': '{ hello }'},
+            {'id': 'b', 'query': '{ allProducts { edges { node { name } } } }'},
+            {'id': 'c', 'query': '{ nope }'},
+        ])
+        self.assertEqual(response.status_code, 400)
+        results = response.json()
+        self.assertEqual([result['id'] for result in results], ['a', 'b', 'c'])
+        self.assertEqual([result['status'] for result in results], [200, 200, 400])
+        self.assertEqual(results[1]['data']['allProducts']['edges'], [{'node': {'name': 'Laptop'}}])
+
+    def test_operations_share_loaders(self):
+        from crm import loaders
+
+        self.create_orders(2)
+        query = '{ allOrders { edges { node { customer { name } } } } }'
+        with mock.patch.object(loaders, 'Loaders', wraps=loaders.Loaders) as created:
+            results = self.batch([{'query': query}, {'query': query}]).json()
+        self.assertEqual(results[0]['data'], results[1]['data'])
+        created.assert_called_once_with()
+
+    def test_size_is_capped(self):
+        with self.settings(GRAPHQL_MAX_BATCH_SIZE=2):
+            response = self.batch([{'query': '{ hello }'}] * 3)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('limit of 2', response.json()['errors'][0]['message'])
+        self.assertEqual(self.batch([]).status_code, 400)
+
+    def test_atomic_batch_rolls_back_together(self):
+        create = 'mutation { createCustomer(input: {name: "Ada", email: "ada@example.com"}) { customer { id } } }'
+        operations = [
+            {'query': create},
+            {'query': create},
+            {'query': 'mutation { createProduct(input: {name: "Pen", price: "2.50"}) { product { id } } }'},
+        ]
+        results = self.batch(operations, '/graphql?atomic=1').json()
+        self.assertEqual(results[1]['errors'][0]['message'], 'Email already exists')
+        self.assertIn('Not executed', results[2]['errors'][0]['message'])
+        self.assertFalse(Customer.objects.exists())
+        self.assertFalse(Product.objects.exists())
+
+        results = self.batch(operations).json()
+        self.assertEqual([result['status'] for result in results], [200, 200, 200])
+        self.assertEqual(Customer.objects.count(), 1)
+        self.assertEqual(Product.objects.count(), 1)
+
+
+class TracingTests(GraphQLTestCase):
+    QUERY = '{ allOrders(first: 5) { edges { node { customer { name } products { edges { node { name } } } } } } }'
+
+    def setUp(self):
+        from alx_backend_graphql.tracing import metrics
+
+        super().setUp()
+        metrics.reset()
+        self.create_orders(3)
+
+    def traced(self, query):
+        response = self.client.post(
+            '/graphql',
+            data=json.dumps({'query': query, 'extensions': {'tracing': True}}),
+            content_type='application/json',
+        )
+        return response.json()
+
+    def resolvers(self, result):
+        return {
+            '.'.join(map(str, resolver['path'])): resolver
+            for resolver in result['extensions']['tracing']['execution']['resolvers']
+        }
+
+    def test_trace_in_extensions(self):
+        with self.settings(GRAPHQL_TRACING_EXTENSIONS=True, GRAPHQL_TRACING_SAMPLE_RATE=0):
+            result = self.traced(self.QUERY)
+        resolvers = self.resolvers(result)
+        root = resolvers['allOrders']
+        self.assertEqual((root['parentType'], root['returnType'], root['rows']), ('Query', 'OrderTypeConnection', 3))
+        # The optimizer joins the customers and prefetches the products up front
+        self.assertEqual(root['sqlQueries'], 2)
+        self.assertEqual(resolvers['allOrders.edges.0.node.customer']['sqlQueries'], 0)
+        self.assertEqual(
+            result['extensions']['tracing']['sql']['queries'],
+            sum(resolver['sqlQueries'] for resolver in resolvers.values()),
+        )
+
+    def test_trace_only_when_allowed(self):
+        with self.settings(GRAPHQL_TRACING_EXTENSIONS=False, GRAPHQL_TRACING_SAMPLE_RATE=0):
+            result = self.traced(self.QUERY)
+        self.assertNotIn('tracing', result['extensions'])
+
+    def test_sampled_operations_reach_metrics(self):
+        with self.settings(GRAPHQL_TRACING_SAMPLE_RATE=0):
+            self.query(self.QUERY)
+        with self.settings(GRAPHQL_TRACING_SAMPLE_RATE=1, GRAPHQL_RESULT_CACHE=None):
+            self.query(self.QUERY)
+            result = self.query(self.QUERY)
+        self.assertNotIn('tracing', result['extensions'])
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('graphql_request_duration_seconds_count 2\n', body)
+        self.assertIn('graphql_resolver_duration_seconds_count{field="Query.allOrders"} 2\n', body)
+        self.assertIn('graphql_resolver_rows_bucket{field="Query.allOrders",le="5"} 2\n', body)
+
+
+class AsyncViewTests(GraphQLTestMixin, TransactionTestCase):
+    # Pool threads use their own connections, so rows must be committed
+
+    async def aquery(self, query, variables=None):
+        response = await self.async_client.post(
+            '/graphql/async',
+            data=json.dumps({'query': query, 'variables': variables or {}}),
+            content_type='application/json',
+        )
+        return response.json()
+
+    async def test_matches_sync_view(self):
+        await sync_to_async(self.create_orders)(3, products_per_order=2)
+        query = '''
+        {
+          allOrders(first: 2) {
+            totalCount
+            pageInfo { hasNextPage }
+            edges { node { totalAmount customer { name } products { edges { node { name } } } } }
+          }
+          allCustomers(orderBy: "name") { edges { node { name orders { totalCount } } } }
+        }
+        '''
+        result = await self.aquery(query)
+        self.assertNotIn('errors', result)
+        expected = await sync_to_async(self.query)(query)
+        self.assertEqual(result['data'], expected['data'])
+        self.assertEqual(result['extensions']['cost'], expected['extensions']['cost'])
+
+    async def test_keyset_pages(self):
+        await sync_to_async(self.create_orders)(5)
+        page = await self.aquery('{ allCustomers(first: 2, orderBy: "name") { edges { cursor node { name } } } }')
+        cursor = page['data']['allCustomers']['edges'][-1]['cursor']
+        page = await self.aquery(
+            'query($after: String) { allCustomers(first: 2, orderBy: "name", after: $after) { edges { node { name } } } }',
+            {'after': cursor},
+        )
+        self.assertEqual(
+            [edge['node']['name'] for edge in page['data']['allCustomers']['edges']],
+            ['Customer 2', 'Customer 3'],
+        )
+
+    async def test_mutations(self):
+        result = await self.aquery(
+            'mutation { createCustomer(input: {name: "Ada", email: "ada@example.com"}) { customer { id } } }'
+        )
+        self.assertNotIn('errors', result)
+        product = await self.aquery(
+            'mutation { createProduct(input: {name: "Pen", price: "2.50", stock: 3}) { product { id } } }'
+        )
+        self.assertNotIn('errors', product)
+        customer = await Customer.objects.aget(email='ada@example.com')
+        pen = await Product.objects.aget(name='Pen')
+        order = await self.aquery(
+            'mutation($c: ID!, $p: [ID]!) { createOrder(input: {customerId: $c, productIds: $p}) '
+            '{ order { totalAmount customer { name } } } }',
+            {'c': customer.pk, 'p': [pen.pk]},
+        )
+        self.assertNotIn('errors', order)
+        self.assertEqual(order['data']['createOrder']['order']['customer']['name'], 'Ada')
+        duplicate = await self.aquery(
+            'mutation { createCustomer(input: {name: "Ada", email: "ada@example.com"}) { customer { id } } }'
+        )
+        self.assertEqual(duplicate['errors'][0]['message'], 'Email already exists')
+
+
+    async def test_atomic_batch(self):
+        create = 'mutation { createCustomer(input: {name: "Ada", email: "ada@example.com"}) { customer { id } } }'
+        response = await self.async_client.post(
+            '/graphql/async?atomic=1',
+            data=json.dumps([{'query': create}, {'query': create}]),
+            content_type='application/json',
+        )
+        self.assertEqual([result['status'] for result in response.json()], [200, 200])
+        self.assertEqual(response.json()[1]['errors'][0]['message'], 'Email already exists')
+        self.assertFalse(await Customer.objects.aexists())
+
+    async def test_tracing_follows_pool_threads(self):
+        await sync_to_async(self.create_orders)(2)
+        with self.settings(GRAPHQL_TRACING_EXTENSIONS=True):
+            response = await self.async_client.post(
+                '/graphql/async',
+                data=json.dumps({'query': '{ allOrders { edges { node { id } } } }', 'extensions': {'tracing': True}}),
+                content_type='application/json',
+            )
+        resolvers = response.json()['extensions']['tracing']['execution']['resolvers']
+        self.assertEqual(resolvers[0]['path'], ['allOrders'])
+        self.assertGreaterEqual(resolvers[0]['sqlQueries'], 1)
+
+
+class SearchTests(GraphQLTestCase):
+    def setUp(self):
+        super().setUp()
+        self.ada = Customer.objects.create(name='Ada Lovelace', email='ada@engine.org')
+        self.grace = Customer.objects.create(name='Grace Hopper', email='grace@navy.mil')
+        self.lamp = Product.objects.create(name='Brass Lamp', price='30.00', stock=4)
+        self.lens = Product.objects.create(name='Lens', price='12.00', stock=9)
+        order = Order.objects.create(customer=self.grace, total_amount='30.00')
+        order.products.set([self.lamp])
+
+    def names(self, field, arguments):
+        result = self.query(f'{{ {field}({arguments}) {{ edges {{ node {{ id }} }} totalCount }} }}')
+        self.assertNotIn('errors', result)
+        return result['data'][field]
+
+    def test_uses_the_index(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.names('allCustomers', 'search: "lovel"')['totalCount'], 1)
+        self.assertTrue(any('crm_customer_fts' in query['sql'] for query in queries.captured_queries))
+
+    def test_create_restores_dropped_triggers(self):
+        from django.db import connection
+
+        from .search import create_search_index, search
+
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER "crm_customer_fts_ai"')
+        Customer.objects.create(name='Alan Turing', email='alan@bletchley.uk')
+        self.assertEqual(search(Customer.objects.all(), 'turing').count(), 0)
+        self.assertTrue(create_search_index(connection, Customer))
+        self.assertEqual(search(Customer.objects.all(), 'turing').count(), 1)
+        Customer.objects.create(name='Alan Kay', email='alan@parc.com')
+        self.assertEqual(search(Customer.objects.all(), 'alan').count(), 2)
+
+    def test_matches_email_and_word_prefixes(self):
+        self.assertEqual(self.names('allCustomers', 'search: "navy"')['totalCount'], 1)
+        self.assertEqual(self.names('allCustomers', 'search: "gra hop"')['totalCount'], 1)
+        self.assertEqual(self.names('allCustomers', 'search: "ada hopper"')['totalCount'], 0)
+
+    def test_index_follows_writes(self):
+        from .search import search
+
+        def count(text):
+            return search(Customer.objects.all(), text).count()
+
+        Customer.objects.bulk_create([Customer(name='Alan Turing', email='alan@bletchley.uk')])
+        self.assertEqual(count('turing'), 1)
+        Customer.objects.filter(name='Alan Turing').update(name='Alonzo Church')
+        self.assertEqual(count('turing'), 0)
+        self.assertEqual(count('church'), 1)
+        Customer.objects.filter(name='Alonzo Church').delete()
+        self.assertEqual(count('church'), 0)
+
+    def test_ranked_by_relevance(self):
+        Product.objects.create(name='Lamp Lamp Lamp', price='5.00', stock=1)
+        from .search import search
+
+        ranked = list(search(Product.objects.all(), 'lamp').values_list('name', flat=True))
+        self.assertEqual(ranked, ['Lamp Lamp Lamp', 'Brass Lamp'])
+
+    def test_orders_match_customer_or_product(self):
+        self.assertEqual(self.names('allOrders', 'search: "brass"')['totalCount'], 1)
+        self.assertEqual(self.names('allOrders', 'search: "grace"')['totalCount'], 1)
+        self.assertEqual(self.names('allOrders', 'search: "lens"')['totalCount'], 0)
+
+    def test_order_by_overrides_relevance(self):
+        Product.objects.create(name='Lamp Lamp Lamp', price='5.00', stock=1)
+        result = self.query('{ allProducts(search: "lamp", orderBy: "-price") { edges { node { name } } } }')
+        self.assertEqual(
+            [edge['node']['name'] for edge in result['data']['allProducts']['edges']],
+            ['Brass Lamp', 'Lamp Lamp Lamp'],
+        )
+
+    def test_like_fallback(self):
+        from . import search
+
+        with mock.patch.object(search, 'fts_available', return_value=False):
+            self.assertEqual(self.names('allCustomers', 'search: "lovel"')['totalCount'], 1)
+            self.assertEqual(self.names('allOrders', 'search: "brass"')['totalCount'], 1)
+
+    def test_cached_search_follows_renames(self):
+        self.assertEqual(self.names('allOrders', 'search: "brass"')['totalCount'], 1)
+        self.lamp.name = 'Copper Lamp'
+        self.lamp.save()
+        self.assertEqual(self.names('allOrders', 'search: "brass"')['totalCount'], 0)
+
+
+class DatabaseRoutingTests(GraphQLTestCase):
+    def test_sqlite_pragmas_are_applied(self):
+        from django.db import connection
+
+        with connection.cursor() as cursor:
+            self.assertEqual(cursor.execute('PRAGMA busy_timeout').fetchone()[0], 5000)
+            self.assertEqual(cursor.execute('PRAGMA synchronous').fetchone()[0], 1)
+
+    def test_reads_inside_a_request_go_to_the_replica_until_a_write(self):
+        from .routers import PrimaryReplicaRouter, replica_reads
+
+        router = PrimaryReplicaRouter()
+        with mock.patch('crm.routers.is_replica', return_value=True):
+            self.assertEqual(router.db_for_read(Customer), 'default')
+            with replica_reads():
+                self.assertEqual(router.db_for_read(Customer), 'replica')
+                self.assertEqual(router.db_for_write(Customer), 'default')
+                self.assertEqual(router.db_for_read(Customer), 'default')
+            with replica_reads():
+                self.assertEqual(router.db_for_read(Customer), 'replica')
+
+    def test_primary_reads_do_not_pin_the_request(self):
+        from django.db import router
+
+        from .catalog import catalog
+        from .routers import replica_reads
+
+        product = Product.objects.create(name='Pen', price='2.50')
+        result = self.query('mutation { bulkCreateCustomers(input: [], background: true) { job { id } } }')
+        job = result['data']['bulkCreateCustomers']['job']['id']
+        with mock.patch('crm.routers.is_replica', return_value=True), replica_reads():
+            catalog.clear()
+            self.assertEqual(catalog.product(product.pk).name, 'Pen')
+            self.assertEqual(router.db_for_read(Customer), 'replica')
+            # Job status is read from the primary, the rest still from the replica
+            result = self.query('query($id: ID!) { job(id: $id) { id } allCustomers { totalCount } }', {'id': job})
+        self.assertIn("'replica'", result['errors'][0]['message'])
+
+    def test_queries_read_the_replica_and_mutations_the_primary(self):
+        with mock.patch('crm.routers.is_replica', return_value=True):
+            # The test only allows queries to 'default', so reaching the
+            # replica surfaces as an error
+            result = self.query('{ allCustomers { edges { node { name } } } }')
+            self.assertIn("'replica'", result['errors'][0]['message'])
+            result = self.query(
+                'mutation { createCustomer(input: {name: "Ada", email: "ada@primary.org"}) { customer { name } } }'
+            )
+        self.assertNotIn('errors', result)
+
+    def test_health(self):
+        response = self.client.get('/health')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['databases'], {'default': 'ok'})
+
+
+class ExportTests(GraphQLTestCase):
+    def export(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_orders_csv_flattens_products(self):
+        order = self.create_orders(1, products_per_order=2)[0]
+        rows = list(csv.DictReader(io.StringIO(self.export('/export/orders'))))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['customer_email'], order.customer.email)
+        self.assertEqual(rows[0]['product_names'], 'Product 0;Product 1')
+
+    def test_ndjson_with_graphql_filters(self):
+        self.create_orders(3)
+        Product.objects.create(name='Cheap', price='1.00', stock=0)
+        lines = self.export('/export/products?format=ndjson&priceLte=5').splitlines()
+        self.assertEqual([json.loads(line)['name'] for line in lines], ['Cheap'])
+        lines = self.export('/export/customers?format=ndjson&search=customer').splitlines()
+        self.assertEqual(len(lines), 3)
+
+    def test_queries_are_per_chunk(self):
+        self.create_orders(7)
+        with self.settings(CRM_EXPORT_CHUNK_SIZE=3):
+            # One streamed SELECT plus a product prefetch per chunk
+            with self.assertNumQueries(1 + 3):
+                lines = self.export('/export/orders?format=ndjson').splitlines()
+        self.assertEqual(len(lines), 7)
+
+    def test_rejects_bad_requests(self):
+        self.assertEqual(self.client.get('/export/invoices').status_code, 404)
+        self.assertEqual(self.client.get('/export/orders?format=xml').status_code, 400)
+        self.assertEqual(self.client.get('/export/orders?totalAmountGte=abc').status_code, 400)
+
+
+class ImportCommandTests(TransactionTestCase):
+    # --drop-indexes needs the schema editor, which SQLite refuses inside a transaction
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as target:
+            target.write(content)
+        return path
+
+    def import_crm(self, **options):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command('import_crm', stdout=stdout, stderr=stderr, **options)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_imports_and_resolves_foreign_keys(self):
+        customers = self.write('customers.csv', 'name,email,phone\nAda,ada@example.com,\nBob,bob@example.com,+1\nBad,not-an-email,\n')
+        products = self.write('products.ndjson', '{"name": "Pen", "price": "2.50", "stock": 3}\n{"name": "Ink", "price": "4.00"}\n')
+        orders = self.write(
+            'orders.csv',
+            'customer_email,product_names,total_amount\n'
+            'ada@example.com,Pen;Ink,\n'
+            'bob@example.com,Pen,9.99\n'
+            'zed@example.com,Pen,\n',
+        )
+        stdout, stderr = self.import_crm(customers=customers, products=products, orders=orders, batch_size=2)
+        self.assertEqual(Customer.objects.count(), 2)
+        self.assertIn('customers row 3', stderr)
+        self.assertIn('orders row 3: Customer not found', stderr)
+        ada = Order.objects.get(customer__email='ada@example.com')
+        self.assertEqual(str(ada.total_amount), '6.50')
+        self.assertEqual(sorted(ada.products.values_list('name', flat=True)), ['Ink', 'Pen'])
+        self.assertEqual(str(Order.objects.get(customer__email='bob@example.com').total_amount), '9.99')
+
+    def test_round_trips_an_export(self):
+        from datetime import timedelta
+
+        from django.utils import timezone
+
+        from .models import DailySales
+
+        # Whole seconds, since NDJSON writes milliseconds
+        now = timezone.now().replace(microsecond=0)
+        for days, order in enumerate(GraphQLTestCase.create_orders(self, 3)):
+            Order.objects.filter(pk=order.pk).update(order_date=now - timedelta(days=100 + days))
+        dates = sorted(Order.objects.values_list('order_date', flat=True))
+        for format in ('csv', 'ndjson'):
+            exported = b''.join(self.client.get(f'/export/orders?format={format}').streaming_content).decode()
+            Order.objects.all().delete()
+            DailySales.objects.all().delete()
+            self.import_crm(orders=self.write(f'orders.{format}', exported))
+            self.assertEqual(Order.objects.count(), 3)
+            self.assertEqual(Order.products.through.objects.count(), 6)
+            self.assertEqual(sorted(Order.objects.values_list('order_date', flat=True)), dates)
+            self.assertEqual(
+                sorted(DailySales.objects.values_list('date', flat=True)),
+                [timezone.localdate(date) for date in dates],
+            )
+
+    def test_rejects_bad_order_dates(self):
+        Customer.objects.create(name='Ada', email='ada@example.com')
+        Product.objects.create(name='Pen', price='2.50')
+        orders = self.write(
+            'orders.csv',
+            'customer_email,product_names,order_date\n'
+            'ada@example.com,Pen,2026-01-02 03:04:05\n'
+            'ada@example.com,Pen,yesterday\n',
+        )
+        _, stderr = self.import_crm(orders=orders)
+        self.assertIn('orders row 2: order_date must be a date and time', stderr)
+        self.assertEqual(Order.objects.get().order_date.year, 2026)
+
+    def test_resumes_after_a_failure(self):
+        rows = ''.join(f'{{"name": "C{i}", "email": "c{i}@example.com"}}\n' for i in range(5))
+        path = self.write('customers.ndjson', rows)
+        original = Customer.objects.bulk_create
+        calls = []
+
+        def fail_on_second_batch(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 2:
+                raise RuntimeError('disk full')
+            return original(*args, **kwargs)
+
+        with mock.patch.object(Customer.objects, 'bulk_create', side_effect=fail_on_second_batch):
+            with self.assertRaises(RuntimeError):
+                self.import_crm(customers=path, batch_size=2)
+        self.assertEqual(Customer.objects.count(), 2)
+        stdout, _ = self.import_crm(customers=path, batch_size=2)
+        self.assertIn('resumed after row 2', stdout)
+        self.assertEqual(Customer.objects.count(), 5)
+
+    def test_drop_indexes_rebuilds_them(self):
+        from django.db import connection
+
+        from .search import search
+
+        path = self.write('products.csv', 'name,price,stock\nBrass Lamp,30.00,1\n')
+        self.import_crm(products=path, drop_indexes=True)
+        constraints = connection.introspection.get_constraints(connection.cursor(), 'crm_product')
+        self.assertIn('crm_product_name_id_idx', constraints)
+        self.assertEqual(search(Product.objects.all(), 'brass').count(), 1)
+
+
+class NodeTests(GraphQLTestCase):
+    NODES = '''query($ids: [ID!]!) { nodes(ids: $ids) {
+        id
+        ... on CustomerType { name orderCount }
+        ... on ProductType { name price }
+        ... on OrderType { totalAmount customer { name } }
+    } }'''
+
+    def setUp(self):
+        super().setUp()
+        self.customers = [
+            Customer.objects.create(name=f'Customer {i}', email=f'c{i}@example.com') for i in range(3)
+        ]
+        self.pen = Product.objects.create(name='Pen', price='2.50', stock=10)
+        self.order = Order.objects.create(customer=self.customers[0], total_amount='2.50')
+        self.order.products.set([self.pen])
+
+    def test_batched_per_type_in_input_order(self):
+        ids = [
+            to_global_id('ProductType', self.pen.pk),
+            to_global_id('CustomerType', self.customers[1].pk),
+            to_global_id('CustomerType', 999),
+            to_global_id('OrderType', self.order.pk),
+            'not a global id',
+            to_global_id('CustomerType', self.customers[0].pk),
+        ]
+        # One per type: the catalog's products, customers with their order
+        # counts annotated, and orders joined to their customer
+        with self.assertNumQueries(3):
+            result = self.query(self.NODES, {'ids': ids})
+        nodes = result['data']['nodes']
+        self.assertEqual([node and node['id'] for node in nodes], [ids[0], ids[1], None, ids[3], None, ids[5]])
+        self.assertEqual(nodes[0]['price'], '2.50')
+        self.assertEqual(nodes[3]['customer']['name'], 'Customer 0')
+        self.assertEqual(nodes[5]['orderCount'], 1)
+
+    def test_node_and_limit(self):
+        query = 'query($id: ID!) { node(id: $id) { id ... on CustomerType { name } } }'
+        result = self.query(query, {'id': to_global_id('CustomerType', self.customers[2].pk)})
+        self.assertEqual(result['data']['node']['name'], 'Customer 2')
+        result = self.query(query, {'id': to_global_id('OrderType', self.customers[2].pk + 100)})
+        self.assertIsNone(result['data']['node'])
+        result = self.query(self.NODES, {'ids': [to_global_id('CustomerType', 1)] * 101})
+        self.assertIn('At most 100 ids', result['errors'][0]['message'])
+
+    def test_mutations_accept_global_ids(self):
+        query = 'mutation($c: ID!, $p: [ID]!) { createOrder(input: {customerId: $c, productIds: $p}) { order { totalAmount } } }'
+        result = self.query(query, {'c': to_global_id('CustomerType', self.customers[1].pk), 'p': [to_global_id('ProductType', self.pen.pk)]})
+        self.assertEqual(result['data']['createOrder']['order']['totalAmount'], '2.50')
+        # An ID of another type never matches a row with the same pk
+        result = self.query(query, {'c': to_global_id('ProductType', self.customers[1].pk), 'p': [self.pen.pk]})
+        self.assertEqual(result['errors'][0]['message'], 'Customer not found')
+        query = 'mutation($c: ID!, $p: [ID]!) { bulkCreateOrders(input: [{customerId: $c, productIds: $p}]) { orders { totalAmount } errors } }'
+        result = self.query(query, {'c': to_global_id('CustomerType', self.customers[2].pk), 'p': [to_global_id('ProductType', self.pen.pk)]})
+        self.assertEqual(result['data']['bulkCreateOrders']['orders'], [{'totalAmount': '2.50'}])
+
+
+class ArchiveTests(GraphQLTestCase):
+    ORDERS = '''query($gte: DateTime, $after: String, $orderBy: String) {
+        allOrders(first: 2, after: $after, orderBy: $orderBy, orderDateGte: $gte) {
+            totalCount
+            edges { node { id totalAmount customer { name } products { edges { node { name } } } } }
+            pageInfo { hasNextPage endCursor }
+        }
+    }'''
+
+    def setUp(self):
+        super().setUp()
+        from datetime import timedelta
+
+        from django.utils import timezone
+
+        from .archive import archive_boundary
+
+        archive_boundary.clear()
+        self.now = timezone.now()
+        self.pen = Product.objects.create(name='Pen', price='2.50', stock=10)
+        ada = Customer.objects.create(name='Ada', email='ada@example.com')
+        # Orders placed 200, 150, 100, 10 and 1 days ago, cheapest first
+        for i, days in enumerate([200, 150, 100, 10, 1]):
+            order = Order.objects.create(customer=ada, total_amount=f'{i + 1}.00')
+            order.products.set([self.pen])
+            Order.objects.filter(pk=order.pk).update(order_date=self.now - timedelta(days=days))
+
+    def archive(self, *args):
+        out = io.StringIO()
+        call_command('archive_orders', *args, stdout=out)
+        return out.getvalue()
+
+    def page(self, gte=None, after=None, order_by=None):
+        result = self.query(self.ORDERS, {'gte': gte, 'after': after, 'orderBy': order_by})
+        self.assertNotIn('errors', result)
+        return result['data']['allOrders']
+
+    def test_archives_in_resumable_batches(self):
+        from decimal import Decimal
+
+        from .models import ArchivedOrder, ArchivedOrderItem, CustomerSales
+        from .rollups import rebuild
+
+        rebuild()
+        before = list(CustomerSales.objects.values_list('orders', 'revenue'))
+        self.assertIn('Archived 2 orders', self.archive('--batch-size', '2', '--max-batches', '1'))
+        self.assertIn('Archived 1 orders', self.archive('--batch-size', '2'))
+        self.assertIn('Archived 0 orders', self.archive())
+        self.assertEqual(sorted(ArchivedOrder.objects.values_list('total_amount', flat=True)), [Decimal('1.00'), Decimal('2.00'), Decimal('3.00')])
+        self.assertEqual(ArchivedOrderItem.objects.filter(product=self.pen).count(), 3)
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(Order.products.through.objects.count(), 2)
+        rebuild()
+        self.assertEqual(list(CustomerSales.objects.values_list('orders', 'revenue')), before)
+
+    def test_all_orders_reads_the_archive_for_old_ranges(self):
+        from datetime import timedelta
+
+        self.archive()
+        self.assertEqual(self.page()['totalCount'], 2)
+        self.assertEqual(self.page((self.now - timedelta(days=30)).isoformat())['totalCount'], 2)
+
+        gte = (self.now - timedelta(days=160)).isoformat()
+        first = self.page(gte, order_by='-totalAmount')
+        self.assertEqual([edge['node']['totalAmount'] for edge in first['edges']], ['5.00', '4.00'])
+        second = self.page(gte, first['pageInfo']['endCursor'], '-totalAmount')
+        self.assertEqual([edge['node']['totalAmount'] for edge in second['edges']], ['3.00', '2.00'])
+        self.assertFalse(second['pageInfo']['hasNextPage'])
+        self.assertEqual(second['totalCount'], 4)
+        archived = second['edges'][0]['node']
+        self.assertEqual(archived['customer']['name'], 'Ada')
+        self.assertEqual(archived['products']['edges'], [{'node': {'name': 'Pen'}}])
+
+        result = self.query('query($id: ID!) { node(id: $id) { ... on OrderType { totalAmount } } }', {'id': archived['id']})
+        self.assertEqual(result['data']['node']['totalAmount'], '3.00')
+        result = self.query('query($gte: DateTime) { allOrders(offset: 2, orderDateGte: $gte) { edges { node { id } } } }', {'gte': gte})
+        self.assertIn('page with cursors', result['errors'][0]['message'])
+
+    def test_customer_fields_count_archived_orders(self):
+        query = '''query($name: String) {
+            allCustomers { edges { node {
+                orderCount totalSpent lastOrderDate
+                orders(first: 10) { totalCount edges { node { totalAmount } } }
+                filtered: orders(first: 10, customerName: $name) { totalCount }
+            } } }
+            allProducts { edges { node { unitsSold orders { totalCount } } } }
+        }'''
+        before = self.query(query, {'name': 'Ada'})['data']
+        self.archive()
+        result = self.query(query, {'name': 'Ada'})
+        self.assertNotIn('errors', result)
+        self.assertEqual(result['data']['allProducts'], before['allProducts'])
+        customer = result['data']['allCustomers']['edges'][0]['node']
+        self.assertEqual(customer['orderCount'], 5)
+        self.assertEqual(customer['totalSpent'], '15.00')
+        self.assertEqual(customer['lastOrderDate'], before['allCustomers']['edges'][0]['node']['lastOrderDate'])
+        self.assertEqual(customer['orders']['totalCount'], 5)
+        self.assertEqual(
+            sorted(edge['node']['totalAmount'] for edge in customer['orders']['edges']),
+            ['1.00', '2.00', '3.00', '4.00', '5.00'],
+        )
+        # Filtered nested connections read the live orders only
+        self.assertEqual(customer['filtered']['totalCount'], 2)
+
+    def test_export_includes_archived_orders(self):
+        import csv
+
+        self.archive()
+        response = self.client.get('/export/orders?totalAmountGte=2')
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual([row['total_amount'] for row in rows], ['2.00', '3.00', '4.00', '5.00'])
+        self.assertEqual([row['product_names'] for row in rows], ['Pen'] * 4)
+        self.assertEqual([int(row['id']) for row in rows], sorted(int(row['id']) for row in rows))
+
+
+class JobTests(GraphQLTestCase):
+    BULK = '''mutation($input: [CreateCustomerInput]!) {
+        bulkCreateCustomers(input: $input, background: true) { customers { id } job { id status total } }
+    }'''
+    JOB = 'query($id: ID!) { job(id: $id) { status total processed created failed errors { index message } message } }'
+
+    def rows(self, count):
+        return [{'name': f'C{i}', 'email': f'c{i}@example.com'} for i in range(count)]
+
+    def work(self, *args):
+        out = io.StringIO()
+        call_command('run_crm_workers', '--workers', '1', '--burst', *args, stdout=out)
+        return out.getvalue()
+
+    def test_bulk_mutation_queues_a_job(self):
+        Customer.objects.create(name='Taken', email='c3@example.com')
+        rows = self.rows(5) + [{'name': 'Again', 'email': 'c1@example.com'}]
+        result = self.query(self.BULK, {'input': rows})['data']['bulkCreateCustomers']
+        self.assertIsNone(result['customers'])
+        self.assertEqual((result['job']['status'], result['job']['total']), ('queued', 6))
+        self.assertEqual(Customer.objects.count(), 1)
+
+        self.assertIn('1 jobs run', self.work('--chunk-size', '2'))
+        job = self.query(self.JOB, {'id': result['job']['id']})['data']['job']
+        self.assertEqual(
+            {key: job[key] for key in ('status', 'processed', 'created', 'failed')},
+            {'status': 'succeeded', 'processed': 6, 'created': 4, 'failed': 2},
+        )
+        self.assertEqual([error['index'] for error in job['errors']], [3, 5])
+        self.assertEqual(Customer.objects.count(), 5)
+        # Job status is never served from the result cache
+        from .models import Job
+
+        Job.objects.update(status='failed')
+        self.assertEqual(self.query(self.JOB, {'id': result['job']['id']})['data']['job']['status'], 'failed')
+
+    def test_resumes_from_the_checkpoint(self):
+        from datetime import timedelta
+
+        from django.utils import timezone
+
+        from .jobs import enqueue, run_job
+        from .models import Job
+
+        job = enqueue('bulk_create_customers', self.rows(5))
+        Job.objects.filter(pk=job.pk).update(status='running', worker='gone', position=2)
+        self.assertIn('0 jobs run', self.work())
+        # The worker holding it stopped checkpointing longer than the lease ago
+        Job.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        self.work()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.created), ('succeeded', 1, 3))
+        self.assertEqual(sorted(Customer.objects.values_list('name', flat=True)), ['C2', 'C3', 'C4'])
+
+        job = enqueue('bulk_create_orders', [{'customer_id': 'nope', 'product_ids': []}])
+        Job.objects.filter(pk=job.pk).update(status='running', worker='other')
+        job.refresh_from_db()
+        # A checkpoint fails once another worker owns the job
+        with self.assertLogs('crm.jobs', 'WARNING'):
+            run_job(job, 'me')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.position), ('running', 0))
+
+    def test_background_orders_keep_their_order_dates(self):
+        from datetime import datetime, timezone
+
+        from .jobs import Row
+        from .models import Job
+
+        customer = Customer.objects.create(name='Ada', email='ada@example.com')
+        pen = Product.objects.create(name='Pen', price='2.50', stock=5)
+        mutation = '''mutation($input: [CreateOrderInput]!) {
+            bulkCreateOrders(input: $input, background: true) { errors job { id status } }
+        }'''
+        row = {'customerId': customer.pk, 'productIds': [pen.pk], 'orderDate': '2026-01-02T03:04:05+00:00'}
+        result = self.query(mutation, {'input': [row, row]})['data']['bulkCreateOrders']
+        self.assertEqual((result['errors'], result['job']['status']), (None, 'queued'))
+        payload = Job.objects.get().payload
+        self.assertEqual(payload[0]['order_date'], '2026-01-02T03:04:05Z')
+        self.assertIsInstance(Row.load(payload[0]).order_date, datetime)
+
+        self.work()
+        job = self.query(self.JOB, {'id': result['job']['id']})['data']['job']
+        self.assertEqual((job['status'], job['created']), ('succeeded', 2))
+        self.assertEqual(Product.objects.get().stock, 3)
+        self.assertEqual(
+            list(Order.objects.values_list('order_date', flat=True)),
+            [datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc)] * 2,
+        )
+
+
+class StartupTests(GraphQLTestCase):
+    def setUp(self):
+        super().setUp()
+        from alx_backend_graphql.documents import document_cache
+        from alx_backend_graphql.introspection import introspection_cache
+
+        document_cache.clear()
+        introspection_cache.clear()
+        self.introspection_cache = introspection_cache
+
+    def test_warm_up_precomputes_introspection(self):
+        from graphql import get_introspection_query
+
+        from alx_backend_graphql.startup import warm_up
+
+        phases = warm_up()
+        self.assertLessEqual({'urls', 'schema', 'filtersets', 'introspection', 'catalog'}, set(phases))
+        self.assertEqual(self.introspection_cache.stats()['size'], 2)
+        with self.assertNumQueries(0):
+            result = self.query(get_introspection_query(descriptions=True))
+        self.assertEqual(result['data']['__schema']['queryType']['name'], 'Query')
+        self.assertEqual(self.introspection_cache.stats()['hits'], 1)
+
+    def test_only_introspection_operations_are_cached(self):
+        query = 'query($name: String!) { __type(name: $name) { name fields { name } } }'
+        for name in ('CustomerType', 'CustomerType', 'ProductType'):
+            self.assertEqual(self.query(query, {'name': name})['data']['__type']['name'], name)
+        self.assertEqual(self.introspection_cache.stats(), {'size': 2, 'maxsize': 20, 'hits': 1, 'misses': 2})
+        self.assertEqual(self.query('{ __typename hello }')['data']['hello'], 'Hello, GraphQL!')
+        self.assertEqual(self.introspection_cache.stats()['size'], 2)
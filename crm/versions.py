@@ -0,0 +1,113 @@
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+VERSION_CACHE_PREFIX = 'crm:version:'
+
+_reads = ContextVar('crm_version_reads', default=None)
+
+
+def label(model):
+    return model if isinstance(model, str) else model._meta.label
+
+
+class ModelVersions:
+    """Monotonic per-model write counters used to invalidate derived caches.
+
+    Every ORM save/delete (and M2M change) bumps the model's counter through
+    signals, as does ``update()`` on products (``crm.models.rows_updated``);
+    code that writes with ``bulk_create`` or other ``update()`` calls ``bump``
+    itself. Counters live in this process unless ``CRM_VERSION_CACHE`` names a
+    Django cache alias, in which case every process sharing that cache sees
+    the same versions.
+    """
+
+    def __init__(self):
+        self._local = {}
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self):
+        alias = getattr(settings, 'CRM_VERSION_CACHE', None)
+        return caches[alias] if alias else None
+
+    def bump(self, *models):
+        labels = [label(model) for model in models]
+        self._increment(labels)
+        if transaction.get_connection().in_atomic_block:
+            # A reader may cache pre-commit rows under the new version in the
+            # meantime; bump again once the write is visible.
+            transaction.on_commit(lambda: self._increment(labels))
+
+    def _increment(self, labels):
+        cache = self.cache
+        for label in labels:
+            if cache is None:
+                with self._lock:
+                    self._local[label] = self._local.get(label, 0) + 1
+            else:
+                key = VERSION_CACHE_PREFIX + label
+                cache.add(key, 0, None)
+                try:
+                    cache.incr(key)
+                except ValueError:
+                    cache.set(key, 1, None)
+
+    def get(self, model):
+        return self.get_many([label(model)])[label(model)]
+
+    def get_many(self, labels):
+        cache = self.cache
+        if cache is None:
+            with self._lock:
+                return {label: self._local.get(label, 0) for label in labels}
+        found = cache.get_many([VERSION_CACHE_PREFIX + label for label in labels])
+        return {label: found.get(VERSION_CACHE_PREFIX + label, 0) for label in labels}
+
+
+model_versions = ModelVersions()
+
+
+@contextmanager
+def recording_reads():
+    """Collect the labels passed to ``record_read`` inside the block."""
+    labels = set()
+    token = _reads.set(labels)
+    try:
+        yield labels
+    finally:
+        _reads.reset(token)
+
+
+def record_read(*models):
+    """Note that what is being computed depends on ``models`` though no SQL read them.
+
+    For reads served from memory, like the product catalog (``crm.catalog``),
+    so caches built on top of them are invalidated by the same writes.
+    """
+    labels = _reads.get()
+    if labels is not None:
+        labels.update(label(model) for model in models)
+
+
+def bump_on_write(sender, **kwargs):
+    model_versions.bump(sender)
+
+
+def bump_on_m2m_change(sender, action, **kwargs):
+    if action.startswith('post_'):
+        model_versions.bump(sender)
+
+
+def connect_signals():
+    from .models import rows_updated
+
+    rows_updated.connect(bump_on_write, dispatch_uid='crm.versions.rows_updated')
+    post_save.connect(bump_on_write, dispatch_uid='crm.versions.post_save')
+    post_delete.connect(bump_on_write, dispatch_uid='crm.versions.post_delete')
+    m2m_changed.connect(bump_on_m2m_change, dispatch_uid='crm.versions.m2m_changed')
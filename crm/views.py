@@ -1,3 +1,25 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.http import JsonResponse
 
-# Create your views here.
+from .routers import is_replica
+
+
+def health(request):
+    """Ping the primary and the database GraphQL reads go to; 503 if either fails."""
+    read_alias = getattr(settings, 'CRM_READ_DATABASE', None)
+    if read_alias is None or not is_replica(read_alias):
+        read_alias = DEFAULT_DB_ALIAS
+    databases = {}
+    for alias in dict.fromkeys([DEFAULT_DB_ALIAS, read_alias]):
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute('SELECT 1')
+            databases[alias] = 'ok'
+        except DatabaseError as error:
+            databases[alias] = str(error)
+    healthy = all(status == 'ok' for status in databases.values())
+    return JsonResponse(
+        {'status': 'ok' if healthy else 'error', 'reads': read_alias, 'databases': databases},
+        status=200 if healthy else 503,
+    )